@@ -6,15 +6,24 @@ from rest_framework.permissions import IsAuthenticated
 
 from django.contrib.auth import authenticate
 
+from accounts.hashing import HasherBusy
 from accounts.serializers import UserSerializer
 from accounts.models import User
 
+def hasher_busy_response():
+    response = Response({"error": "Too many login requests, please retry"}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+    response["Retry-After"] = "1"
+    return response
+
 @api_view(["POST"])
 def register(request):
     if request.method == "POST":
         serializer = UserSerializer(data=request.data)
         if serializer.is_valid():
-            serializer.save()
+            try:
+                serializer.save()
+            except HasherBusy:
+                return hasher_busy_response()
             return Response({"status": "User register with email {} successfully".format(serializer.data.get("email"))}, 
                             status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -25,7 +34,10 @@ def login(request):
         email = request.data.get("email")
         password = request.data.get("password")
 
-        user = authenticate(email=email, password=password)
+        try:
+            user = authenticate(email=email, password=password)
+        except HasherBusy:
+            return hasher_busy_response()
         
         if user:
             token, _ = Token.objects.get_or_create(user=user)
@@ -0,0 +1,51 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from accounts.models import User
+
+# Fields of the user kept in the token cache, everything else is deferred and loaded on first access.
+# Kept in model field order, which is what Model.from_db expects.
+CACHED_USER_FIELDS = [
+    field.attname for field in User._meta.concrete_fields
+    if field.attname in ("id", "email", "is_active", "is_staff", "is_superuser")
+]
+
+
+def get_token_cache():
+    return caches[getattr(settings, "AUTH_TOKEN_CACHE_ALIAS", "default")]
+
+
+def token_cache_key(key):
+    # Hashed so the cache never holds usable tokens
+    return "auth:token:{}".format(hashlib.sha256(key.encode("utf-8")).hexdigest())
+
+
+def invalidate_tokens(keys):
+    get_token_cache().delete_many([token_cache_key(key) for key in keys])
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    # TokenAuthentication with the token -> user lookup cached, so a warm request needs no query.
+    # Entries are dropped on logout (token delete) and whenever the user is saved, e.g. deactivated.
+
+    def authenticate_credentials(self, key):
+        cache = get_token_cache()
+        cache_key = token_cache_key(key)
+        values = cache.get(cache_key)
+        if values is None:
+            user, token = super().authenticate_credentials(key)
+            values = [getattr(user, field) for field in CACHED_USER_FIELDS]
+            cache.set(cache_key, values, getattr(settings, "AUTH_TOKEN_CACHE_TIMEOUT", 300))
+            return user, token
+
+        # Built like a partially loaded row, so a later save() only writes these fields
+        user = User.from_db(DEFAULT_DB_ALIAS, CACHED_USER_FIELDS, values)
+        token = Token.from_db(DEFAULT_DB_ALIAS, ["key", "user_id"], [key, user.pk])
+        user.auth_token = token
+        return user, token
@@ -0,0 +1,30 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.hashers import check_password, identify_hasher, make_password
+
+from accounts.hashing import run_hashing
+
+
+class PooledHasherBackend(ModelBackend):
+    # ModelBackend with the password hashing done in the accounts.hashing pool,
+    # the user lookup and the password upgrade stay in the request thread
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        UserModel = get_user_model()
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        try:
+            user = UserModel._default_manager.get_by_natural_key(username)
+        except UserModel.DoesNotExist:
+            # Hash anyway so unknown users take as long as wrong passwords
+            run_hashing(make_password, password)
+            return None
+
+        if not run_hashing(check_password, password, user.password) or not self.user_can_authenticate(user):
+            return None
+        if identify_hasher(user.password).must_update(user.password):
+            user.password = run_hashing(make_password, password)
+            user.save(update_fields=["password"])
+        return user
@@ -0,0 +1,50 @@
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+# Runs password hashing in a small per-process thread pool.
+# PBKDF2 releases the GIL, so the request threads of a worker keep serving other endpoints while
+# hashes run, and the number of hashes in flight or waiting is bounded: past that limit callers get
+# HasherBusy and the API answers 503 instead of a login burst occupying every worker thread.
+
+
+class HasherBusy(Exception):
+    pass
+
+
+_executor = None
+_slots = None
+_lock = threading.Lock()
+
+
+def get_pool():
+    global _executor, _slots
+    with _lock:
+        if _executor is None:
+            workers = getattr(settings, "ACCOUNTS_HASHER_WORKERS", 2)
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hasher")
+            _slots = threading.BoundedSemaphore(workers + getattr(settings, "ACCOUNTS_HASHER_MAX_WAITING", 8))
+    return _executor, _slots
+
+
+def reset_pool():
+    global _executor, _slots
+    with _lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True)
+        _executor = _slots = None
+
+
+def run_hashing(func, *args):
+    # Only pure hashing functions must be passed here, the pool threads have no database access
+    if not getattr(settings, "ACCOUNTS_HASHER_WORKERS", 2):
+        return func(*args)
+    executor, slots = get_pool()
+    if not slots.acquire(timeout=getattr(settings, "ACCOUNTS_HASHER_WAIT_TIMEOUT", 2)):
+        raise HasherBusy
+    try:
+        return executor.submit(func, *args).result()
+    finally:
+        slots.release()
@@ -1,5 +1,8 @@
+from django.contrib.auth.hashers import make_password
+
 from rest_framework import serializers
 
+from accounts.hashing import run_hashing
 from accounts.models import User
 
 class UserSerializer(serializers.ModelSerializer):
@@ -12,7 +15,7 @@ class UserSerializer(serializers.ModelSerializer):
         user = User(
             email=validated_data.get("email")
         )
-        user.set_password(validated_data.get("password"))
+        user.password = run_hashing(make_password, validated_data.get("password"))
         user.save()
         return user
     
@@ -1,10 +1,20 @@
-from django.test import TestCase
+from django.conf import settings
+from django.core.cache import cache
+from django.contrib.auth.hashers import check_password, make_password
+from django.test import TestCase, override_settings
+
+from unittest.mock import patch
 
 from rest_framework.authtoken.models import Token
 from rest_framework.test import APIClient
 from rest_framework import status
+from rest_framework.exceptions import AuthenticationFailed
 
+from accounts import urls as accounts_urls
+from accounts.authentication import CachedTokenAuthentication
+from accounts.hashing import HasherBusy, get_pool, reset_pool, run_hashing
 from accounts.models import User
+from book_challenge.testing import QueryBudgetMixin
 
 
 class UserModelTest(TestCase):
@@ -34,6 +44,7 @@ class UserModelTest(TestCase):
 
 class RegisterAPITestCase(TestCase):
     def setUp(self):
+        cache.clear()
         self.client = APIClient()
         self.register_url = "/api/account/register/"
 
@@ -69,6 +80,7 @@ class RegisterAPITestCase(TestCase):
 
 class LoginAPITestCase(TestCase):
     def setUp(self):
+        cache.clear()
         self.client = APIClient()
         self.login_url = "/api/account/login/"
         self.user_data = {
@@ -96,8 +108,47 @@ class LoginAPITestCase(TestCase):
 
         self.assertIn("error", response.json())
 
+class PasswordHashingPoolTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user_data = {
+            "email": "test@gmail.com",
+            "password": "123456",
+        }
+        User.objects.create_user(**self.user_data)
+        reset_pool()
+        self.addCleanup(reset_pool)
+
+    @override_settings(ACCOUNTS_HASHER_WORKERS=1, ACCOUNTS_HASHER_MAX_WAITING=0, ACCOUNTS_HASHER_WAIT_TIMEOUT=0)
+    def test_pool_is_bounded(self):
+        executor, slots = get_pool()
+        slots.acquire()
+        try:
+            with self.assertRaises(HasherBusy):
+                run_hashing(make_password, "123456")
+        finally:
+            slots.release()
+
+        self.assertTrue(run_hashing(check_password, "123456", make_password("123456")))
+
+    def test_login_when_pool_is_busy(self):
+        with patch("accounts.backends.run_hashing", side_effect=HasherBusy):
+            response = self.client.post("/api/account/login/", data=self.user_data)
+
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(response["Retry-After"], "1")
+
+    def test_login_inactive_user(self):
+        User.objects.filter(email="test@gmail.com").update(is_active=False)
+
+        response = self.client.post("/api/account/login/", data=self.user_data)
+
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
 class LogoutAPITestCase(TestCase):
     def setUp(self):
+        cache.clear()
         self.client = APIClient()
         self.logout_url = "/api/account/logout/"
         self.user_data = {
@@ -122,4 +173,86 @@ class LogoutAPITestCase(TestCase):
 
         self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
 
-        self.assertIn("detail", response.json())
\ No newline at end of file
+        self.assertIn("detail", response.json())
+
+
+class CachedTokenAuthenticationTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        User.objects.create_user(email="test@example.com", password="securepassword123")
+        self.user = User.objects.get(email="test@example.com")
+        self.token, _ = Token.objects.get_or_create(user=self.user)
+        self.authentication = CachedTokenAuthentication()
+
+    def test_warm_cache_needs_no_queries(self):
+        self.authentication.authenticate_credentials(self.token.key)
+
+        with self.assertNumQueries(0):
+            user, token = self.authentication.authenticate_credentials(self.token.key)
+
+        self.assertEqual(user.pk, self.user.pk)
+        self.assertEqual(user.email, "test@example.com")
+        self.assertEqual(token.key, self.token.key)
+
+    def test_cached_user_saves_only_cached_fields(self):
+        self.authentication.authenticate_credentials(self.token.key)
+        user, _ = self.authentication.authenticate_credentials(self.token.key)
+
+        user.is_staff = True
+        user.save()
+
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.is_staff)
+        self.assertTrue(self.user.check_password("securepassword123"))
+
+    def test_logout_invalidates_token(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+
+        self.assertEqual(self.client.post("/api/account/logout/").status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.post("/api/account/logout/").status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deactivation_invalidates_token(self):
+        self.authentication.authenticate_credentials(self.token.key)
+
+        self.user.is_active = False
+        self.user.save()
+
+        with self.assertRaises(AuthenticationFailed):
+            self.authentication.authenticate_credentials(self.token.key)
+
+@override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, "DEFAULT_THROTTLE_RATES": {}})
+class AccountQueryBudgetTestCase(QueryBudgetMixin, TestCase):
+    # Most queries per request of every account route, see BookQueryBudgetTestCase
+    seq_scan_rows = 1000
+    budgets = {
+        "register": 2,
+        "login": 5,
+        "logout": 2,
+    }
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        User.objects.bulk_create([User(email="user{}@example.com".format(i)) for i in range(2000)])
+        User.objects.create_user(email="test@example.com", password="securepassword123")
+
+    def assertRouteBudget(self, name):
+        return self.assertQueryBudget(self.budgets[name], self.seq_scan_rows)
+
+    def test_every_route_has_a_budget(self):
+        self.assertEqual({pattern.name for pattern in accounts_urls.urlpatterns}, set(self.budgets))
+
+    def test_register_login_logout(self):
+        with self.assertRouteBudget("register"):
+            response = self.client.post("/api/account/register/", {"email": "new@example.com", "password": "securepassword123"})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        with self.assertRouteBudget("login"):
+            response = self.client.post("/api/account/login/", {"email": "test@example.com", "password": "securepassword123"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {response.json()['token']}")
+        with self.assertRouteBudget("logout"):
+            response = self.client.post("/api/account/logout/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
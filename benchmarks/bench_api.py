@@ -0,0 +1,229 @@
+"""
+API benchmark.
+
+Seeds --books synthetic books (books.seed) in a temporary database, then drives the real
+routes through the whole middleware stack with --concurrency client threads: the books list
+without filters and with each BookFilter parameter, book by id, book create and login.
+Every scenario sends --requests requests built from --seed, so two runs send the same
+requests, and prints throughput, p50/p95/p99 latency, queries per request (from the request
+metrics) and book cache hit rate as JSON.
+
+Save a run with --output and compare a later one with --compare, scenarios whose p95 or
+queries per request grew by more than --max-regression are listed and the exit code is 1.
+
+    python -m benchmarks.bench_api --books 20000 --concurrency 4 --output before.json
+    python -m benchmarks.bench_api --books 20000 --concurrency 4 --compare before.json
+"""
+import argparse
+import datetime
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "book_challenge.settings.settings_dev")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.core.cache import cache  # noqa: E402
+from django.db import connection, connections  # noqa: E402
+from django.test import Client, override_settings  # noqa: E402
+from django.test.utils import setup_test_environment  # noqa: E402
+from django.urls import reverse  # noqa: E402
+
+from rest_framework.authtoken.models import Token  # noqa: E402
+
+from accounts.hashing import reset_pool  # noqa: E402
+from accounts.models import User  # noqa: E402
+from book_challenge.metrics import registry  # noqa: E402
+from books import seed  # noqa: E402
+from books.filters import BookFilter  # noqa: E402
+from books.models import Book  # noqa: E402
+
+EMAIL = "bench@example.com"
+PASSWORD = "benchmark-password"
+
+
+def random_date(rng):
+    return datetime.date(rng.randint(seed.FIRST_YEAR, seed.LAST_YEAR), 1, 1) + datetime.timedelta(days=rng.randrange(365))
+
+
+# Query parameters of the books list per BookFilter parameter, a new filter needs an entry here
+FILTER_PARAMS = {
+    "author": lambda rng, authors: {"author": rng.choice(authors)},
+    "author_contains": lambda rng, authors: {"author_contains": rng.choice(seed.LAST_NAMES)},
+    "publish_date": lambda rng, authors: {"publish_date": random_date(rng).isoformat()},
+    "month": lambda rng, authors: {"month": rng.randint(1, 12)},
+    "year": lambda rng, authors: {"year": rng.randint(seed.FIRST_YEAR, seed.LAST_YEAR)},
+    "day": lambda rng, authors: {"day": rng.randint(1, 28)},
+    "start_date": lambda rng, authors: {"start_date": random_date(rng).isoformat()},
+    "end_date": lambda rng, authors: {"end_date": random_date(rng).isoformat()},
+    "search": lambda rng, authors: {"search": "{} {}".format(rng.choice(seed.ADJECTIVES), rng.choice(seed.NOUNS))},
+}
+
+
+def get_scenarios(rng, count, authors, ids):
+    # {name: (route, [(method, url, data)])}
+    list_url = reverse("books-list")
+    scenarios = {"books-list": ("books-list", [("get", list_url, {}) for _ in range(count)])}
+    for name in BookFilter.base_filters:
+        scenarios["books-list?" + name] = (
+            "books-list", [("get", list_url, FILTER_PARAMS[name](rng, authors)) for _ in range(count)],
+        )
+    scenarios["book-by-id"] = (
+        "book-by-id", [("get", reverse("book-by-id", args=[rng.choice(ids)]), {}) for _ in range(count)],
+    )
+    scenarios["book-create"] = ("book-create", [
+        ("post", reverse("book-create"), {
+            "title": "Benchmark {}".format(i), "author": rng.choice(authors), "publish_date": random_date(rng).isoformat(),
+            "isbn": "{:013d}".format(i), "price": "9.99",
+        })
+        for i in range(count)
+    ])
+    scenarios["login"] = ("login", [("post", reverse("login"), {"email": EMAIL, "password": PASSWORD})] * count)
+    return scenarios
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else None
+
+
+def run(route, requests, concurrency, token):
+    cache.clear()
+    registry.reset()
+    pending = iter(requests)
+    lock = threading.Lock()
+    latencies, statuses = [], []
+
+    def worker():
+        client = Client(HTTP_AUTHORIZATION="Token {}".format(token))
+        while True:
+            with lock:
+                request = next(pending, None)
+            if request is None:
+                break
+            method, url, data = request
+            start = time.perf_counter()
+            response = getattr(client, method)(url, data)
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+                statuses.append(response.status_code)
+        connections.close_all()
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    hits = sum(count for (name, _, result), count in registry.cache.items() if name == route and result == "hit")
+    lookups = sum(count for (name, _, _), count in registry.cache.items() if name == route)
+    return {
+        "requests": len(latencies),
+        "requests_per_second": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "queries_per_request": round(registry.queries[route] / max(registry.sampled[route], 1), 2),
+        "cache_hit_rate": round(hits / lookups, 3) if lookups else None,
+        "statuses": {str(code): statuses.count(code) for code in sorted(set(statuses))},
+    }
+
+
+def compare(results, baseline, max_regression):
+    comparison, regressions = {}, []
+    for name, result in results.items():
+        before = baseline["results"].get(name)
+        if before is None:
+            continue
+        changes = {}
+        for metric in ("p95_ms", "queries_per_request"):
+            if before[metric]:
+                changes[metric] = round(result[metric] / before[metric] - 1, 3)
+                if changes[metric] > max_regression:
+                    regressions.append("{} {}".format(name, metric))
+            elif result[metric]:
+                regressions.append("{} {}".format(name, metric))
+        comparison[name] = changes
+    return comparison, regressions
+
+
+def get_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--books", type=int, default=20000)
+    parser.add_argument("--requests", type=int, default=200, help="Requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--scenarios", nargs="+", help="Only run these scenarios")
+    parser.add_argument("--no-cache", action="store_true", help="Turn the book response cache off")
+    parser.add_argument("--output", help="Write the results to this file")
+    parser.add_argument("--compare", help="Results of an earlier run to compare with")
+    parser.add_argument("--max-regression", type=float, default=0.2)
+    args = parser.parse_args()
+
+    setup_test_environment()
+    # A file database so the request threads share committed data
+    database = os.path.join(tempfile.mkdtemp(), "bench.sqlite3")
+    connection.settings_dict["TEST"]["NAME"] = database
+    connection.creation.create_test_db(verbosity=0, serialize=False)
+    try:
+        seed.seed_books(args.books, args.seed)
+        User.objects.create_user(email=EMAIL, password=PASSWORD)
+        token = Token.objects.create(user=User.objects.get(email=EMAIL)).key
+        rng = random.Random(args.seed)
+        authors = list(Book.objects.values_list("author", flat=True).distinct().order_by("author"))
+        ids = list(Book.objects.values_list("id", flat=True).order_by("id"))
+        scenarios = get_scenarios(rng, args.requests, authors, ids)
+
+        overrides = {
+            # SlidingWindowThrottle reads the rates on every request, views without a rate aren't throttled
+            "REST_FRAMEWORK": {**settings.REST_FRAMEWORK, "DEFAULT_THROTTLE_RATES": {}},
+            "METRICS_SAMPLE_RATE": 1.0,
+            "METRICS_SLOW_REQUEST_SECONDS": float("inf"),
+        }
+        if args.no_cache:
+            overrides.update(BOOK_CACHE_TIMEOUT=0, BOOK_CACHE_STALE_TIMEOUT=0)
+        results = {}
+        with override_settings(**overrides):
+            for name, (route, requests) in scenarios.items():
+                if not args.scenarios or name in args.scenarios:
+                    results[name] = run(route, requests, args.concurrency, token)
+
+        output = {"commit": get_commit(), "settings": vars(args), "results": results}
+        regressions = []
+        if args.compare:
+            with open(args.compare, encoding="utf-8") as baseline:
+                output["comparison"], regressions = compare(results, json.load(baseline), args.max_regression)
+            output["regressions"] = regressions
+        print(json.dumps(output, indent=2))
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as file:
+                json.dump(output, file, indent=2)
+    finally:
+        connection.creation.destroy_test_db(database, verbosity=0)
+        reset_pool()
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Login benchmark.
+
+Sends concurrent logins to /api/account/login/ while reader threads poll /api/books/,
+first with passwords hashed in the request thread (ACCOUNTS_HASHER_WORKERS=0, the old
+behaviour) and then through the bounded hashing pool, and prints the results as JSON.
+
+    python -m benchmarks.bench_login --logins 400 --concurrency 16 --readers 4
+"""
+import argparse
+import json
+import os
+import tempfile
+import threading
+import time
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "book_challenge.settings.settings_dev")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.core.cache import cache  # noqa: E402
+from django.db import connection, connections  # noqa: E402
+from django.test import Client, override_settings  # noqa: E402
+from django.test.utils import setup_test_environment  # noqa: E402
+
+from accounts.hashing import reset_pool  # noqa: E402
+from accounts.models import User  # noqa: E402
+from books.models import Book  # noqa: E402
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else None
+
+
+def summary(latencies, statuses, elapsed):
+    return {
+        "requests": len(latencies),
+        "requests_per_second": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 1),
+        "statuses": {str(code): statuses.count(code) for code in sorted(set(statuses))},
+    }
+
+
+def run(logins, concurrency, readers):
+    cache.clear()
+    reset_pool()
+    credentials = {"email": "bench@example.com", "password": "benchmark-password"}
+    remaining = iter(range(logins))
+    lock = threading.Lock()
+    done = threading.Event()
+    login_latencies, login_statuses = [], []
+    read_latencies, read_statuses = [], []
+
+    def login_worker():
+        client = Client()
+        while True:
+            with lock:
+                if next(remaining, None) is None:
+                    break
+            start = time.perf_counter()
+            response = client.post("/api/account/login/", credentials)
+            with lock:
+                login_latencies.append(time.perf_counter() - start)
+                login_statuses.append(response.status_code)
+        connections.close_all()
+
+    def read_worker():
+        client = Client()
+        while not done.is_set():
+            start = time.perf_counter()
+            response = client.get("/api/books/", {"author": "Author"})
+            with lock:
+                read_latencies.append(time.perf_counter() - start)
+                read_statuses.append(response.status_code)
+        connections.close_all()
+
+    reader_threads = [threading.Thread(target=read_worker) for _ in range(readers)]
+    login_threads = [threading.Thread(target=login_worker) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in reader_threads + login_threads:
+        thread.start()
+    for thread in login_threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    done.set()
+    for thread in reader_threads:
+        thread.join()
+
+    return {
+        "login": summary(login_latencies, login_statuses, elapsed),
+        "books_list_during_logins": summary(read_latencies, read_statuses, elapsed),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--pool-workers", type=int, default=settings.ACCOUNTS_HASHER_WORKERS)
+    args = parser.parse_args()
+
+    setup_test_environment()
+    # A file database so the request threads share committed data
+    database = os.path.join(tempfile.mkdtemp(), "bench.sqlite3")
+    connection.settings_dict["TEST"]["NAME"] = database
+    connection.creation.create_test_db(verbosity=0, serialize=False)
+    try:
+        User.objects.create_user(email="bench@example.com", password="benchmark-password")
+        Book.objects.create(title="Book", author="Author", publish_date="2000-01-01", isbn="9780000000000", price=10)
+        rest_framework = {**settings.REST_FRAMEWORK, "DEFAULT_THROTTLE_CLASSES": []}
+        results = {}
+        for mode, workers in (("request_thread", 0), ("pool", args.pool_workers)):
+            # Waiting callers are allowed for the whole run so the comparison measures throughput, not shedding
+            with override_settings(REST_FRAMEWORK=rest_framework, ACCOUNTS_HASHER_WORKERS=workers,
+                                   ACCOUNTS_HASHER_MAX_WAITING=args.concurrency, ACCOUNTS_HASHER_WAIT_TIMEOUT=60):
+                results[mode] = run(args.logins, args.concurrency, args.readers)
+        print(json.dumps({"settings": vars(args), "results": results}, indent=2))
+    finally:
+        connection.creation.destroy_test_db(database, verbosity=0)
+        reset_pool()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Rendering and compression benchmark.
+
+Renders a list page of --rows books (BookRowSerializer output, the payload of /api/books/)
+with DRF's JSONRenderer and with FastJSONRenderer, then compresses it with gzip and brotli
+at the configured levels, and prints the best of --repeat runs and the payload sizes as JSON.
+
+    python -m benchmarks.bench_render --rows 1000 10000
+"""
+import argparse
+import datetime
+import json
+import os
+import time
+
+from decimal import Decimal
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "book_challenge.settings.settings_dev")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.test import RequestFactory  # noqa: E402
+from django.test.utils import setup_test_environment  # noqa: E402
+
+from rest_framework.renderers import JSONRenderer  # noqa: E402
+
+from book_challenge import compression  # noqa: E402
+from book_challenge.renderers import FastJSONRenderer, orjson  # noqa: E402
+from books.serializers import BookRowSerializer  # noqa: E402
+
+
+def best_of(repeat, func):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def make_page(count):
+    updated_at = datetime.datetime(2023, 1, 2, 3, 4, 5, 678901, tzinfo=datetime.timezone.utc)
+    rows = [
+        {"id": i, "title": "Book {}".format(i), "author": "Author {}".format(i % 100),
+         "publish_date": datetime.date(2000, 1, 1) + datetime.timedelta(days=i % 5000),
+         "isbn": "{:013d}".format(i), "price": Decimal(i % 100) + Decimal("0.99"),
+         "book_image": "book_images/{}.png".format(i) if i % 2 else None,
+         "thumbnails": {"small": {"jpeg": "book_images/thumbnails/{}/small.jpg".format(i)}} if i % 2 else {},
+         "updated_at": updated_at}
+        for i in range(count)
+    ]
+    data = BookRowSerializer(rows, context={"request": RequestFactory().get("/api/books/")}).data
+    return {"next": "http://testserver/api/books/?cursor=abc", "previous": None, "books": data}
+
+
+def run(count, repeat):
+    page = make_page(count)
+    content = JSONRenderer().render(page)
+    results = {
+        "json_renderer_ms": round(best_of(repeat, lambda: JSONRenderer().render(page)) * 1000, 2),
+        "fast_json_renderer_ms": round(best_of(repeat, lambda: FastJSONRenderer().render(page)) * 1000, 2),
+        "identity_bytes": len(content),
+    }
+    results["render_speedup"] = round(results["json_renderer_ms"] / results["fast_json_renderer_ms"], 1)
+    for encoding in compression.get_encodings():
+        compressed = compression.Compressor(encoding).compress(content)
+        results[encoding] = {
+            "compress_ms": round(best_of(repeat, lambda: compression.Compressor(encoding).compress(content)) * 1000, 2),
+            "bytes": len(compressed),
+            "ratio": round(len(content) / len(compressed), 1),
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    setup_test_environment()
+    results = {"rows_{}".format(count): run(count, args.repeat) for count in args.rows}
+    print(json.dumps({
+        "settings": vars(args), "orjson": orjson is not None, "brotli": compression.brotli is not None, "results": results,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
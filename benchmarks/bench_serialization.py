@@ -0,0 +1,96 @@
+"""
+Serialization benchmark.
+
+Serializes the same books with BookSerializer (model instances, the old list path) and with
+BookRowSerializer (values() rows, the list fast path), with and without a sparse fieldset,
+and prints the best of --repeat runs as JSON. "serialize" times only the serializer, "total"
+includes reading the rows.
+
+    python -m benchmarks.bench_serialization --books 10000
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "book_challenge.settings.settings_dev")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.db import connection  # noqa: E402
+from django.test import RequestFactory  # noqa: E402
+from django.test.utils import setup_test_environment  # noqa: E402
+
+from books.models import Book  # noqa: E402
+from books.serializers import BookRowSerializer, BookSerializer  # noqa: E402
+
+
+def best_of(repeat, func):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def measure(repeat, read, serialize):
+    rows = read()
+    return {
+        "serialize_ms": round(best_of(repeat, lambda: serialize(rows)) * 1000, 1),
+        "total_ms": round(best_of(repeat, lambda: serialize(read())) * 1000, 1),
+    }
+
+
+def run(repeat, fields):
+    context = {"request": RequestFactory().get("/api/books/")}
+    queryset = Book.objects.order_by("id")
+    results = {
+        "book_serializer": measure(
+            repeat, lambda: list(queryset.only(*fields) if fields else queryset),
+            lambda books: BookSerializer(books, many=True, fields=fields, context=context).data,
+        ),
+        "row_serializer": measure(
+            repeat, lambda: list(queryset.values(*fields) if fields else queryset.values()),
+            lambda rows: BookRowSerializer(rows, fields=fields, context=context).data,
+        ),
+    }
+    for timing in ("serialize_ms", "total_ms"):
+        results["speedup_" + timing[:-3]] = round(
+            results["book_serializer"][timing] / results["row_serializer"][timing], 1,
+        )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--books", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    setup_test_environment()
+    database = os.path.join(tempfile.mkdtemp(), "bench.sqlite3")
+    connection.settings_dict["TEST"]["NAME"] = database
+    connection.creation.create_test_db(verbosity=0, serialize=False)
+    try:
+        Book.objects.bulk_create([
+            Book(title="Book {}".format(i), author="Author {}".format(i % 100), publish_date="2000-01-01",
+                 isbn="{:013d}".format(i), price=i % 100 + 0.99,
+                 book_image="book_images/{}.png".format(i) if i % 2 else None,
+                 thumbnails={"small": {"jpeg": "book_images/thumbnails/{}/small.jpg".format(i)}} if i % 2 else {})
+            for i in range(args.books)
+        ], batch_size=1000)
+        results = {
+            "all_fields": run(args.repeat, None),
+            "id_title_price": run(args.repeat, ["id", "title", "price"]),
+        }
+        print(json.dumps({"settings": vars(args), "results": results}, indent=2))
+    finally:
+        connection.creation.destroy_test_db(database, verbosity=0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Throttle benchmark.
+
+Calls allow_request of DRF's UserRateThrottle (a list of timestamps per client) and of
+SlidingWindowThrottle (two counters per client) for one client that already made --history
+requests in the current window, and prints the cost of the next --requests requests and the
+size of the cached state as JSON. The limit is never reached, so every request is counted.
+
+    python -m benchmarks.bench_throttle --history 10 1000 10000 --requests 1000
+"""
+import argparse
+import json
+import os
+import time
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "book_challenge.settings.settings_dev")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.contrib.auth.models import AnonymousUser  # noqa: E402
+from django.core.cache import cache  # noqa: E402
+from django.test.utils import override_settings  # noqa: E402
+
+from rest_framework.request import Request  # noqa: E402
+from rest_framework.test import APIRequestFactory  # noqa: E402
+from rest_framework.throttling import UserRateThrottle  # noqa: E402
+
+from book_challenge.throttling import SlidingWindowThrottle  # noqa: E402
+
+
+def measure(throttle_class, history, requests):
+    cache.clear()
+    request = Request(APIRequestFactory().get("/api/books/"))
+    request.user = AnonymousUser()
+    view = object()
+    rate = "{}/min".format(history + requests + 1)
+    rates = {"user": rate, "anon": rate}
+    throttle_class.THROTTLE_RATES = rates
+    with override_settings(REST_FRAMEWORK={"DEFAULT_THROTTLE_RATES": rates}):
+        for _ in range(history):
+            throttle_class().allow_request(request, view)
+        start = time.perf_counter()
+        for _ in range(requests):
+            throttle_class().allow_request(request, view)
+        elapsed = time.perf_counter() - start
+    state = sum(len(value) for value in cache._cache.values()) if hasattr(cache, "_cache") else None
+    return {"us_per_request": round(elapsed / requests * 1e6, 1), "cached_bytes": state}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--history", type=int, nargs="+", default=[10, 1000, 10000])
+    parser.add_argument("--requests", type=int, default=1000)
+    args = parser.parse_args()
+
+    results = {}
+    for history in args.history:
+        results["history_{}".format(history)] = {
+            "drf_user_rate_throttle": measure(UserRateThrottle, history, args.requests),
+            "sliding_window_throttle": measure(SlidingWindowThrottle, history, args.requests),
+        }
+    print(json.dumps({"settings": vars(args), "cache": settings.CACHES["default"]["BACKEND"], "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
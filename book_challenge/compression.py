@@ -0,0 +1,136 @@
+import zlib
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Response compression negotiated from Accept-Encoding.
+# Brotli is used when the client accepts it and the brotli package is installed, gzip otherwise. Responses smaller
+# than COMPRESSION_MIN_SIZE are sent as they are, a list page of books is ~10x smaller compressed but a short error
+# payload isn't worth the CPU. Streaming responses (book exports) are compressed chunk by chunk, each chunk is
+# flushed so the client still gets the rows as they are produced.
+# Only the content types in COMPRESSION_CONTENT_TYPES are compressed. HTML pages (admin, login, browsable API) carry
+# CSRF tokens next to reflected input, compressing them would open them to BREACH.
+
+DEFAULT_CONTENT_TYPES = ("application/json", "application/x-ndjson", "text/csv")
+
+
+def get_min_size():
+    return getattr(settings, "COMPRESSION_MIN_SIZE", 1024)
+
+
+def is_compressible(response):
+    content_type = response.get("Content-Type", "").split(";")[0].strip().lower()
+    return content_type in getattr(settings, "COMPRESSION_CONTENT_TYPES", DEFAULT_CONTENT_TYPES)
+
+
+def get_encodings():
+    # Supported encodings, preferred first
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def parse_accept_encoding(header):
+    # {coding: q} of an Accept-Encoding header
+    accepted = {}
+    for item in header.split(","):
+        coding, _, params = item.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[coding] = quality
+    return accepted
+
+
+def choose_encoding(header):
+    accepted = parse_accept_encoding(header)
+    best, best_quality = None, 0.0
+    for coding in get_encodings():
+        quality = accepted.get(coding, accepted.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = coding, quality
+    return best
+
+
+class Compressor:
+    def __init__(self, encoding):
+        if encoding == "br":
+            self.compressor = brotli.Compressor(quality=getattr(settings, "COMPRESSION_BROTLI_QUALITY", 5))
+            self.process, self.flush, self.finish = (
+                self.compressor.process, self.compressor.flush, self.compressor.finish,
+            )
+        else:
+            # wbits 31 writes the gzip header and trailer
+            self.compressor = zlib.compressobj(getattr(settings, "COMPRESSION_GZIP_LEVEL", 6), zlib.DEFLATED, 31)
+            self.process, self.finish = self.compressor.compress, self.compressor.flush
+            self.flush = lambda: self.compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def compress(self, content):
+        return self.process(content) + self.finish()
+
+    def compress_chunk(self, chunk):
+        return self.process(chunk) + self.flush()
+
+
+def compress_sequence(chunks, encoding):
+    compressor = Compressor(encoding)
+    for chunk in chunks:
+        data = compressor.compress_chunk(chunk)
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+async def acompress_sequence(chunks, encoding):
+    compressor = Compressor(encoding)
+    async for chunk in chunks:
+        data = compressor.compress_chunk(chunk)
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    def process_response(self, request, response):
+        if response.has_header("Content-Encoding") or not is_compressible(response):
+            return response
+        if not response.streaming and len(response.content) < get_min_size():
+            return response
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+        encoding = choose_encoding(request.META.get("HTTP_ACCEPT_ENCODING", ""))
+        if encoding is None:
+            return response
+
+        if response.streaming:
+            if response.is_async:
+                response.streaming_content = acompress_sequence(response.streaming_content, encoding)
+            else:
+                response.streaming_content = compress_sequence(response.streaming_content, encoding)
+            del response.headers["Content-Length"]
+        else:
+            content = Compressor(encoding).compress(response.content)
+            if len(content) >= len(response.content):
+                return response
+            response.content = content
+            response.headers["Content-Length"] = str(len(content))
+
+        # The compressed bytes differ from the identity ones, strong ETags become weak (RFC 9110 8.8.1).
+        # The book APIs compare If-None-Match weakly, so conditional requests keep matching.
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response.headers["ETag"] = "W/" + etag
+        response.headers["Content-Encoding"] = encoding
+        return response
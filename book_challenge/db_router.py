@@ -0,0 +1,149 @@
+import random
+import time
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+# Primary / replica routing.
+# Writes always go to the primary ("default"). Reads go to one of DATABASE_REPLICAS only inside
+# replica_reads(), which the book read APIs enter, and only while the request hasn't written anything.
+# After a write the client gets a cookie that keeps its reads on the primary for
+# DATABASE_REPLICA_PIN_SECONDS, so it reads its own writes even if the replicas lag behind.
+
+PIN_COOKIE = "primary_pin"
+
+
+class RoutingState:
+    def __init__(self, pinned=False):
+        self.pinned = pinned
+        self.replica_reads = False
+        self.wrote = False
+
+
+_state = ContextVar("db_routing_state", default=None)
+
+
+def get_replicas():
+    return getattr(settings, "DATABASE_REPLICAS", [])
+
+
+def get_pin_seconds():
+    return getattr(settings, "DATABASE_REPLICA_PIN_SECONDS", 5)
+
+
+@contextmanager
+def replica_reads():
+    state = _state.get()
+    if state is None:
+        state = RoutingState()
+        token = _state.set(state)
+    else:
+        token = None
+    previous = state.replica_reads
+    state.replica_reads = True
+    try:
+        yield state
+    finally:
+        state.replica_reads = previous
+        if token is not None:
+            _state.reset(token)
+
+
+def is_pinned():
+    # Whether the current request has to see the client's own writes
+    state = _state.get()
+    return state is not None and (state.pinned or state.wrote)
+
+
+def reads_from_replicas():
+    # Whether the reads of the current request go to a replica
+    state = _state.get()
+    return bool(get_replicas()) and state is not None and state.replica_reads and not state.pinned and not state.wrote
+
+
+class ReplicaReadMixin:
+    # Book read APIs whose queries may be served by a replica
+    def dispatch(self, request, *args, **kwargs):
+        with replica_reads():
+            return super().dispatch(request, *args, **kwargs)
+
+
+def read_from_replicas(view):
+    # replica_reads() for function views, sync or async
+    if iscoroutinefunction(view):
+        async def wrapper(*args, **kwargs):
+            with replica_reads():
+                return await view(*args, **kwargs)
+    else:
+        def wrapper(*args, **kwargs):
+            with replica_reads():
+                return view(*args, **kwargs)
+    return wraps(view)(wrapper)
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if not reads_from_replicas():
+            return "default"
+        return random.choice(get_replicas())
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema through replication
+        return db not in get_replicas()
+
+
+class PrimaryPinMiddleware:
+    # Tracks the routing state of a request and sets the pin cookie after writes
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def get_state(self, request):
+        try:
+            pinned = float(request.COOKIES.get(PIN_COOKIE, 0)) > time.time()
+        except ValueError:
+            pinned = False
+        return RoutingState(pinned=pinned)
+
+    def pin(self, response, state):
+        if state.wrote and get_replicas():
+            pin_seconds = get_pin_seconds()
+            response.set_cookie(PIN_COOKIE, str(int(time.time() + pin_seconds)), max_age=pin_seconds, httponly=True,
+                                samesite="Lax")
+        return response
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state = self.get_state(request)
+        token = _state.set(state)
+        try:
+            return self.pin(self.get_response(request), state)
+        finally:
+            _state.reset(token)
+
+    async def __acall__(self, request):
+        state = self.get_state(request)
+        token = _state.set(state)
+        try:
+            return self.pin(await self.get_response(request), state)
+        finally:
+            _state.reset(token)
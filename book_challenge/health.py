@@ -0,0 +1,90 @@
+import hmac
+import logging
+import os
+import threading
+import time
+
+from collections import Counter
+
+from django.conf import settings
+from django.core.signals import request_finished
+from django.db import DatabaseError, connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import JsonResponse
+
+# Database health check and connection counters of this process.
+# connections_opened / requests is close to 0 when persistent connections are reused and 1 when every
+# request opens its own connection. Counters are per process, so every gunicorn worker reports its own.
+# The root urlconf imports this module, so the receivers are connected before a request opens a connection.
+# Anonymous callers only get ok/error, the details are for monitoring requests: the ones carrying the MONITORING_TOKEN
+# or coming from MONITORING_ALLOWED_IPS.
+
+logger = logging.getLogger(__name__)
+
+_stats = Counter()
+_stats_lock = threading.Lock()
+_started = time.time()
+
+
+@receiver(connection_created)
+def count_connection(sender, connection, **kwargs):
+    with _stats_lock:
+        _stats[connection.alias] += 1
+
+
+@receiver(request_finished)
+def count_request(sender, **kwargs):
+    with _stats_lock:
+        _stats[None] += 1
+
+
+def get_stats():
+    with _stats_lock:
+        stats = dict(_stats)
+    requests = stats.pop(None, 0)
+    uptime = time.time() - _started
+    return {
+        "pid": os.getpid(),
+        "uptime_seconds": round(uptime, 1),
+        "requests": requests,
+        "connections_opened": stats,
+        "connections_opened_per_second": round(sum(stats.values()) / uptime, 3) if uptime else 0,
+        "connections_opened_per_request": round(sum(stats.values()) / requests, 3) if requests else None,
+    }
+
+
+def reset_stats():
+    global _started
+    with _stats_lock:
+        _stats.clear()
+        _started = time.time()
+
+
+def check_database(alias):
+    try:
+        with connections[alias].cursor() as cursor:
+            cursor.execute("SELECT 1")
+        return "ok"
+    except DatabaseError:
+        logger.exception("Health check of the %s database failed", alias)
+        return "error"
+
+
+def is_monitoring_request(request):
+    if request.META.get("REMOTE_ADDR") in getattr(settings, "MONITORING_ALLOWED_IPS", ()):
+        return True
+    token = getattr(settings, "MONITORING_TOKEN", "")
+    if not token:
+        return False
+    return hmac.compare_digest(request.headers.get("Authorization", ""), "Bearer {}".format(token))
+
+
+def health(request):
+    # API database health and connection reuse of this worker, for load balancer checks
+    databases = {alias: check_database(alias) for alias in ["default"] + list(getattr(settings, "DATABASE_REPLICAS", []))}
+    healthy = all(state == "ok" for state in databases.values())
+    data = {"status": "ok" if healthy else "error"}
+    if is_monitoring_request(request):
+        data.update(databases=databases, **get_stats())
+    return JsonResponse(data, status=200 if healthy else 503)
@@ -0,0 +1,297 @@
+import bisect
+import glob
+import json
+import logging
+import os
+import random
+import threading
+import time
+
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import HttpResponse, HttpResponseForbidden
+
+from book_challenge import health
+
+# Request metrics per route (the URL name), exported in the Prometheus text format on /metrics.
+# Every request is counted in a latency histogram and its book cache lookups are counted. A share of the requests
+# (METRICS_SAMPLE_RATE) also times its SQL queries and serialization, requests slower than METRICS_SLOW_REQUEST_SECONDS
+# are logged with their SQL. Values are kept per process. With METRICS_DIR set, every worker also writes its values to
+# <METRICS_DIR>/<pid>.json at most every METRICS_WRITE_INTERVAL seconds and /metrics exports the sum of all the files,
+# so a scrape sees every worker whichever one answers it.
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+MAX_LOGGED_QUERIES = 50
+
+
+class RequestMetrics:
+    __slots__ = ("sampled", "queries", "query_seconds", "serialization_seconds", "cache", "statements")
+
+    def __init__(self, sampled):
+        self.sampled = sampled
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.serialization_seconds = 0.0
+        self.cache = []
+        self.statements = []
+
+
+_current = ContextVar("request_metrics", default=None)
+
+
+class Registry:
+    COUNTERS = ("requests", "latency_sum", "sampled", "queries", "query_seconds", "serialization_seconds", "cache")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.write_lock = threading.Lock()
+        self.written = 0
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.buckets = tuple(getattr(settings, "METRICS_LATENCY_BUCKETS", DEFAULT_BUCKETS))
+            self.requests = Counter()
+            self.latency = defaultdict(lambda: [0] * (len(self.buckets) + 1))
+            self.latency_sum = Counter()
+            self.sampled = Counter()
+            self.queries = Counter()
+            self.query_seconds = Counter()
+            self.serialization_seconds = Counter()
+            self.cache = Counter()
+            self.connections = None
+
+    def snapshot(self):
+        with self.lock:
+            data = {name: list(getattr(self, name).items()) for name in self.COUNTERS}
+            data["buckets"] = list(self.buckets)
+            data["latency"] = [(route, list(counts)) for route, counts in self.latency.items()]
+        data["connections"] = list(health.get_stats()["connections_opened"].items())
+        return data
+
+    def merge(self, data):
+        # Adds a snapshot of another process, JSON turned the tuple keys into lists
+        with self.lock:
+            for name in self.COUNTERS:
+                counter = getattr(self, name)
+                for key, value in data[name]:
+                    counter[tuple(key) if isinstance(key, list) else key] += value
+            if tuple(data["buckets"]) == self.buckets:
+                for route, counts in data["latency"]:
+                    self.latency[route] = [total + count for total, count in zip(self.latency[route], counts)]
+            self.connections = self.connections or Counter()
+            for alias, count in data["connections"]:
+                self.connections[alias] += count
+
+    def write(self, directory, force=False):
+        # Writes this process' values for the other workers, replaced atomically so a scrape never reads half a file
+        interval = getattr(settings, "METRICS_WRITE_INTERVAL", 5)
+        if not force and time.monotonic() - self.written < interval:
+            return
+        if not self.write_lock.acquire(blocking=force):
+            return
+        try:
+            path = os.path.join(directory, "{}.json".format(os.getpid()))
+            with open(path + ".tmp", "w") as output:
+                json.dump(self.snapshot(), output)
+            os.replace(path + ".tmp", path)
+            self.written = time.monotonic()
+        finally:
+            self.write_lock.release()
+
+    def observe(self, route, method, status, duration, metrics):
+        with self.lock:
+            self.requests[(route, method, status)] += 1
+            self.latency[route][bisect.bisect_left(self.buckets, duration)] += 1
+            self.latency_sum[route] += duration
+            for kind, hit in metrics.cache:
+                self.cache[(route, kind, "hit" if hit else "miss")] += 1
+            if metrics.sampled:
+                self.sampled[route] += 1
+                self.queries[route] += metrics.queries
+                self.query_seconds[route] += metrics.query_seconds
+                self.serialization_seconds[route] += metrics.serialization_seconds
+
+    def render(self):
+        lines = []
+
+        def family(name, kind, help_text, samples):
+            lines.append("# HELP {} {}".format(name, help_text))
+            lines.append("# TYPE {} {}".format(name, kind))
+            lines.extend(format_sample(name, labels, value) for labels, value in samples)
+
+        with self.lock:
+            family("http_requests_total", "counter", "Requests by route, method and status.", [
+                ((("route", route), ("method", method), ("status", status)), count)
+                for (route, method, status), count in sorted(self.requests.items())
+            ])
+            lines.append("# HELP http_request_duration_seconds Request latency by route.")
+            lines.append("# TYPE http_request_duration_seconds histogram")
+            for route, counts in sorted(self.latency.items()):
+                total = 0
+                for bound, count in zip(self.buckets + ("+Inf",), counts):
+                    total += count
+                    lines.append(format_sample("http_request_duration_seconds_bucket", (("route", route), ("le", bound)), total))
+                lines.append(format_sample("http_request_duration_seconds_sum", (("route", route),), round(self.latency_sum[route], 6)))
+                lines.append(format_sample("http_request_duration_seconds_count", (("route", route),), total))
+            family("http_sampled_requests_total", "counter", "Requests whose queries and serialization were timed.", [
+                ((("route", route),), count) for route, count in sorted(self.sampled.items())
+            ])
+            family("db_queries_total", "counter", "SQL queries of the sampled requests.", [
+                ((("route", route),), count) for route, count in sorted(self.queries.items())
+            ])
+            family("db_query_duration_seconds_total", "counter", "SQL time of the sampled requests.", [
+                ((("route", route),), round(seconds, 6)) for route, seconds in sorted(self.query_seconds.items())
+            ])
+            family("serialization_duration_seconds_total", "counter", "Serializer time of the sampled requests.", [
+                ((("route", route),), round(seconds, 6)) for route, seconds in sorted(self.serialization_seconds.items())
+            ])
+            family("book_cache_requests_total", "counter", "Book response cache lookups by route, kind and result.", [
+                ((("route", route), ("kind", kind), ("result", result)), count)
+                for (route, kind, result), count in sorted(self.cache.items())
+            ])
+        connections = self.connections if self.connections is not None else health.get_stats()["connections_opened"]
+        family("db_connections_opened_total", "counter", "Database connections opened by the exported processes.", [
+            ((("alias", alias),), count) for alias, count in sorted(connections.items())
+        ])
+        return "\n".join(lines) + "\n"
+
+
+def format_sample(name, labels, value):
+    label_text = ",".join('{}="{}"'.format(key, escape(label)) for key, label in labels)
+    return "{}{{{}}} {}".format(name, label_text, value) if label_text else "{} {}".format(name, value)
+
+
+def escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+registry = Registry()
+
+
+def render_metrics():
+    directory = getattr(settings, "METRICS_DIR", "")
+    if not directory:
+        return registry.render()
+    registry.write(directory, force=True)
+    combined = Registry()
+    for path in glob.glob(os.path.join(directory, "*.json")):
+        try:
+            with open(path) as snapshot:
+                combined.merge(json.load(snapshot))
+        except (OSError, ValueError):
+            logger.warning("Skipping unreadable metrics file %s", path)
+    return combined.render()
+
+
+def time_query(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is None or not metrics.sampled:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = time.perf_counter() - start
+        metrics.queries += 1
+        metrics.query_seconds += duration
+        if len(metrics.statements) < MAX_LOGGED_QUERIES:
+            metrics.statements.append((sql, duration))
+
+
+def install_query_timer(connection):
+    if time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(time_query)
+
+
+@receiver(connection_created)
+def instrument_connection(sender, connection, **kwargs):
+    # Connections opened in other threads too, like the ORM calls of async views
+    install_query_timer(connection)
+
+
+def count_cache(kind, hit):
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.cache.append((kind, hit))
+
+
+@contextmanager
+def timed_serialization():
+    metrics = _current.get()
+    if metrics is None or not metrics.sampled:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.serialization_seconds += time.perf_counter() - start
+
+
+class MetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+        # Connections opened before this module was imported, later ones get the timer from connection_created
+        for connection in connections.all(initialized_only=True):
+            install_query_timer(connection)
+
+    def start(self):
+        sampled = random.random() < getattr(settings, "METRICS_SAMPLE_RATE", 1.0)
+        metrics = RequestMetrics(sampled)
+        return metrics, _current.set(metrics), time.perf_counter()
+
+    def finish(self, request, response, metrics, start):
+        duration = time.perf_counter() - start
+        match = getattr(request, "resolver_match", None)
+        route = match.view_name if match else "unmatched"
+        registry.observe(route, request.method, response.status_code, duration, metrics)
+        if getattr(settings, "METRICS_DIR", ""):
+            registry.write(settings.METRICS_DIR)
+        if metrics.sampled and duration >= getattr(settings, "METRICS_SLOW_REQUEST_SECONDS", 1.0):
+            logger.warning(
+                "Slow request %s %s (%s) %.3fs, %s queries in %.3fs\n%s", request.method, request.get_full_path(), route,
+                duration, metrics.queries, metrics.query_seconds,
+                "\n".join("{:.4f}s {}".format(seconds, sql) for sql, seconds in metrics.statements),
+            )
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        metrics, token, start = self.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.finish(request, response, metrics, start)
+        return response
+
+    async def __acall__(self, request):
+        metrics, token, start = self.start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.finish(request, response, metrics, start)
+        return response
+
+
+def metrics_view(request):
+    # API metrics of this process (or of every worker with METRICS_DIR) in the Prometheus text format
+    if not health.is_monitoring_request(request):
+        return HttpResponseForbidden()
+    return HttpResponse(render_metrics(), content_type="text/plain; version=0.0.4; charset=utf-8")
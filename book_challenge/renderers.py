@@ -0,0 +1,35 @@
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# JSON rendering through orjson when it's installed, DRF's JSONRenderer otherwise.
+# orjson encodes dicts, lists, strings, numbers and dates natively, everything else (Decimal, datetime, lazy strings...)
+# goes through DRF's JSONEncoder.default, so the output is the same as JSONRenderer's. One difference: list subclasses
+# are written from their list items, so Django's form ErrorList (which keeps them in .data) has to be converted first.
+
+if orjson is not None:
+    ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+
+def dumps(data):
+    # Compact UTF-8 JSON bytes, like JSONRenderer with UNICODE_JSON and COMPACT_JSON
+    if orjson is None:
+        return FastJSONRenderer().render(data)
+    # DRF's encoder cuts datetimes to milliseconds and writes UTC as Z, datetimes are passed through to it
+    content = orjson.dumps(data, default=JSONEncoder().default, option=ORJSON_OPTIONS)
+    if b"\xe2\x80\xa8" in content or b"\xe2\x80\xa9" in content:
+        # Same escaping as JSONRenderer, these are line terminators in JavaScript
+        content = content.replace(b"\xe2\x80\xa8", b"\\u2028").replace(b"\xe2\x80\xa9", b"\\u2029")
+    return content
+
+
+class FastJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None or self.get_indent(accepted_media_type, renderer_context or {}):
+            # Indented output for clients asking for it keeps the stdlib encoder
+            return super().render(data, accepted_media_type, renderer_context)
+        return dumps(data)
@@ -7,25 +7,132 @@ BASE_DIR = Path(__file__).resolve().parent.parent.parent
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'accounts.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend'
     ],
+    # orjson when it's installed, same output as DRF's JSONRenderer
+    'DEFAULT_RENDERER_CLASSES': [
+        'book_challenge.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
     'DEFAULT_THROTTLE_CLASSES': [
-        'rest_framework.throttling.AnonRateThrottle',
-        'rest_framework.throttling.UserRateThrottle'
+        'book_challenge.throttling.SlidingWindowThrottle',
     ],
+    # Views with a throttle_scope use the rate of their scope, the others "anon" or "user"
     'DEFAULT_THROTTLE_RATES': {
         'anon': '10/min',
-        'user': '10/min'
+        'user': '10/min',
+        'books_read': '10/min',
+        'books_write': '10/min',
     }
 }
 
+# Request metrics exported on /metrics: share of the requests whose SQL and serialization are timed,
+# latency histogram buckets in seconds, and the duration above which a sampled request is logged with its SQL
+METRICS_SAMPLE_RATE = 1.0
+METRICS_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+METRICS_SLOW_REQUEST_SECONDS = 1.0
+# Directory shared by the gunicorn workers, each one writes its metrics there every METRICS_WRITE_INTERVAL seconds
+# and /metrics exports the sum. Empty exports the metrics of the worker answering the scrape only
+METRICS_DIR = os.environ.get('METRICS_DIR', '')
+METRICS_WRITE_INTERVAL = 5
+
+# Monitoring clients send "Authorization: Bearer <MONITORING_TOKEN>" or come from one of MONITORING_ALLOWED_IPS to read
+# /metrics and the database states and connection counters of api/health/, everyone else only gets ok/error from
+# api/health/ and a 403 from /metrics. Empty turns them off
+MONITORING_TOKEN = os.environ.get('MONITORING_TOKEN', '')
+MONITORING_ALLOWED_IPS = os.environ.get('MONITORING_ALLOWED_IPS', '').split()
+
+# Responses of at least COMPRESSION_MIN_SIZE bytes are sent with brotli or gzip when the client accepts it.
+# Brotli quality 0-11 and gzip level 1-9, the defaults trade a little size for a lot of CPU
+COMPRESSION_MIN_SIZE = 1024
+# Only these content types are compressed, HTML with CSRF tokens is left alone against BREACH
+COMPRESSION_CONTENT_TYPES = ('application/json', 'application/x-ndjson', 'text/csv')
+COMPRESSION_BROTLI_QUALITY = 5
+COMPRESSION_GZIP_LEVEL = 6
+
+# Cache holding the rate limit counters, shared by every process when it's redis
+THROTTLE_CACHE_ALIAS = 'default'
+
 AUTH_USER_MODEL = 'accounts.User'
 
+# Password hashing runs in a bounded pool per process, requests that can't get a slot
+# within ACCOUNTS_HASHER_WAIT_TIMEOUT seconds get a 503. 0 workers hashes in the request thread.
+AUTHENTICATION_BACKENDS = ['accounts.backends.PooledHasherBackend']
+ACCOUNTS_HASHER_WORKERS = 2
+ACCOUNTS_HASHER_MAX_WAITING = 8
+ACCOUNTS_HASHER_WAIT_TIMEOUT = 2
+
+# Cache of token -> user used by CachedTokenAuthentication
+AUTH_TOKEN_CACHE_ALIAS = 'default'
+AUTH_TOKEN_CACHE_TIMEOUT = 300
+
+# Book list pagination, clients can ask for up to BOOK_LIST_MAX_PAGE_SIZE rows with ?page_size=
+BOOK_LIST_PAGE_SIZE = 50
+BOOK_LIST_MAX_PAGE_SIZE = 500
+
+# Local memory cache for dev and tests, production overrides it with redis
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+# Cache used by the book list and detail APIs, entries are invalidated on every book write
+BOOK_CACHE_ALIAS = 'default'
+BOOK_CACHE_TIMEOUT = 300
+# A missed list entry is computed by one request at a time: the lock expires after BOOK_CACHE_LOCK_TIMEOUT seconds,
+# concurrent requests get the expired copy of the entry (kept BOOK_CACHE_STALE_TIMEOUT seconds, 0 disables it, never
+# after a write) or wait up to BOOK_CACHE_LOCK_WAIT seconds for the new one, blocking their thread in the sync views
+BOOK_CACHE_STALE_TIMEOUT = 600
+BOOK_CACHE_LOCK_TIMEOUT = 10
+BOOK_CACHE_LOCK_WAIT = 2
+
+# Book counts that would read more than BOOK_COUNT_EXACT_THRESHOLD rows (the admin changelist) are estimated from the
+# last exact count of the same query, cached BOOK_COUNT_CACHE_TIMEOUT seconds, or from the PostgreSQL planner
+BOOK_COUNT_EXACT_THRESHOLD = 10000
+BOOK_COUNT_CACHE_TIMEOUT = 300
+
+# Bulk book APIs, the most books accepted per request and the rows per INSERT/UPDATE statement
+BOOK_BULK_MAX_ITEMS = 500
+BOOK_BULK_BATCH_SIZE = 500
+
+# Most ids or isbns accepted by the batch book lookup API
+BOOK_BATCH_MAX_ITEMS = 300
+
+# Book facets API: width of the price buckets, most authors returned, and whether unfiltered facets
+# are read from the BookFacetCount summary (fill it with python manage.py rebuild_book_facets first)
+BOOK_FACET_PRICE_BUCKET = 10
+BOOK_FACET_AUTHOR_LIMIT = 50
+BOOK_FACET_SUMMARY = False
+
+# Rows fetched per round trip by the streaming book export
+BOOK_EXPORT_CHUNK_SIZE = 2000
+
+# Book import, rows per upsert and how many rejected rows the import API reports back
+BOOK_IMPORT_BATCH_SIZE = 1000
+BOOK_IMPORT_MAX_REPORTED_REJECTS = 100
+
+# Book image thumbnails, generated in a background thread pool after the upload is saved
+BOOK_THUMBNAIL_SIZES = {
+    'small': (160, 240),
+    'medium': (320, 480),
+}
+BOOK_THUMBNAIL_FORMATS = ('webp', 'jpeg')
+BOOK_THUMBNAIL_QUALITY = 80
+BOOK_THUMBNAIL_WORKERS = 2
+BOOK_THUMBNAIL_ASYNC = True
+
 DATABASES = {}
 
+# Database aliases the book read APIs may read from, see book_challenge.db_router.
+# A client that wrote something keeps reading from the primary for DATABASE_REPLICA_PIN_SECONDS
+DATABASE_REPLICAS = []
+DATABASE_REPLICA_PIN_SECONDS = 5
+DATABASE_ROUTERS = ['book_challenge.db_router.PrimaryReplicaRouter']
+
 # Application definition
 
 INSTALLED_APPS = [
@@ -43,7 +150,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'book_challenge.metrics.MetricsMiddleware',
+    'book_challenge.compression.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'book_challenge.db_router.PrimaryPinMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -1,3 +1,5 @@
+import os
+
 from .base import *
 
 # SECURITY WARNING: don't run with debug turned on in production!
@@ -13,5 +15,15 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+    },
+    # Read replica to try the database router locally: copy db.sqlite3 to db_replica.sqlite3
+    # and start the server with DATABASE_REPLICA=1. Tests mirror it to the default database
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'db_replica.sqlite3',
+        'TEST': {'MIRROR': 'default'},
     }
-}
\ No newline at end of file
+}
+
+if os.environ.get("DATABASE_REPLICA"):
+    DATABASE_REPLICAS = ['replica']
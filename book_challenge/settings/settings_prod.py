@@ -9,8 +9,31 @@ SECRET_KEY = os.environ.get("SECRET_KEY")
 
 ALLOWED_HOSTS = os.environ.get("ALLOWED_HOSTS").split(" ")
 
+# Database connections: "persistent" keeps the connection of every worker thread open for DATABASE_CONN_MAX_AGE
+# seconds and checks it before reusing it, "pgbouncer" does the same through a transaction pooler,
+# "off" opens a connection per request (use it under ASGI, where connections aren't reused).
+# The number of connections follows the gunicorn workers and threads, see gunicorn.conf.py
+DATABASE_CONNECTIONS = os.environ.get("DATABASE_CONNECTIONS", "persistent")
+DATABASE_CONN_MAX_AGE = 0 if DATABASE_CONNECTIONS == "off" else int(os.environ.get("DATABASE_CONN_MAX_AGE", 600))
+
+
+def database_config(url):
+    config = dj_database_url.parse(url, conn_max_age=DATABASE_CONN_MAX_AGE, conn_health_checks=DATABASE_CONN_MAX_AGE > 0)
+    if DATABASE_CONNECTIONS == "pgbouncer":
+        # A transaction pooler can't keep the server side cursors of iterator() open across transactions
+        config["DISABLE_SERVER_SIDE_CURSORS"] = True
+    return config
+
+
 database_url = os.environ.get("DATABASE_URL")
-DATABASES["default"] = dj_database_url.parse(database_url)
+DATABASES["default"] = database_config(database_url)
+
+# Optional read replicas, space separated urls
+for index, replica_url in enumerate(os.environ.get("DATABASE_REPLICA_URLS", "").split(), start=1):
+    alias = "replica{}".format(index)
+    DATABASES[alias] = database_config(replica_url)
+    DATABASES[alias]["TEST"] = {"MIRROR": "default"}
+    DATABASE_REPLICAS.append(alias)
 
 CACHES = {
     'default': {
@@ -0,0 +1,58 @@
+import json
+
+from contextlib import contextmanager
+
+from django.db import connections
+from django.test.utils import CaptureQueriesContext
+
+# Query budgets for API tests.
+# assertQueryBudget fails when the block runs more than max_queries queries and, on PostgreSQL, when the plan of
+# one of its SELECTs (EXPLAIN) has a sequential scan expected to read more than seq_scan_rows rows. The failure
+# message lists the offending SQL, and the plan for scans. Other databases only check the number of queries.
+
+
+def explain(connection, sql):
+    with connection.cursor() as cursor:
+        cursor.execute("EXPLAIN (FORMAT JSON) " + sql)
+        plan = cursor.fetchone()[0]
+    # psycopg2 decodes json columns, other drivers return the text
+    return (json.loads(plan) if isinstance(plan, str) else plan)[0]["Plan"]
+
+
+def find_seq_scans(plan, max_rows):
+    # Sequential scan nodes of a plan expected to read more than max_rows rows
+    scans = []
+    if plan.get("Node Type") == "Seq Scan" and plan.get("Plan Rows", 0) > max_rows:
+        scans.append(plan)
+    for child in plan.get("Plans", []):
+        scans.extend(find_seq_scans(child, max_rows))
+    return scans
+
+
+def format_queries(queries):
+    return "\n".join("{}. {}".format(number, query["sql"]) for number, query in enumerate(queries, start=1))
+
+
+class QueryBudgetMixin:
+    @contextmanager
+    def assertQueryBudget(self, max_queries, seq_scan_rows=None, using="default"):
+        connection = connections[using]
+        with CaptureQueriesContext(connection) as context:
+            yield context
+
+        queries = context.captured_queries
+        if len(queries) > max_queries:
+            self.fail("{} queries executed, the budget is {}:\n{}".format(
+                len(queries), max_queries, format_queries(queries),
+            ))
+        if seq_scan_rows is None or connection.vendor != "postgresql":
+            return
+        for query in queries:
+            if not query["sql"].lstrip().upper().startswith("SELECT"):
+                continue
+            scans = find_seq_scans(explain(connection, query["sql"]), seq_scan_rows)
+            if scans:
+                self.fail("Sequential scan of {} over {} rows:\n{}\n{}".format(
+                    ", ".join(sorted({scan["Relation Name"] for scan in scans})), seq_scan_rows, query["sql"],
+                    json.dumps(scans, indent=2),
+                ))
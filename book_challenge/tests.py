@@ -0,0 +1,292 @@
+import datetime
+import gzip
+import json
+import os
+
+from decimal import Decimal
+from tempfile import TemporaryDirectory
+from unittest.mock import patch
+
+import brotli
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, connection
+from django.db.backends.signals import connection_created
+from django.test import TestCase, override_settings
+
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from books.models import Book
+
+from book_challenge import health
+from book_challenge.compression import choose_encoding
+from book_challenge.metrics import Registry, RequestMetrics, registry
+from book_challenge.renderers import FastJSONRenderer
+from book_challenge.testing import QueryBudgetMixin, find_seq_scans
+from book_challenge.throttling import SlidingWindowThrottle, get_script
+
+
+@override_settings(MONITORING_TOKEN="secret")
+class HealthAPITestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.url = "/api/health/"
+        self.monitoring = {"HTTP_AUTHORIZATION": "Bearer secret"}
+        health.reset_stats()
+
+    def test_health(self):
+        response = self.client.get(self.url, **self.monitoring)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["databases"], {"default": "ok"})
+
+    def test_anonymous_callers_only_get_the_status(self):
+        for headers in [{}, {"HTTP_AUTHORIZATION": "Bearer wrong"}]:
+            response = self.client.get(self.url, **headers)
+
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response.json(), {"status": "ok"})
+
+    def test_database_down(self):
+        with patch.object(health, "check_database", return_value="error"):
+            response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(response.json(), {"status": "error"})
+
+    def test_check_database_error(self):
+        with patch.object(connection, "cursor", side_effect=DatabaseError("down")):
+            with self.assertLogs("book_challenge.health", "ERROR") as logs:
+                self.assertEqual(health.check_database("default"), "error")
+
+        self.assertIn("down", "\n".join(logs.output))
+
+    def test_connection_counters(self):
+        for _ in range(3):
+            self.client.get(self.url)
+        connection_created.send(sender=connection.__class__, connection=connection)
+
+        stats = health.get_stats()
+        self.assertEqual(stats["requests"], 3)
+        self.assertEqual(stats["connections_opened"], {"default": 1})
+        self.assertEqual(stats["connections_opened_per_request"], 0.333)
+
+
+class SlidingWindowThrottleTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.rest_framework = {
+            **settings.REST_FRAMEWORK,
+            "DEFAULT_THROTTLE_RATES": {"anon": "3/min", "user": "3/min", "books_read": "2/min", "books_write": "1/min"},
+        }
+
+    def get(self, url, now):
+        with patch.object(SlidingWindowThrottle, "timer", return_value=now):
+            return self.client.get(url)
+
+    def test_scoped_rates(self):
+        with override_settings(REST_FRAMEWORK=self.rest_framework):
+            statuses = [self.get("/api/books/", 60).status_code for _ in range(3)]
+            self.assertEqual(statuses, [200, 200, 429])
+            # Other scopes have their own budget
+            self.assertEqual(self.get("/api/health/", 60).status_code, 200)
+            self.assertEqual(self.client.post("/api/book/bulk/delete/", {"ids": []}, format="json").status_code, 401)
+
+    def test_previous_window_is_weighted(self):
+        with override_settings(REST_FRAMEWORK=self.rest_framework):
+            self.get("/api/books/", 100)
+            self.get("/api/books/", 110)
+            # 30 s into the next window half of the previous window still counts: 2 * 0.5 + 1 <= 2
+            self.assertEqual(self.get("/api/books/", 150).status_code, 200)
+            response = self.get("/api/books/", 150)
+            self.assertEqual(response.status_code, 429)
+            # 2 * (1 - 30 / 60) + 1 + 1 > 2 until the previous window is gone, the rejected request isn't counted
+            self.assertEqual(response["Retry-After"], "30")
+            self.assertEqual(self.get("/api/books/", 180).status_code, 200)
+            self.assertEqual(self.get("/api/books/", 180).status_code, 429)
+
+    def test_async_views_are_throttled(self):
+        book = Book.objects.create(title="Book 1", author="Author A", publish_date="2000-01-01", isbn="9780000000001", price=10)
+        statuses = [self.get("/api/async/books/", 60).status_code for _ in range(15)]
+        self.assertEqual(statuses, [200] * 10 + [429] * 5)
+        response = self.get(f"/api/async/book/{book.id}/", 60)
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response["Retry-After"], "66")
+        # Same budget as the sync read APIs
+        self.assertEqual(self.get("/api/books/", 60).status_code, 429)
+
+    def test_in_process_fallback(self):
+        self.assertIsNone(get_script(cache))
+
+
+@override_settings(MONITORING_TOKEN="secret")
+class MetricsTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        registry.reset()
+        self.client = APIClient()
+        Book.objects.create(title="Book 1", author="Author A", publish_date="2000-01-01", isbn="9780000000001", price=10)
+
+    def get_metrics(self):
+        response = self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer secret")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.content.decode().splitlines()
+
+    def test_request_metrics(self):
+        self.client.get("/api/books/")
+        self.client.get("/api/books/")
+
+        lines = self.get_metrics()
+        self.assertIn('http_requests_total{route="books-list",method="GET",status="200"} 2', lines)
+        self.assertIn('http_request_duration_seconds_bucket{route="books-list",le="+Inf"} 2', lines)
+        self.assertIn('http_request_duration_seconds_count{route="books-list"} 2', lines)
+        self.assertIn('http_sampled_requests_total{route="books-list"} 2', lines)
+        self.assertIn('book_cache_requests_total{route="books-list",kind="list",result="hit"} 1', lines)
+        self.assertIn('book_cache_requests_total{route="books-list",kind="list",result="miss"} 1', lines)
+        queries = [line for line in lines if line.startswith('db_queries_total{route="books-list"}')]
+        self.assertEqual(len(queries), 1)
+        self.assertGreater(int(queries[0].split()[-1]), 0)
+        self.assertTrue(any(line.startswith('serialization_duration_seconds_total{route="books-list"}') for line in lines))
+
+    def test_requires_the_token_or_an_allowed_ip(self):
+        self.assertEqual(self.client.get("/metrics").status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer wrong").status_code, status.HTTP_403_FORBIDDEN)
+        with override_settings(MONITORING_ALLOWED_IPS=["127.0.0.1"]):
+            self.assertEqual(self.client.get("/metrics").status_code, status.HTTP_200_OK)
+
+    def test_metrics_of_every_worker(self):
+        directory = TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        other = Registry()
+        other.observe("books-list", "GET", 200, 0.001, RequestMetrics(sampled=False))
+        with open(os.path.join(directory.name, "1.json"), "w") as output:
+            json.dump(other.snapshot(), output)
+
+        with override_settings(METRICS_DIR=directory.name):
+            self.client.get("/api/books/")
+            lines = self.get_metrics()
+
+        self.assertIn('http_requests_total{route="books-list",method="GET",status="200"} 2', lines)
+        self.assertIn('http_request_duration_seconds_count{route="books-list"} 2', lines)
+        self.assertTrue(os.path.exists(os.path.join(directory.name, "{}.json".format(os.getpid()))))
+
+    @override_settings(METRICS_SAMPLE_RATE=0)
+    def test_unsampled_requests_are_only_counted(self):
+        self.client.get("/api/books/")
+
+        lines = self.get_metrics()
+        self.assertIn('http_requests_total{route="books-list",method="GET",status="200"} 1', lines)
+        self.assertFalse(any(line.startswith('db_queries_total{route="books-list"}') for line in lines))
+
+    @override_settings(METRICS_SLOW_REQUEST_SECONDS=0)
+    def test_slow_requests_are_logged_with_their_sql(self):
+        with self.assertLogs("book_challenge.metrics", "WARNING") as logs:
+            self.client.get("/api/books/")
+
+        self.assertIn("books-list", logs.output[0])
+        self.assertIn("SELECT", logs.output[0])
+
+
+class FastJSONRendererTestCase(TestCase):
+    def test_same_output_as_json_renderer(self):
+        data = {
+            "price": Decimal("10.99"), "publish_date": datetime.date(2002, 12, 1), "title": "Book \u2028 é",
+            "updated_at": datetime.datetime(2023, 1, 2, 3, 4, 5, 678901, tzinfo=datetime.timezone.utc),
+            "thumbnails": {"small": None}, "count": 1, 2: [1.5, True],
+        }
+
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+        self.assertEqual(FastJSONRenderer().render(None), b"")
+
+    def test_indent(self):
+        content = FastJSONRenderer().render({"id": 1}, "application/json; indent=2")
+
+        self.assertEqual(content, b'{\n  "id": 1\n}')
+
+
+class CompressionTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        Book.objects.bulk_create([
+            Book(title="Book {}".format(i), author="Author {}".format(i), publish_date="2002-12-01",
+                 isbn="{:013d}".format(i), price=10.99)
+            for i in range(10)
+        ])
+
+    def test_choose_encoding(self):
+        self.assertEqual(choose_encoding("gzip, deflate, br"), "br")
+        self.assertEqual(choose_encoding("gzip;q=1.0, br;q=0.5"), "gzip")
+        self.assertEqual(choose_encoding("br;q=0, *"), "gzip")
+        self.assertIsNone(choose_encoding("identity"))
+        self.assertIsNone(choose_encoding(""))
+
+    def test_brotli(self):
+        plain = self.client.get("/api/books/")
+        response = self.client.get("/api/books/", HTTP_ACCEPT_ENCODING="gzip, br")
+
+        self.assertEqual(response["Content-Encoding"], "br")
+        self.assertIn("Accept-Encoding", response["Vary"])
+        self.assertEqual(response["ETag"], "W/" + plain["ETag"])
+        self.assertEqual(json.loads(brotli.decompress(response.content)), plain.json())
+        self.assertLess(len(response.content), len(plain.content))
+
+    def test_gzip_and_conditional_request(self):
+        response = self.client.get("/api/books/", HTTP_ACCEPT_ENCODING="gzip")
+
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(json.loads(gzip.decompress(response.content))["books"][0]["title"], "Book 0")
+        response = self.client.get("/api/books/", HTTP_ACCEPT_ENCODING="gzip", HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_small_responses_are_not_compressed(self):
+        with override_settings(COMPRESSION_MIN_SIZE=100000):
+            response = self.client.get("/api/books/", HTTP_ACCEPT_ENCODING="gzip, br")
+
+        self.assertFalse(response.has_header("Content-Encoding"))
+        self.assertEqual(len(response.json()["books"]), 10)
+
+    def test_html_is_not_compressed(self):
+        response = self.client.get("/api/books/", HTTP_ACCEPT="text/html", HTTP_ACCEPT_ENCODING="gzip, br")
+
+        self.assertTrue(response["Content-Type"].startswith("text/html"))
+        self.assertGreater(len(response.content), 1024)
+        self.assertFalse(response.has_header("Content-Encoding"))
+
+    def test_streaming_export(self):
+        response = self.client.get("/api/books/export/ndjson/", HTTP_ACCEPT_ENCODING="gzip")
+
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        lines = gzip.decompress(b"".join(response.streaming_content)).splitlines()
+        self.assertEqual(len(lines), 10)
+
+
+class QueryBudgetTestCase(QueryBudgetMixin, TestCase):
+    def test_within_budget(self):
+        with self.assertQueryBudget(1, seq_scan_rows=0):
+            list(Book.objects.all())
+
+    def test_over_budget_fails_with_the_sql(self):
+        with self.assertRaises(AssertionError) as context:
+            with self.assertQueryBudget(1):
+                list(Book.objects.all())
+                Book.objects.filter(author="Author 1").count()
+
+        self.assertIn("2 queries executed, the budget is 1", str(context.exception))
+        self.assertIn('"books_book"."author" = Author 1', str(context.exception).replace("'", ""))
+
+    def test_find_seq_scans(self):
+        plan = {
+            "Node Type": "Nested Loop", "Plan Rows": 10, "Plans": [
+                {"Node Type": "Seq Scan", "Relation Name": "books_book", "Plan Rows": 5000},
+                {"Node Type": "Seq Scan", "Relation Name": "authtoken_token", "Plan Rows": 3},
+                {"Node Type": "Index Scan", "Relation Name": "books_book", "Plan Rows": 1},
+            ],
+        }
+
+        self.assertEqual([scan["Relation Name"] for scan in find_seq_scans(plan, 1000)], ["books_book"])
+        self.assertEqual(find_seq_scans(plan, 5000), [])
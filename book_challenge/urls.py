@@ -1,8 +1,13 @@
 from django.contrib import admin
 from django.urls import path, include
 
+from book_challenge.health import health
+from book_challenge.metrics import metrics_view
+
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path("api/health/", health, name="health"),
+    path("metrics", metrics_view, name="metrics"),
     path("api/account/", include("accounts.urls")),
     path("api/", include("books.urls")),
 ]
@@ -1,3 +1,34 @@
 from django.contrib import admin
+from django.core.paginator import Paginator
+from django.db import transaction
+from django.utils.functional import cached_property
 
-# Register your models here.
+from books.counting import count_books
+from books.models import Book
+from books.signals import batch_deletions
+
+
+class EstimatedCountPaginator(Paginator):
+    # Changelist pages don't COUNT(*) every matching book, large results get an estimate (see books.counting)
+    estimated = False
+
+    @cached_property
+    def count(self):
+        count, self.estimated = count_books(self.object_list)
+        return count
+
+
+@admin.register(Book)
+class BookAdmin(admin.ModelAdmin):
+    list_display = ("title", "author", "publish_date", "isbn", "price", "updated_at")
+    list_filter = ("publish_date",)
+    search_fields = ("title", "author", "=isbn")
+    ordering = ("-id",)
+    readonly_fields = ("thumbnails", "updated_at")
+    paginator = EstimatedCountPaginator
+    # Skips the second COUNT(*) over the whole table behind "N results (M total)"
+    show_full_result_count = False
+
+    def delete_queryset(self, request, queryset):
+        with transaction.atomic(), batch_deletions():
+            super().delete_queryset(request, queryset)
@@ -1,50 +1,358 @@
-from rest_framework.generics import ListAPIView, CreateAPIView, RetrieveAPIView, UpdateAPIView, DestroyAPIView
+import codecs
+
+from rest_framework import status
+from rest_framework.generics import GenericAPIView, ListAPIView, CreateAPIView, RetrieveAPIView, UpdateAPIView, DestroyAPIView
 from rest_framework.permissions import IsAuthenticated
-from rest_framework.authentication import TokenAuthentication
-from rest_framework.parsers import MultiPartParser, FormParser
+from rest_framework.exceptions import NotFound
+from rest_framework.parsers import JSONParser, MultiPartParser, FormParser
+from rest_framework.response import Response
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import Http404, StreamingHttpResponse
 
 from django_filters.rest_framework import DjangoFilterBackend
 
+from accounts.authentication import CachedTokenAuthentication
+from book_challenge.db_router import ReplicaReadMixin
+
+from books import cache as book_cache
+from books.changes import InvalidCursor, get_changes
+from books.conditional import detail_validators, is_conditional, list_validators, make_validators, not_modified_response, set_validators
+from books.counting import count_books
 from books.models import Book
 
+from books.export import CONTENT_TYPES, stream_books
+from books.facets import get_facets
 from books.filters import BookFilter
+from books.importer import IMPORT_FORMATS, guess_format, import_books
+
+from books.pagination import KeysetPagination
 
-from books.serializers import BookSerializer
+from books.serializers import BookRowSerializer, BookSerializer, get_book_fields, parse_fields
+from books.signals import batch_deletions
 
 
-class BookListAPI(ListAPIView):
+class BookListAPI(ReplicaReadMixin, ListAPIView):
     # API get list of books
     queryset = Book.objects.all()
+    throttle_scope = "books_read"
     serializer_class = BookSerializer
     filter_backends = [DjangoFilterBackend]
     filterset_class = BookFilter
+    pagination_class = KeysetPagination
+
+    def list(self, request, *args, **kwargs):
+        # The ETag of a list comes from max(updated_at) over the filtered books and the latest deletion,
+        # clients with the current version get a 304 without the page being fetched or serialized
+        key = book_cache.list_key(request)
+        entry = book_cache.lookup(key, "list")
+        if entry is None:
+            queryset = self.filter_queryset(self.get_queryset())
+            validators = None
+            if is_conditional(request):
+                validators = list_validators(queryset, book_cache.request_signature(request))
+                not_modified = not_modified_response(request, validators)
+                if not_modified is not None:
+                    return not_modified
+            entry = book_cache.single_flight(key, "list", lambda: self.get_entry(queryset, request, validators))
+        return (not_modified_response(request, entry["validators"])
+                or set_validators(Response(entry["data"]), entry["validators"]))
+
+    def get_entry(self, queryset, request, validators=None):
+        if validators is None:
+            validators = list_validators(queryset, book_cache.request_signature(request))
+        # Large results get an estimated count unless the client asks for ?count=exact
+        count, estimated = count_books(queryset, exact=request.query_params.get("count") == "exact")
+        return {"data": self.get_page_data(queryset, request, count, estimated), "validators": validators}
+
+    def get_page_data(self, queryset, request, count=None, count_estimated=False):
+        # Rows are read with values() and only the requested fields plus the cursor columns are selected
+        fields = parse_fields(request.query_params.get("fields"))
+        columns = set(fields or get_book_fields()) | set(self.paginator.get_ordering_columns(request))
+        page = self.paginate_queryset(queryset.values(*columns))
+        serializer = BookRowSerializer(page, fields=fields, context=self.get_serializer_context())
+        return self.paginator.get_paginated_data(serializer.data, count, count_estimated)
+
+
+class BookFacetsAPI(ReplicaReadMixin, GenericAPIView):
+    # API count the filtered books per author, publish year and price bucket, takes the books list filters
+    queryset = Book.objects.all()
+    throttle_scope = "books_read"
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = BookFilter
+
+    def get(self, request, *args, **kwargs):
+        key = book_cache.list_key(request)
+        data = book_cache.lookup(key, "facets")
+        if data is None:
+            filtered = any(name in request.query_params for name in BookFilter.base_filters)
+            queryset = self.filter_queryset(self.get_queryset())
+            data = book_cache.single_flight(key, "facets", lambda: get_facets(queryset, filtered=filtered))
+        return Response(data)
+
+
+class BookExportAPI(GenericAPIView):
+    # API stream the filtered books as CSV or NDJSON, rows are read in chunks so memory stays flat
+    queryset = Book.objects.all()
+    throttle_scope = "books_read"
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = BookFilter
+
+    def get(self, request, export_format, *args, **kwargs):
+        if export_format not in CONTENT_TYPES:
+            raise NotFound("Unsupported export format")
+        queryset = self.filter_queryset(self.get_queryset())
+        response = StreamingHttpResponse(stream_books(queryset, export_format), content_type=CONTENT_TYPES[export_format])
+        response["Content-Disposition"] = 'attachment; filename="books.{}"'.format(export_format)
+        return response
+
+
+class BookChangesAPI(GenericAPIView):
+    # API list books created, updated or deleted since a cursor, mirrors keep polling with the returned cursor
+    queryset = Book.objects.all()
+    throttle_scope = "books_read"
+    serializer_class = BookSerializer
+    pagination_class = KeysetPagination
+
+    def get(self, request, *args, **kwargs):
+        try:
+            books, deletions, cursor, has_more = get_changes(
+                request.query_params.get("cursor"), self.paginator.get_page_size(request),
+            )
+        except InvalidCursor:
+            raise NotFound("Invalid cursor")
+        return Response({
+            "cursor": cursor,
+            "has_more": has_more,
+            "books": self.get_serializer(books, many=True).data,
+            "deleted": [
+                {"id": deletion.book_id, "isbn": deletion.isbn, "deleted_at": deletion.deleted_at}
+                for deletion in deletions
+            ],
+        })
+
+
+class BookBatchAPI(ReplicaReadMixin, GenericAPIView):
+    # API get many books by a list of ids or isbns, books come back in request order with the keys not found in missing.
+    # Ids are served from the book detail cache where possible and the rest is read with one query.
+    queryset = Book.objects.all()
+    throttle_scope = "books_read"
+    parser_classes = (JSONParser,)
+
+    def post(self, request, *args, **kwargs):
+        data = request.data if isinstance(request.data, dict) else {}
+        lookup = "isbns" if "isbns" in data else "ids"
+        keys = data.get(lookup)
+        key_type = str if lookup == "isbns" else int
+        max_items = getattr(settings, "BOOK_BATCH_MAX_ITEMS", 300)
+        if not isinstance(keys, list) or not all(type(key) is key_type for key in keys):
+            return Response({lookup: "Expected a list of book {}".format(lookup)}, status=status.HTTP_400_BAD_REQUEST)
+        if len(keys) > max_items:
+            return Response({lookup: "At most {} books per request".format(max_items)}, status=status.HTTP_400_BAD_REQUEST)
+
+        keys = list(dict.fromkeys(keys))
+        # Read before the database, the fetched books are stored under it
+        self.generation = book_cache.get_generation()
+        books = self.get_books_by_isbn(keys) if lookup == "isbns" else self.get_books_by_id(keys)
+        return Response({
+            "books": [books[key] for key in keys if key in books],
+            "missing": [key for key in keys if key not in books],
+        })
+
+    def get_books_by_id(self, ids):
+        variant = self.request.get_host()
+        keys = {pk: book_cache.detail_key(pk, self.generation) for pk in ids}
+        cached = book_cache.lookup_many(list(keys.values()), "detail", variant=variant)
+        books = {pk: cached[key]["data"] for pk, key in keys.items() if key in cached}
+        missing = [pk for pk in ids if pk not in books]
+        if missing:
+            books.update((book["id"], book) for book in self.fetch(self.get_queryset().filter(pk__in=missing)))
+        return books
+
+    def get_books_by_isbn(self, isbns):
+        # Served by the unique index on isbn
+        return {book["isbn"]: book for book in self.fetch(self.get_queryset().filter(isbn__in=isbns))}
+
+    def fetch(self, queryset):
+        # The fetched books are stored in the detail cache too, the same entries GetBookByIdAPI reads
+        rows = list(queryset.values())
+        books = BookRowSerializer(rows, context=self.get_serializer_context()).data
+        variant = self.request.get_host()
+        book_cache.store_many({
+            book_cache.detail_key(row["id"], self.generation): {"data": book, "validators": make_validators(variant, row["updated_at"])}
+            for row, book in zip(rows, books)
+        }, variant=variant)
+        return books
 
 
 class BookCreateAPI(CreateAPIView):
     # API create a new book
     queryset = Book.objects.all()
+    throttle_scope = "books_write"
     serializer_class = BookSerializer
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
     parser_classes = (MultiPartParser, FormParser)
 
 
-class GetBookByIdAPI(RetrieveAPIView):
+class GetBookByIdAPI(ReplicaReadMixin, RetrieveAPIView):
     # API get book by Id
     queryset = Book.objects.all()
+    throttle_scope = "books_read"
     serializer_class = BookSerializer
 
+    def retrieve(self, request, *args, **kwargs):
+        # Image urls are absolute, so entries are only reused for the host (and fieldset) they were rendered for
+        fields = parse_fields(request.query_params.get("fields"))
+        variant = book_cache.detail_variant(request, fields)
+        key = book_cache.detail_key(kwargs["pk"])
+        entry = book_cache.lookup(key, "detail", variant=variant)
+        if entry is None:
+            validators = detail_validators(kwargs["pk"], variant)
+            if validators is None:
+                raise Http404
+            not_modified = not_modified_response(request, validators)
+            if not_modified is not None:
+                return not_modified
+            self.fieldset = fields
+            entry = {"data": super().retrieve(request, *args, **kwargs).data, "validators": validators}
+            book_cache.store(key, entry, variant=variant)
+        return (not_modified_response(request, entry["validators"])
+                or set_validators(Response(entry["data"]), entry["validators"]))
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        fieldset = getattr(self, "fieldset", None)
+        return queryset.only(*fieldset) if fieldset else queryset
+
+    def get_serializer(self, *args, **kwargs):
+        return super().get_serializer(*args, fields=getattr(self, "fieldset", None), **kwargs)
+
 class UpdateBook(UpdateAPIView):
     # API update book by Id
     queryset = Book.objects.all()
+    throttle_scope = "books_write"
     serializer_class = BookSerializer
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
     parser_classes = (MultiPartParser, FormParser)
 
 class DeleteBook(DestroyAPIView):
     # API delete book by Id
     queryset = Book.objects.all()
+    throttle_scope = "books_write"
+    serializer_class = BookSerializer
+    authentication_classes = [CachedTokenAuthentication]
+    permission_classes = [IsAuthenticated]
+
+
+class BookBulkCreateAPI(GenericAPIView):
+    # API create many books from a JSON list, invalid items are reported without rejecting the others
+    queryset = Book.objects.all()
+    throttle_scope = "books_write"
     serializer_class = BookSerializer
-    authentication_classes = [TokenAuthentication]
-    permission_classes = [IsAuthenticated]
\ No newline at end of file
+    authentication_classes = [CachedTokenAuthentication]
+    permission_classes = [IsAuthenticated]
+    parser_classes = (JSONParser,)
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+        try:
+            with transaction.atomic():
+                books = serializer.save()
+        except IntegrityError:
+            return Response({"error": "The batch conflicts with a concurrent write, please retry"},
+                            status=status.HTTP_409_CONFLICT)
+        book_cache.invalidate_books()
+        return Response({"books": BookSerializer(books, many=True, context=self.get_serializer_context()).data,
+                         "errors": serializer.item_errors},
+                        status=status.HTTP_201_CREATED if books else status.HTTP_400_BAD_REQUEST)
+
+
+class BookBulkUpdateAPI(GenericAPIView):
+    # API update many books from a JSON list of full books with their id
+    queryset = Book.objects.all()
+    throttle_scope = "books_write"
+    serializer_class = BookSerializer
+    authentication_classes = [CachedTokenAuthentication]
+    permission_classes = [IsAuthenticated]
+    parser_classes = (JSONParser,)
+
+    def put(self, request, *args, **kwargs):
+        ids = [item.get("id") for item in request.data if isinstance(item, dict)] if isinstance(request.data, list) else []
+        books = Book.objects.filter(id__in=[book_id for book_id in ids if isinstance(book_id, int)])
+        serializer = self.get_serializer(books, data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+        try:
+            with transaction.atomic():
+                books = serializer.save()
+        except IntegrityError:
+            return Response({"error": "The batch conflicts with a concurrent write, please retry"},
+                            status=status.HTTP_409_CONFLICT)
+        book_cache.invalidate_books()
+        return Response({"books": BookSerializer(books, many=True, context=self.get_serializer_context()).data,
+                         "errors": serializer.item_errors},
+                        status=status.HTTP_200_OK if books else status.HTTP_400_BAD_REQUEST)
+
+
+class BookBulkDeleteAPI(GenericAPIView):
+    # API delete many books by a list of ids
+    queryset = Book.objects.all()
+    throttle_scope = "books_write"
+    serializer_class = BookSerializer
+    authentication_classes = [CachedTokenAuthentication]
+    permission_classes = [IsAuthenticated]
+    parser_classes = (JSONParser,)
+
+    def post(self, request, *args, **kwargs):
+        ids = request.data.get("ids") if isinstance(request.data, dict) else None
+        max_items = getattr(settings, "BOOK_BULK_MAX_ITEMS", 500)
+        if not isinstance(ids, list) or not all(isinstance(book_id, int) for book_id in ids):
+            return Response({"ids": "Expected a list of book ids"}, status=status.HTTP_400_BAD_REQUEST)
+        if len(ids) > max_items:
+            return Response({"ids": "At most {} books per request".format(max_items)}, status=status.HTTP_400_BAD_REQUEST)
+
+        with transaction.atomic(), batch_deletions():
+            books = Book.objects.filter(id__in=ids)
+            deleted = list(books.values_list("id", flat=True))
+            books.delete()
+        missing = sorted(set(ids) - set(deleted))
+        return Response({"deleted": sorted(deleted), "missing": missing}, status=status.HTTP_200_OK)
+
+
+class BookImportAPI(GenericAPIView):
+    # API import books from an uploaded CSV or NDJSON file, rows are upserted on isbn
+    queryset = Book.objects.all()
+    throttle_scope = "books_write"
+    authentication_classes = [CachedTokenAuthentication]
+    permission_classes = [IsAuthenticated]
+    parser_classes = (MultiPartParser,)
+
+    def post(self, request, *args, **kwargs):
+        upload = request.FILES.get("file")
+        if upload is None:
+            return Response({"file": "No file was submitted"}, status=status.HTTP_400_BAD_REQUEST)
+        import_format = request.data.get("file_format") or guess_format(upload.name)
+        if import_format not in IMPORT_FORMATS:
+            return Response({"file_format": "Expected one of {}".format(", ".join(IMPORT_FORMATS))},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        rejects = []
+        max_rejects = getattr(settings, "BOOK_IMPORT_MAX_REPORTED_REJECTS", 100)
+
+        def on_reject(line, row, errors):
+            if len(rejects) < max_rejects:
+                rejects.append({"line": line, "errors": errors})
+
+        # The whole upload is decoded once before importing, batches are committed as they go
+        # and a decoding error halfway through would leave the file partly imported
+        try:
+            for _ in codecs.iterdecode(upload.chunks(), "utf-8-sig"):
+                pass
+        except UnicodeDecodeError:
+            return Response({"file": "The file must be UTF-8 encoded"}, status=status.HTTP_400_BAD_REQUEST)
+        upload.seek(0)
+        result = import_books(codecs.iterdecode(upload, "utf-8-sig"), import_format, on_reject=on_reject)
+        return Response({**result, "rejects": rejects}, status=status.HTTP_200_OK)
@@ -0,0 +1,289 @@
+import asyncio
+import hashlib
+import threading
+import time
+import uuid
+
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import caches
+
+from book_challenge import db_router, metrics
+
+# Response cache for the book read APIs.
+# Entries are keyed on a global generation number, so every book write invalidates them all
+# with a single INCR instead of scanning for keys. Requests read the generation before the database, so a read racing
+# a write stores the old row under the old generation, where nothing looks it up anymore.
+# Entries filled by requests reading from a replica live under their own "books:replica" prefix. A replica may still
+# return the rows from before a write, and a client pinned to the primary after its write must not be served them.
+#
+# Missed list and facets entries are computed through single_flight: the first request takes a short lock on the key
+# (cache.add, SET NX on redis) and computes, the others serve the stale copy of the entry, or wait for the new entry
+# up to BOOK_CACHE_LOCK_WAIT seconds. The stale copy outlives the entry's expiry for BOOK_CACHE_STALE_TIMEOUT but is
+# keyed on the same generation, so it is never served after a write. Pinned clients never get it and wait instead.
+# A hot filter that expires or is invalidated then costs one query instead of one per concurrent request.
+# Waiting polls the cache, in the sync views it blocks the worker thread for up to BOOK_CACHE_LOCK_WAIT seconds.
+
+GENERATION_KEY = "books:generation"
+LOCK_POLL_INTERVAL = 0.05
+
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+
+def get_cache():
+    return caches[getattr(settings, "BOOK_CACHE_ALIAS", "default")]
+
+
+def get_timeout():
+    return getattr(settings, "BOOK_CACHE_TIMEOUT", 300)
+
+
+def get_stale_timeout():
+    return getattr(settings, "BOOK_CACHE_STALE_TIMEOUT", 600)
+
+
+def get_lock_timeout():
+    return getattr(settings, "BOOK_CACHE_LOCK_TIMEOUT", 10)
+
+
+def get_lock_wait():
+    return getattr(settings, "BOOK_CACHE_LOCK_WAIT", 2)
+
+
+def get_generation():
+    cache = get_cache()
+    generation = cache.get(GENERATION_KEY)
+    if generation is None:
+        # Start from the clock so an evicted generation never reuses a number older entries were stored under.
+        cache.add(GENERATION_KEY, int(time.time() * 1000), timeout=None)
+        generation = cache.get(GENERATION_KEY)
+    return generation
+
+
+async def aget_generation():
+    cache = get_cache()
+    generation = await cache.aget(GENERATION_KEY)
+    if generation is None:
+        await cache.aadd(GENERATION_KEY, int(time.time() * 1000), timeout=None)
+        generation = await cache.aget(GENERATION_KEY)
+    return generation
+
+
+def normalize_query(query_params):
+    items = sorted(
+        (key, value)
+        for key in query_params
+        for value in query_params.getlist(key)
+        if value != ""
+    )
+    return "&".join("{}={}".format(key, value) for key, value in items)
+
+
+def request_signature(request):
+    # The host is part of it because pagination and image links are absolute urls.
+    return "{}|{}|{}".format(request.get_host(), request.path, normalize_query(request.GET))
+
+
+def key_prefix():
+    return "books:replica" if db_router.reads_from_replicas() else "books"
+
+
+def list_key(request):
+    digest = hashlib.md5(request_signature(request).encode("utf-8")).hexdigest()
+    return "{}:list:{}:{}".format(key_prefix(), get_generation(), digest)
+
+
+async def alist_key(request):
+    digest = hashlib.md5(request_signature(request).encode("utf-8")).hexdigest()
+    return "{}:list:{}:{}".format(key_prefix(), await aget_generation(), digest)
+
+
+def detail_variant(request, fields=None):
+    if fields is None:
+        return request.get_host()
+    return "{}|{}".format(request.get_host(), ",".join(fields))
+
+
+def detail_key(pk, generation=None):
+    # Pass the generation when building many keys, it costs a cache round trip otherwise
+    return "{}:detail:{}:{}".format(key_prefix(), get_generation() if generation is None else generation, pk)
+
+
+async def adetail_key(pk):
+    return "{}:detail:{}:{}".format(key_prefix(), await aget_generation(), pk)
+
+
+def stale_key(key):
+    prefix, kind, generation, digest = key.rsplit(":", 3)
+    return "{}:stale:{}:{}:{}".format(prefix, kind, generation, digest)
+
+
+def serves_stale():
+    return get_stale_timeout() and not db_router.is_pinned()
+
+
+def lock_key(key):
+    return "books:lock:{}".format(key)
+
+
+def record(kind, hit):
+    with _stats_lock:
+        _stats[(kind, "hit" if hit else "miss")] += 1
+    metrics.count_cache(kind, hit)
+
+
+def record_flight(kind, outcome):
+    # "stale" when a stale copy was served, "waited" when the entry computed by another request was
+    with _stats_lock:
+        _stats[(kind, outcome)] += 1
+
+
+def get_stats():
+    with _stats_lock:
+        return {"{}_{}".format(kind, outcome): count for (kind, outcome), count in _stats.items()}
+
+
+def reset_stats():
+    with _stats_lock:
+        _stats.clear()
+
+
+def lookup(key, kind, variant=None):
+    entry = get_cache().get(key)
+    hit = entry is not None and entry["variant"] == variant
+    record(kind, hit)
+    return entry["data"] if hit else None
+
+
+def store(key, data, variant=None):
+    get_cache().set(key, {"variant": variant, "data": data}, get_timeout())
+
+
+def lookup_many(keys, kind, variant=None):
+    # One round trip for many keys, returns {key: data} for the hits
+    entries = get_cache().get_many(keys)
+    found = {}
+    for key in keys:
+        entry = entries.get(key)
+        hit = entry is not None and entry["variant"] == variant
+        record(kind, hit)
+        if hit:
+            found[key] = entry["data"]
+    return found
+
+
+def store_many(items, variant=None):
+    if items:
+        get_cache().set_many({key: {"variant": variant, "data": data} for key, data in items.items()}, get_timeout())
+
+
+async def alookup(key, kind, variant=None):
+    entry = await get_cache().aget(key)
+    hit = entry is not None and entry["variant"] == variant
+    record(kind, hit)
+    return entry["data"] if hit else None
+
+
+async def astore(key, data, variant=None):
+    await get_cache().aset(key, {"variant": variant, "data": data}, get_timeout())
+
+
+def invalidate_books():
+    try:
+        get_cache().incr(GENERATION_KEY)
+    except ValueError:
+        get_generation()
+
+
+def get_data(cache, key, variant):
+    entry = cache.get(key)
+    return entry["data"] if entry is not None and entry["variant"] == variant else None
+
+
+async def aget_data(cache, key, variant):
+    entry = await cache.aget(key)
+    return entry["data"] if entry is not None and entry["variant"] == variant else None
+
+
+def save(cache, key, data, variant):
+    entry = {"variant": variant, "data": data}
+    cache.set(key, entry, get_timeout())
+    if get_stale_timeout():
+        cache.set(stale_key(key), entry, get_stale_timeout())
+
+
+async def asave(cache, key, data, variant):
+    entry = {"variant": variant, "data": data}
+    await cache.aset(key, entry, get_timeout())
+    if get_stale_timeout():
+        await cache.aset(stale_key(key), entry, get_stale_timeout())
+
+
+def release(cache, key, token):
+    # Only our own lock, it may have expired and been taken by another request
+    if cache.get(lock_key(key)) == token:
+        cache.delete(lock_key(key))
+
+
+async def arelease(cache, key, token):
+    if await cache.aget(lock_key(key)) == token:
+        await cache.adelete(lock_key(key))
+
+
+def single_flight(key, kind, compute, variant=None):
+    # Called after a miss, returns the data computed by compute() or by a concurrent request
+    cache = get_cache()
+    token = uuid.uuid4().hex
+    if not cache.add(lock_key(key), token, get_lock_timeout()):
+        data = get_data(cache, stale_key(key), variant) if serves_stale() else None
+        if data is not None:
+            record_flight(kind, "stale")
+            return data
+        deadline = time.monotonic() + get_lock_wait()
+        while time.monotonic() < deadline:
+            time.sleep(LOCK_POLL_INTERVAL)
+            if cache.get(lock_key(key)) is None:
+                break
+        data = get_data(cache, key, variant)
+        if data is not None:
+            record_flight(kind, "waited")
+            return data
+        # The other request failed or is too slow, compute without the lock
+        token = None
+    try:
+        data = compute()
+        save(cache, key, data, variant)
+    finally:
+        if token is not None:
+            release(cache, key, token)
+    return data
+
+
+async def asingle_flight(key, kind, compute, variant=None):
+    # single_flight for the async views, compute is a coroutine function
+    cache = get_cache()
+    token = uuid.uuid4().hex
+    if not await cache.aadd(lock_key(key), token, get_lock_timeout()):
+        data = await aget_data(cache, stale_key(key), variant) if serves_stale() else None
+        if data is not None:
+            record_flight(kind, "stale")
+            return data
+        deadline = time.monotonic() + get_lock_wait()
+        while time.monotonic() < deadline:
+            await asyncio.sleep(LOCK_POLL_INTERVAL)
+            if await cache.aget(lock_key(key)) is None:
+                break
+        data = await aget_data(cache, key, variant)
+        if data is not None:
+            record_flight(kind, "waited")
+            return data
+        token = None
+    try:
+        data = await compute()
+        await asave(cache, key, data, variant)
+    finally:
+        if token is not None:
+            await arelease(cache, key, token)
+    return data
@@ -0,0 +1,70 @@
+import base64
+import binascii
+import json
+
+from django.db.models import Q
+
+from books.models import Book, BookDeletion
+
+# Change feed of the book catalogue.
+# Updated books and deletions are read in (change_seq, id) order, the cursor keeps the last position of both so a mirror
+# only downloads what changed since its last poll. change_seq is handed out in commit order (see BookChangeSequence),
+# so a change committed after a poll always gets a position after the cursor, whatever the clocks say.
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(books_position, deletions_position):
+    data = {"b": books_position, "d": deletions_position}
+    encoded = base64.urlsafe_b64encode(json.dumps(data, separators=(",", ":")).encode("ascii"))
+    return encoded.decode("ascii").rstrip("=")
+
+
+def decode_position(position):
+    if position is None:
+        return None
+    if not isinstance(position, list) or len(position) != 2:
+        raise InvalidCursor
+    if not all(isinstance(value, int) and not isinstance(value, bool) for value in position):
+        raise InvalidCursor
+    return position[0], position[1]
+
+
+def decode_cursor(encoded):
+    if not encoded:
+        return None, None
+    try:
+        padded = encoded + "=" * (-len(encoded) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        return decode_position(data["b"]), decode_position(data["d"])
+    except (TypeError, ValueError, KeyError, binascii.Error, UnicodeEncodeError):
+        raise InvalidCursor
+
+
+def after(queryset, position):
+    if position is None:
+        return queryset
+    change_seq, pk = position
+    return queryset.filter(Q(change_seq__gt=change_seq) | Q(change_seq=change_seq, id__gt=pk))
+
+
+def get_changes(cursor, limit):
+    books_position, deletions_position = decode_cursor(cursor)
+
+    books = list(after(Book.objects.all(), books_position).order_by("change_seq", "id")[:limit + 1])
+    deletions = list(after(BookDeletion.objects.all(), deletions_position).order_by("change_seq", "id")[:limit + 1])
+
+    has_more = len(books) > limit or len(deletions) > limit
+    books, deletions = books[:limit], deletions[:limit]
+    if books:
+        books_position = (books[-1].change_seq, books[-1].pk)
+    if deletions:
+        deletions_position = (deletions[-1].change_seq, deletions[-1].pk)
+
+    next_cursor = encode_cursor(
+        list(books_position) if books_position else None,
+        list(deletions_position) if deletions_position else None,
+    )
+    return books, deletions, next_cursor, has_more
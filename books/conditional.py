@@ -0,0 +1,74 @@
+import hashlib
+
+from django.db.models import Count, Max, Subquery
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from books.models import Book, BookDeletion
+
+# ETag / Last-Modified support for the book read APIs.
+# Validators come from Book.updated_at (and the deletion tombstones for lists), so a client that already has the latest
+# payload gets a 304 without the books being fetched or serialized.
+
+
+def make_validators(signature, updated_at, count=None, last_deletion=None):
+    raw = "{}|{}|{}|{}".format(signature, updated_at.isoformat() if updated_at else "", count, last_deletion)
+    return {
+        "etag": '"{}"'.format(hashlib.md5(raw.encode("utf-8")).hexdigest()),
+        "last_modified": int(updated_at.timestamp()) if updated_at else None,
+    }
+
+
+def detail_validators(pk, signature):
+    updated_at = Book.objects.filter(pk=pk).values_list("updated_at", flat=True).first()
+    if updated_at is None:
+        return None
+    return make_validators(signature, updated_at)
+
+
+def last_deletion():
+    # Latest tombstone id, an uncorrelated subquery evaluated once inside the list aggregate
+    return Max(Subquery(BookDeletion.objects.order_by("-id").values("id")[:1]))
+
+
+def list_validators(queryset, signature):
+    # max(updated_at) changes on every create and update into the filter, the count when a book leaves it
+    # through an update, and the latest tombstone id on every delete
+    aggregate = queryset.order_by().aggregate(
+        updated_at=Max("updated_at"), count=Count("id"), last_deletion=last_deletion(),
+    )
+    return make_validators(signature, aggregate["updated_at"], aggregate["count"], aggregate["last_deletion"])
+
+
+async def adetail_validators(pk, signature):
+    updated_at = await Book.objects.filter(pk=pk).values_list("updated_at", flat=True).afirst()
+    if updated_at is None:
+        return None
+    return make_validators(signature, updated_at)
+
+
+async def alist_validators(queryset, signature):
+    aggregate = await queryset.order_by().aaggregate(
+        updated_at=Max("updated_at"), count=Count("id"), last_deletion=last_deletion(),
+    )
+    return make_validators(signature, aggregate["updated_at"], aggregate["count"], aggregate["last_deletion"])
+
+
+def is_conditional(request):
+    return "HTTP_IF_NONE_MATCH" in request.META or "HTTP_IF_MODIFIED_SINCE" in request.META
+
+
+def set_validators(response, validators):
+    response["ETag"] = validators["etag"]
+    if validators["last_modified"] is not None:
+        response["Last-Modified"] = http_date(validators["last_modified"])
+    return response
+
+
+def not_modified_response(request, validators):
+    response = get_conditional_response(
+        request, etag=validators["etag"], last_modified=validators["last_modified"],
+    )
+    if response is not None:
+        set_validators(response, validators)
+    return response
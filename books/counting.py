@@ -0,0 +1,83 @@
+import hashlib
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import EmptyResultSet
+from django.db import connections
+
+from books import cache as book_cache
+
+# Row counts of large book querysets.
+# An exact COUNT(*) reads every matching row, so once a query is known to match more than BOOK_COUNT_EXACT_THRESHOLD
+# books its count comes from the last exact count of the same query (cached BOOK_COUNT_CACHE_TIMEOUT seconds) or,
+# on PostgreSQL, from the planner statistics, and is flagged as estimated. Smaller results and callers asking for
+# it get an exact count.
+
+
+def get_exact_threshold():
+    return getattr(settings, "BOOK_COUNT_EXACT_THRESHOLD", 10000)
+
+
+def get_cache_timeout():
+    return getattr(settings, "BOOK_COUNT_CACHE_TIMEOUT", 300)
+
+
+def count_key(queryset):
+    sql, params = queryset.query.sql_with_params()
+    digest = hashlib.md5("{}|{}|{!r}".format(queryset.db, sql, params).encode("utf-8")).hexdigest()
+    return "books:count:{}".format(digest)
+
+
+def planner_estimate(queryset):
+    connection = connections[queryset.db]
+    if connection.vendor != "postgresql":
+        return None
+    with connection.cursor() as cursor:
+        if not queryset.query.where:
+            # The whole table, reltuples is kept up to date by ANALYZE and autovacuum (-1 before the first one)
+            cursor.execute("SELECT reltuples FROM pg_class WHERE oid = %s::regclass", [queryset.model._meta.db_table])
+            row = cursor.fetchone()
+            return int(row[0]) if row and row[0] >= 0 else None
+        sql, params = queryset.query.sql_with_params()
+        cursor.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+        plan = cursor.fetchone()[0]
+    return int((json.loads(plan) if isinstance(plan, str) else plan)[0]["Plan"]["Plan Rows"])
+
+
+def count_books(queryset, exact=False):
+    # Returns (count, estimated)
+    queryset = queryset.order_by()
+    try:
+        key = count_key(queryset)
+    except EmptyResultSet:
+        return 0, False
+    cache = book_cache.get_cache()
+    if not exact:
+        estimate = cache.get(key)
+        if estimate is None:
+            estimate = planner_estimate(queryset)
+        if estimate is not None and estimate > get_exact_threshold():
+            return estimate, True
+    count = queryset.count()
+    cache.set(key, count, get_cache_timeout())
+    return count, False
+
+
+async def acount_books(queryset, exact=False):
+    # count_books for the async views
+    queryset = queryset.order_by()
+    try:
+        key = count_key(queryset)
+    except EmptyResultSet:
+        return 0, False
+    cache = book_cache.get_cache()
+    if not exact:
+        estimate = await cache.aget(key)
+        if estimate is None:
+            estimate = await sync_to_async(planner_estimate)(queryset)
+        if estimate is not None and estimate > get_exact_threshold():
+            return estimate, True
+    count = await queryset.acount()
+    await cache.aset(key, count, get_cache_timeout())
+    return count, False
@@ -0,0 +1,61 @@
+import csv
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.serializers.json import DjangoJSONEncoder
+
+# Streams the book catalogue as CSV or NDJSON straight from database rows,
+# without building model instances or the whole payload in memory.
+
+EXPORT_FIELDS = ["id", "title", "author", "publish_date", "isbn", "price", "book_image"]
+
+CONTENT_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+}
+
+
+class Echo:
+    # File-like object for csv.writer that hands back the line instead of storing it
+    def write(self, value):
+        return value
+
+
+def iter_rows(queryset):
+    chunk_size = getattr(settings, "BOOK_EXPORT_CHUNK_SIZE", 2000)
+    image_index = EXPORT_FIELDS.index("book_image")
+    for row in queryset.order_by("id").values_list(*EXPORT_FIELDS).iterator(chunk_size=chunk_size):
+        row = list(row)
+        row[image_index] = default_storage.url(row[image_index]) if row[image_index] else None
+        yield row
+
+
+def csv_lines(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(EXPORT_FIELDS)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def ndjson_lines(rows):
+    encoder = DjangoJSONEncoder(separators=(",", ":"))
+    for row in rows:
+        yield encoder.encode(dict(zip(EXPORT_FIELDS, row))) + "\n"
+
+
+def buffered(lines, size=64 * 1024):
+    # Groups lines into chunks so the server doesn't write one tiny packet per row
+    buffer, length = [], 0
+    for line in lines:
+        buffer.append(line)
+        length += len(line)
+        if length >= size:
+            yield "".join(buffer)
+            buffer, length = [], 0
+    if buffer:
+        yield "".join(buffer)
+
+
+def stream_books(queryset, export_format):
+    lines = csv_lines if export_format == "csv" else ndjson_lines
+    return buffered(lines(iter_rows(queryset)))
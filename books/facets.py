@@ -0,0 +1,132 @@
+import math
+
+from collections import Counter
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, IntegerField, Value
+from django.db.models.functions import Cast, ExtractYear, Floor
+
+from books.models import Book, BookFacetCount
+
+# Facet counts of the book catalogue: books per author, per publish year and per price bucket.
+# Filtered facets are computed with GROUP BY over the filtered books. Unfiltered facets can be read from
+# BookFacetCount instead, a summary kept up to date on every book write, so they cost O(distinct values).
+
+FACETS = ("author", "year", "price")
+
+
+def summary_enabled():
+    return getattr(settings, "BOOK_FACET_SUMMARY", False)
+
+
+def get_bucket_width():
+    return getattr(settings, "BOOK_FACET_PRICE_BUCKET", 10)
+
+
+def get_author_limit():
+    return getattr(settings, "BOOK_FACET_AUTHOR_LIMIT", 50)
+
+
+def format_facets(total, authors, years, prices):
+    # authors, years and prices are (value, count) pairs
+    width = get_bucket_width()
+    authors = sorted(authors, key=lambda item: (-item[1], item[0]))[:get_author_limit()]
+    return {
+        "total": total,
+        "authors": [{"value": author, "count": count} for author, count in authors],
+        "years": [{"value": year, "count": count} for year, count in sorted(years)],
+        "prices": [
+            {"min": "{:.2f}".format(bucket * width), "max": "{:.2f}".format((bucket + 1) * width), "count": count}
+            for bucket, count in sorted(prices)
+        ],
+    }
+
+
+def price_bucket():
+    return Cast(Floor(F("price") / Value(Decimal(get_bucket_width()))), IntegerField())
+
+
+def count_by(queryset, expression):
+    # [(value, count)] with one GROUP BY
+    return queryset.order_by().values_list(expression).annotate(count=Count("id"))
+
+
+def facets_from_queryset(queryset):
+    authors = count_by(queryset, "author").order_by("-count", "author")[:get_author_limit()]
+    years = list(count_by(queryset, ExtractYear("publish_date")))
+    prices = count_by(queryset, price_bucket())
+    return format_facets(sum(count for year, count in years), authors, years, prices)
+
+
+def facets_from_summary():
+    counts = {facet: [] for facet in FACETS}
+    for facet, value, count in BookFacetCount.objects.filter(count__gt=0).values_list("facet", "value", "count"):
+        counts[facet].append((value if facet == "author" else int(value), count))
+    return format_facets(sum(count for year, count in counts["year"]), counts["author"], counts["year"], counts["price"])
+
+
+def get_facets(queryset, filtered=True):
+    if not filtered and summary_enabled():
+        return facets_from_summary()
+    return facets_from_queryset(queryset)
+
+
+def facet_values(row):
+    # row is (author, publish_date, price), fields are parsed since unsaved instances can still hold strings
+    author, publish_date, price = row
+    publish_date = Book._meta.get_field("publish_date").to_python(publish_date)
+    price = Book._meta.get_field("price").to_python(price)
+    return [
+        ("author", author),
+        ("year", str(publish_date.year)),
+        ("price", str(math.floor(price / get_bucket_width()))),
+    ]
+
+
+def book_row(book):
+    return book.author, book.publish_date, book.price
+
+
+def update_summary(removed=(), added=()):
+    # Applies the books removed and added by a write as count deltas
+    if not summary_enabled():
+        return
+    deltas = Counter()
+    for row in removed:
+        deltas.subtract(facet_values(row))
+    for row in added:
+        deltas.update(facet_values(row))
+    for (facet, value), delta in sorted(deltas.items()):
+        if delta:
+            add_count(facet, value, delta)
+
+
+def add_count(facet, value, delta):
+    counts = BookFacetCount.objects.filter(facet=facet, value=value)
+    if counts.update(count=F("count") + delta):
+        return
+    try:
+        with transaction.atomic():
+            BookFacetCount.objects.create(facet=facet, value=value, count=delta)
+    except IntegrityError:
+        # Created by a concurrent write in the meantime
+        counts.update(count=F("count") + delta)
+
+
+def rebuild_summary():
+    # Recounts everything, for the first fill and after BOOK_FACET_PRICE_BUCKET changes
+    books = Book.objects.all()
+    counts = [
+        ("author", count_by(books, "author")),
+        ("year", count_by(books, ExtractYear("publish_date"))),
+        ("price", count_by(books, price_bucket())),
+    ]
+    with transaction.atomic():
+        BookFacetCount.objects.all().delete()
+        BookFacetCount.objects.bulk_create([
+            BookFacetCount(facet=facet, value=str(value), count=count)
+            for facet, values in counts
+            for value, count in values
+        ], batch_size=1000)
@@ -1,15 +1,24 @@
+import calendar
+import datetime
+
 import django_filters
 
+from django.db.models import Q
+from django.db.models.functions import ExtractDay, ExtractMonth
+
 from books.models import Book
 
 class BookFilter(django_filters.FilterSet):
     author_contains = django_filters.CharFilter(field_name='author', lookup_expr='icontains')
 
-    month = django_filters.NumberFilter(field_name='publish_date__month')
+    search = django_filters.CharFilter(method='filter_search')
 
-    year = django_filters.NumberFilter(field_name='publish_date__year')
+    # month, year and day are applied together in filter_queryset so they can share one date range
+    month = django_filters.NumberFilter(method='filter_date_part')
 
-    day = django_filters.NumberFilter(field_name='publish_date__day')
+    year = django_filters.NumberFilter(method='filter_date_part')
+
+    day = django_filters.NumberFilter(method='filter_date_part')
 
     start_date = django_filters.DateFilter(field_name='publish_date', lookup_expr="gte")
 
@@ -18,4 +27,48 @@ class BookFilter(django_filters.FilterSet):
 
     class Meta:
         model = Book
-        fields = ['author', 'publish_date', 'author_contains', 'month', 'year', 'day', 'start_date', 'end_date']
\ No newline at end of file
+        fields = ['author', 'publish_date', 'author_contains', 'month', 'year', 'day', 'start_date', 'end_date', 'search']
+
+    def filter_search(self, queryset, name, value):
+        # Every word has to appear in the title or the author, on PostgreSQL the
+        # icontains lookups are served by the trigram indexes from migration 0005
+        for term in value.split():
+            queryset = queryset.filter(Q(title__icontains=term) | Q(author__icontains=term))
+        return queryset
+
+    def filter_date_part(self, queryset, name, value):
+        return queryset
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        parts = {name: self.form.cleaned_data.get(name) for name in ('year', 'month', 'day')}
+        return filter_publish_date_parts(queryset, **parts)
+
+
+def filter_publish_date_parts(queryset, year=None, month=None, day=None):
+    # Year and year+month become a range on publish_date, which can use the column index.
+    # A month or day without a year is matched against the functional indexes on the date parts on PostgreSQL,
+    # SQLite passes the part name as a parameter so its planner can't match them and scans.
+    if year is None and month is None and day is None:
+        return queryset
+    try:
+        year = int(year) if year is not None else None
+        month = int(month) if month is not None else None
+        day = int(day) if day is not None else None
+        if year is not None:
+            if month is not None:
+                start = datetime.date(year, month, 1)
+                end = datetime.date(year, month, calendar.monthrange(year, month)[1])
+                if day is not None:
+                    start = end = datetime.date(year, month, day)
+                    day = None
+            else:
+                start, end = datetime.date(year, 1, 1), datetime.date(year, 12, 31)
+            queryset = queryset.filter(publish_date__range=(start, end))
+        elif month is not None:
+            queryset = queryset.alias(publish_month=ExtractMonth('publish_date')).filter(publish_month=month)
+        if day is not None:
+            queryset = queryset.alias(publish_day=ExtractDay('publish_date')).filter(publish_day=day)
+    except (ValueError, OverflowError):
+        return queryset.none()
+    return queryset
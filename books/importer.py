@@ -0,0 +1,109 @@
+import csv
+import json
+
+from django.conf import settings
+from django.db import transaction
+
+from rest_framework import serializers
+
+from books import cache as book_cache
+from books import facets
+from books.models import Book
+from books.serializers import BookSerializer
+
+# Imports books from CSV or NDJSON lines, upserting on isbn in batches.
+# Lines are consumed one at a time, so memory is bounded by the batch size and not the file size.
+
+IMPORT_FORMATS = ("csv", "ndjson")
+
+UPDATE_FIELDS = ["title", "author", "publish_date", "price", "updated_at"]
+
+
+class BookImportSerializer(BookSerializer):
+    # Same rules as BookSerializer, without the unique isbn check since rows are upserted on isbn
+    class Meta(BookSerializer.Meta):
+        fields = ["title", "author", "publish_date", "isbn", "price"]
+        exclude = None
+        extra_kwargs = {"isbn": {"validators": []}}
+
+
+def guess_format(filename):
+    extension = filename.rsplit(".", 1)[-1].lower()
+    return extension if extension in IMPORT_FORMATS else None
+
+
+def parse_csv(lines):
+    reader = csv.DictReader(lines)
+    line = 1
+    for row in reader:
+        yield line + 1, row, None
+        line = reader.line_num
+
+
+def parse_ndjson(lines):
+    for line, text in enumerate(lines, start=1):
+        if not text.strip():
+            continue
+        try:
+            row = json.loads(text)
+        except ValueError as exc:
+            yield line, text, {"non_field_errors": ["Invalid JSON: {}".format(exc)]}
+            continue
+        if not isinstance(row, dict):
+            yield line, row, {"non_field_errors": ["Expected a JSON object"]}
+            continue
+        yield line, row, None
+
+
+def flush(books):
+    if not books:
+        return
+    with transaction.atomic():
+        removed = []
+        if facets.summary_enabled():
+            # Rows being overwritten by the upsert leave the facet summary
+            isbns = [book.isbn for book in books]
+            removed = list(Book.objects.filter(isbn__in=isbns).values_list("author", "publish_date", "price"))
+        Book.objects.bulk_create(
+            books, update_conflicts=True, unique_fields=["isbn"], update_fields=UPDATE_FIELDS,
+        )
+        facets.update_summary(removed=removed, added=[facets.book_row(book) for book in books])
+    book_cache.invalidate_books()
+
+
+def import_books(lines, import_format, batch_size=None, on_progress=None, on_reject=None):
+    # lines is any iterable of text lines, on_progress(result) runs after every batch
+    # and on_reject(line, row, errors) for every row that fails validation
+    batch_size = batch_size or getattr(settings, "BOOK_IMPORT_BATCH_SIZE", 1000)
+    parse = parse_csv if import_format == "csv" else parse_ndjson
+    serializer = BookImportSerializer()
+    result = {"processed": 0, "imported": 0, "rejected": 0}
+    # Keyed on isbn so a repeated isbn in one batch keeps the last row, an upsert can't touch a row twice
+    batch = {}
+
+    for line, row, errors in parse(lines):
+        result["processed"] += 1
+        if errors is None:
+            try:
+                attrs = serializer.run_validation(row)
+            except serializers.ValidationError as exc:
+                errors = exc.detail
+        if errors is not None:
+            result["rejected"] += 1
+            if on_reject:
+                on_reject(line, row, errors)
+            continue
+
+        batch[attrs["isbn"]] = Book(**attrs)
+        if len(batch) >= batch_size:
+            flush(list(batch.values()))
+            result["imported"] += len(batch)
+            batch = {}
+            if on_progress:
+                on_progress(result)
+
+    flush(list(batch.values()))
+    result["imported"] += len(batch)
+    if on_progress:
+        on_progress(result)
+    return result
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from books.models import Book
+from books.thumbnails import generate_thumbnails
+
+
+class Command(BaseCommand):
+    help = "Generate the thumbnails of books that have an image but no thumbnails yet"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--all", action="store_true", help="Regenerate the thumbnails of every book with an image")
+
+    def handle(self, *args, **options):
+        books = Book.objects.exclude(book_image="").exclude(book_image__isnull=True)
+        if not options["all"]:
+            books = books.filter(thumbnails={})
+        count = 0
+        for pk, name in books.values_list("pk", "book_image").iterator():
+            try:
+                generate_thumbnails(pk, name)
+                count += 1
+            except Exception as exc:
+                self.stderr.write("Book {}: {}".format(pk, exc))
+        self.stdout.write(self.style.SUCCESS("Generated thumbnails for {} books".format(count)))
@@ -0,0 +1,43 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from books.importer import IMPORT_FORMATS, guess_format, import_books
+
+
+class Command(BaseCommand):
+    help = "Import books from a CSV or NDJSON file, rows are upserted on isbn"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="CSV or NDJSON file to import")
+        parser.add_argument("--file-format", choices=IMPORT_FORMATS,
+                            help="Format of the file, guessed from the extension by default")
+        parser.add_argument("--batch-size", type=int, help="Rows per upsert, defaults to BOOK_IMPORT_BATCH_SIZE")
+        parser.add_argument("--rejects", help="Write the rejected rows with their errors to this NDJSON file")
+
+    def handle(self, *args, **options):
+        import_format = options["file_format"] or guess_format(options["path"])
+        if import_format is None:
+            raise CommandError("Can not guess the file format, use --file-format")
+
+        rejects = open(options["rejects"], "w", encoding="utf-8") if options["rejects"] else None
+
+        def on_reject(line, row, errors):
+            if rejects:
+                rejects.write(json.dumps({"line": line, "row": row, "errors": errors}, default=str) + "\n")
+
+        def on_progress(result):
+            self.stdout.write("Processed {processed} rows, imported {imported}, rejected {rejected}".format(**result))
+
+        try:
+            with open(options["path"], encoding="utf-8-sig", newline="") as lines:
+                result = import_books(lines, import_format, options["batch_size"], on_progress, on_reject)
+        except OSError as exc:
+            raise CommandError(str(exc))
+        finally:
+            if rejects:
+                rejects.close()
+
+        self.stdout.write(self.style.SUCCESS(
+            "Imported {imported} books, rejected {rejected} of {processed} rows".format(**result)
+        ))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from books.facets import rebuild_summary
+from books.models import BookFacetCount
+
+
+class Command(BaseCommand):
+    help = "Recount the book facet summary used when BOOK_FACET_SUMMARY is on"
+
+    def handle(self, *args, **options):
+        rebuild_summary()
+        self.stdout.write(self.style.SUCCESS("Rebuilt {} facet counts".format(BookFacetCount.objects.count())))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError
+
+from books.models import Book
+from books.seed import clear_books, seed_books
+
+
+class Command(BaseCommand):
+    help = "Create synthetic books for benchmarks and load tests, the same count and seed always give the same books"
+
+    def add_arguments(self, parser):
+        parser.add_argument("count", type=int, help="Number of books to create")
+        parser.add_argument("--seed", type=int, default=0, help="Random seed of the catalogue")
+        parser.add_argument("--start", type=int,
+                            help="Number of the first ISBN, defaults to the number of books already in the database")
+        parser.add_argument("--authors", type=int, help="Number of authors, defaults to one per 20 books")
+        parser.add_argument("--batch-size", type=int, default=1000, help="Books per INSERT")
+        parser.add_argument("--clear", action="store_true", help="Delete every book first, without change feed tombstones")
+
+    def handle(self, *args, **options):
+        if options["clear"]:
+            self.stdout.write("Deleted {} books".format(clear_books()))
+        start = options["start"] if options["start"] is not None else Book.objects.count()
+
+        def on_progress(created):
+            self.stdout.write("Created {} of {} books".format(created, options["count"]))
+
+        try:
+            created = seed_books(options["count"], options["seed"], start, options["authors"], options["batch_size"],
+                                 on_progress)
+        except IntegrityError as exc:
+            raise CommandError("Duplicate isbn, use another --start or --clear: {}".format(exc))
+        self.stdout.write(self.style.SUCCESS("Seeded {} books".format(created)))
@@ -0,0 +1,22 @@
+# Generated by Django 3.2.19 on 2026-10-18 11:18
+
+from django.db import migrations, models
+import django.db.models.functions.datetime
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0003_book_publish_date_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(django.db.models.functions.datetime.ExtractMonth('publish_date'), name='book_publish_month_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(django.db.models.functions.datetime.ExtractDay('publish_date'), name='book_publish_day_idx'),
+        ),
+    ]
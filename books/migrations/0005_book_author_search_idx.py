@@ -0,0 +1,47 @@
+# Generated by Django 3.2.19 on 2026-10-18 11:18
+
+from django.db import migrations, models
+
+
+TRIGRAM_INDEXES = {
+    "book_title_trgm_idx": "title",
+    "book_author_trgm_idx": "author",
+}
+
+
+def create_trigram_indexes(apps, schema_editor):
+    # icontains compiles to UPPER(col::text) LIKE UPPER(%s) on PostgreSQL, the indexes use the same expression.
+    # Other databases keep the plain LIKE scan.
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for name, column in TRIGRAM_INDEXES.items():
+        schema_editor.execute(
+            'CREATE INDEX IF NOT EXISTS "{}" ON "books_book" USING gin (UPPER("{}"::text) gin_trgm_ops)'.format(name, column)
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for name in TRIGRAM_INDEXES:
+        schema_editor.execute('DROP INDEX IF EXISTS "{}"'.format(name))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0004_book_publish_date_part_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['author'], name='book_author_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['author', 'publish_date'], name='book_author_publish_date_idx'),
+        ),
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
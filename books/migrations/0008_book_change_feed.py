@@ -0,0 +1,36 @@
+# Generated by Django 4.2.7 on 2026-10-18 11:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0007_book_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookDeletion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('book_id', models.BigIntegerField()),
+                ('isbn', models.CharField(max_length=13)),
+                ('deleted_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        # The (updated_at, id) index below also serves every lookup the single column index of 0007 served
+        migrations.AlterField(
+            model_name='book',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['updated_at', 'id'], name='book_updated_at_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bookdeletion',
+            index=models.Index(fields=['deleted_at', 'id'], name='bookdeletion_deleted_at_id_idx'),
+        ),
+    ]
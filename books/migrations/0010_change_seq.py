@@ -0,0 +1,62 @@
+# Generated by Django 4.2.7 on 2026-10-18 12:26
+
+from django.db import migrations, models
+
+
+def number_existing_changes(apps, schema_editor):
+    # Existing books and tombstones get their change feed position in the order the old feed read them
+    Book = apps.get_model("books", "Book")
+    BookDeletion = apps.get_model("books", "BookDeletion")
+    BookChangeSequence = apps.get_model("books", "BookChangeSequence")
+    using = schema_editor.connection.alias
+    value = 0
+    for model, ordering in [(Book, ("updated_at", "id")), (BookDeletion, ("deleted_at", "id"))]:
+        batch = []
+        for pk in model.objects.using(using).order_by(*ordering).values_list("pk", flat=True).iterator():
+            value += 1
+            batch.append(model(pk=pk, change_seq=value))
+            if len(batch) >= 1000:
+                model.objects.using(using).bulk_update(batch, ["change_seq"])
+                batch = []
+        model.objects.using(using).bulk_update(batch, ["change_seq"])
+    BookChangeSequence.objects.using(using).create(pk=1, value=value)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0009_book_facet_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookChangeSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('value', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RemoveIndex(
+            model_name='bookdeletion',
+            name='bookdeletion_deleted_at_id_idx',
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='change_seq',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='bookdeletion',
+            name='change_seq',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.RunPython(number_existing_changes, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['change_seq', 'id'], name='book_change_seq_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bookdeletion',
+            index=models.Index(fields=['change_seq', 'id'], name='bookdeletion_change_seq_id_idx'),
+        ),
+    ]
@@ -1,4 +1,50 @@
-from django.db import models
+from django.db import connections, models, router, transaction
+from django.db.models.functions import ExtractDay, ExtractMonth
+
+
+class BookChangeSequence(models.Model):
+    # Single row numbering the book changes for the change feed. Writers bump it inside their transaction and the row
+    # stays locked until they commit, so the numbers are handed out in commit order. Book writes are serialized on it
+    # from the bump to the commit.
+    value = models.BigIntegerField(default=0)
+
+    @classmethod
+    def next_value(cls, using):
+        # Call it inside the transaction of the write it numbers
+        with connections[using].cursor() as cursor:
+            cursor.execute("UPDATE {} SET value = value + 1 WHERE id = 1 RETURNING value".format(cls._meta.db_table))
+            row = cursor.fetchone()
+        if row is None:
+            cls.objects.using(using).get_or_create(pk=1)
+            return cls.next_value(using)
+        return row[0]
+
+
+class BookQuerySet(models.QuerySet):
+    # Writes that skip Book.save() get a change_seq too, one number per statement
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        with transaction.atomic(using=self.db, savepoint=False):
+            change_seq = BookChangeSequence.next_value(self.db)
+            for obj in objs:
+                obj.change_seq = change_seq
+            if kwargs.get("update_fields"):
+                kwargs["update_fields"] = [*kwargs["update_fields"], "change_seq"]
+            return super().bulk_create(objs, *args, **kwargs)
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        objs = list(objs)
+        with transaction.atomic(using=self.db, savepoint=False):
+            change_seq = BookChangeSequence.next_value(self.db)
+            for obj in objs:
+                obj.change_seq = change_seq
+            return super().bulk_update(objs, [*fields, "change_seq"], *args, **kwargs)
+
+    def update(self, **kwargs):
+        with transaction.atomic(using=self.db, savepoint=False):
+            if "change_seq" not in kwargs:
+                kwargs["change_seq"] = BookChangeSequence.next_value(self.db)
+            return super().update(**kwargs)
 
 class Book(models.Model):
     title = models.CharField(max_length=255)
@@ -7,6 +53,70 @@ class Book(models.Model):
     isbn = models.CharField(max_length=13, unique=True)
     price = models.DecimalField(max_digits=10, decimal_places=2)
     book_image = models.ImageField(upload_to="book_images/", null=True, blank=True)
+    # Resized copies of book_image by size and format, filled in by books.thumbnails
+    thumbnails = models.JSONField(default=dict, blank=True, editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
+    # Position in the change feed, see BookChangeSequence
+    change_seq = models.BigIntegerField(default=0, editable=False)
+
+    objects = BookQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Serves the keyset pagination ordering on (publish_date, id)
+            models.Index(fields=["publish_date", "id"], name="book_publish_date_id_idx"),
+            # Serve the month and day filters when no year is given
+            models.Index(ExtractMonth("publish_date"), name="book_publish_month_idx"),
+            models.Index(ExtractDay("publish_date"), name="book_publish_day_idx"),
+            # Serve the author filter and author listings ordered by date
+            models.Index(fields=["author"], name="book_author_idx"),
+            models.Index(fields=["author", "publish_date"], name="book_author_publish_date_idx"),
+            # Serves max(updated_at) of the list validators
+            models.Index(fields=["updated_at", "id"], name="book_updated_at_id_idx"),
+            # Serves the change feed ordering on (change_seq, id)
+            models.Index(fields=["change_seq", "id"], name="book_change_seq_id_idx"),
+        ]
 
     def __str__(self):
         return self.title
+
+    def save(self, *args, **kwargs):
+        using = kwargs.get("using") or router.db_for_write(Book, instance=self)
+        with transaction.atomic(using=using, savepoint=False):
+            self.change_seq = BookChangeSequence.next_value(using)
+            if kwargs.get("update_fields"):
+                kwargs["update_fields"] = [*kwargs["update_fields"], "change_seq"]
+            super().save(*args, **kwargs)
+
+
+class BookDeletion(models.Model):
+    # Tombstone of a deleted book for the change feed
+    book_id = models.BigIntegerField()
+    isbn = models.CharField(max_length=13)
+    deleted_at = models.DateTimeField(auto_now_add=True)
+    # Numbered with the book changes, see BookChangeSequence
+    change_seq = models.BigIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["change_seq", "id"], name="bookdeletion_change_seq_id_idx"),
+        ]
+
+    def __str__(self):
+        return self.isbn
+
+
+class BookFacetCount(models.Model):
+    # Precomputed number of books per facet value (author, publish year, price bucket),
+    # kept up to date by books.facets when BOOK_FACET_SUMMARY is on
+    facet = models.CharField(max_length=16)
+    value = models.CharField(max_length=255)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["facet", "value"], name="bookfacetcount_facet_value_uniq"),
+        ]
+
+    def __str__(self):
+        return "{}={}".format(self.facet, self.value)
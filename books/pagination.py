@@ -0,0 +1,172 @@
+import base64
+import binascii
+import json
+
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils.dateparse import parse_date
+
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    # Cursor pagination keyed on the ordering columns, so page N costs the same as page 1.
+    # The cursor carries the position of the last (or first) row seen instead of an OFFSET.
+    cursor_query_param = "cursor"
+    page_size_query_param = "page_size"
+    ordering_query_param = "ordering"
+    results_key = "books"
+    invalid_cursor_message = "Invalid cursor"
+
+    # Every ordering ends with the primary key so that positions are unique.
+    orderings = {
+        "id": ("id",),
+        "-id": ("-id",),
+        "publish_date": ("publish_date", "id"),
+        "-publish_date": ("-publish_date", "-id"),
+    }
+    default_ordering = "id"
+
+    # Checks the cursor values of each ordering column, they end up in the keyset filter
+    column_checks = {
+        "id": lambda value: isinstance(value, int) and not isinstance(value, bool),
+        "publish_date": lambda value: isinstance(value, str) and parse_date(value) is not None,
+    }
+
+    def get_page_size(self, request):
+        page_size = getattr(settings, "BOOK_LIST_PAGE_SIZE", 50)
+        max_page_size = getattr(settings, "BOOK_LIST_MAX_PAGE_SIZE", 500)
+        try:
+            requested = int(request.query_params[self.page_size_query_param])
+            if requested > 0:
+                page_size = requested
+        except (KeyError, ValueError):
+            pass
+        return min(page_size, max_page_size)
+
+    def get_ordering(self, request):
+        ordering = request.query_params.get(self.ordering_query_param, self.default_ordering)
+        if ordering not in self.orderings:
+            ordering = self.default_ordering
+        return ordering
+
+    def get_ordering_columns(self, request):
+        # Columns a values() queryset has to select for the cursor positions
+        return [field.lstrip("-") for field in self.orderings[self.get_ordering(request)]]
+
+    def encode_cursor(self, position, reverse=False):
+        data = {"p": position}
+        if reverse:
+            data["r"] = 1
+        encoded = base64.urlsafe_b64encode(json.dumps(data, separators=(",", ":")).encode("ascii"))
+        return encoded.decode("ascii").rstrip("=")
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None, False
+        try:
+            padded = encoded + "=" * (-len(encoded) % 4)
+            data = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+            position = data["p"]
+            reverse = bool(data.get("r"))
+        except (TypeError, ValueError, KeyError, binascii.Error, UnicodeEncodeError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or len(position) != len(self.fields):
+            raise NotFound(self.invalid_cursor_message)
+        for field, value in zip(self.fields, position):
+            try:
+                valid = self.column_checks[field.lstrip("-")](value)
+            except ValueError:
+                # Well formed but impossible dates like 2020-13-01
+                valid = False
+            if not valid:
+                raise NotFound(self.invalid_cursor_message)
+        return position, reverse
+
+    def get_keyset_filter(self, position, reverse):
+        # (a, b) > (x, y)  <=>  a > x OR (a = x AND b > y), flipped for descending columns.
+        condition = Q()
+        equal = {}
+        for field, value in zip(self.fields, position):
+            descending = field.startswith("-")
+            name = field.lstrip("-")
+            lookup = "lt" if descending != reverse else "gt"
+            condition |= Q(**equal, **{"{}__{}".format(name, lookup): value})
+            equal[name] = value
+        return condition
+
+    def get_position(self, row):
+        position = []
+        for field in self.fields:
+            # Rows are model instances, or dicts when the list is read with values()
+            value = row[field.lstrip("-")] if isinstance(row, dict) else getattr(row, field.lstrip("-"))
+            position.append(value.isoformat() if hasattr(value, "isoformat") else value)
+        return position
+
+    def get_page_queryset(self, queryset, request):
+        # Builds the (page_size + 1)-row queryset for the requested page without evaluating it.
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(request)
+        self.fields = self.orderings[self.ordering]
+        self.position, self.reverse = self.decode_cursor(request)
+
+        order_by = self.fields
+        if self.reverse:
+            order_by = [field[1:] if field.startswith("-") else "-" + field for field in order_by]
+        queryset = queryset.order_by(*order_by)
+        if self.position is not None:
+            queryset = queryset.filter(self.get_keyset_filter(self.position, self.reverse))
+        return queryset[:self.page_size + 1]
+
+    def get_page(self, rows):
+        # Trims the extra look-ahead row and works out which neighbouring pages exist.
+        rows = list(rows)
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if self.reverse:
+            rows.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, self.position is not None
+        self.page = rows
+        return rows
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.get_page(self.get_page_queryset(queryset, request))
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        url = self.request.build_absolute_uri()
+        cursor = self.encode_cursor(self.get_position(self.page[-1]))
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        url = self.request.build_absolute_uri()
+        if not self.page:
+            return remove_query_param(url, self.cursor_query_param)
+        cursor = self.encode_cursor(self.get_position(self.page[0]), reverse=True)
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_paginated_data(self, data, count=None, count_estimated=False):
+        # count is the number of books matching the filters on every page, count_estimated tells an exact count
+        # from an estimate (see books.counting)
+        return OrderedDict([
+            ("next", self.get_next_link()),
+            ("previous", self.get_previous_link()),
+            ("count", count),
+            ("count_estimated", count_estimated),
+            (self.results_key, data),
+        ])
+
+    def get_paginated_response(self, data):
+        return Response(self.get_paginated_data(data))
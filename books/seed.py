@@ -0,0 +1,104 @@
+import datetime
+import itertools
+import random
+
+from decimal import Decimal
+
+from django.db import router, transaction
+
+from books import cache as book_cache
+from books import facets
+from books.models import Book
+
+# Synthetic catalogue for benchmarks and query budgets.
+# The same count and seed always give the same books. Author popularity follows a Zipf curve, so a few authors
+# have thousands of books and most have a handful, publish dates lean towards recent years and prices are
+# skewed towards the cheap end, roughly like a real shop. ISBNs are valid ISBN-13 in the 979 range numbered
+# from start, so a second run with another start adds books next to the first ones.
+
+ADJECTIVES = [
+    "Silent", "Broken", "Hidden", "Last", "Golden", "Dark", "Lost", "Burning", "Quiet", "Endless", "Northern",
+    "Crimson", "Little", "Wild", "Final", "Secret", "Forgotten", "Bright", "Hollow", "Distant",
+]
+NOUNS = [
+    "River", "Garden", "Empire", "Winter", "House", "Ocean", "Kingdom", "Letter", "Shadow", "City", "Mountain",
+    "Machine", "Orchard", "Promise", "Harbor", "Forest", "Storm", "Library", "Bridge", "Island",
+]
+FIRST_NAMES = [
+    "Anna", "Minh", "James", "Sofia", "Hiro", "Lena", "Omar", "Clara", "Daniel", "Mai", "Lucas", "Yuki", "Noah",
+    "Ines", "Tuan", "Maya", "Ethan", "Linh", "Oscar", "Elena",
+]
+LAST_NAMES = [
+    "Nguyen", "Smith", "Tanaka", "Garcia", "Muller", "Rossi", "Tran", "Kim", "Novak", "Silva", "Brown", "Sato",
+    "Petrov", "Le", "Dubois", "Jensen", "Khan", "Pham", "Moreau", "Walsh",
+]
+FIRST_YEAR = 1950
+LAST_YEAR = 2024
+
+
+def isbn13(number):
+    digits = "979{:09d}".format(number)
+    total = sum(int(digit) * (3 if index % 2 else 1) for index, digit in enumerate(digits))
+    return digits + str((10 - total % 10) % 10)
+
+
+def make_authors(count, rng):
+    names = ["{} {}".format(first, last) for first, last in itertools.product(FIRST_NAMES, LAST_NAMES)]
+    rng.shuffle(names)
+    # Past the 400 name combinations authors get a number
+    return [
+        names[i % len(names)] + (" {}".format(i // len(names) + 1) if i >= len(names) else "")
+        for i in range(count)
+    ]
+
+
+def make_book(number, rng, authors, author_weights):
+    # Years are weighted towards LAST_YEAR, the day is any valid one of the year
+    year = int(rng.triangular(FIRST_YEAR, LAST_YEAR + 1, LAST_YEAR + 1))
+    publish_date = datetime.date(min(year, LAST_YEAR), 1, 1) + datetime.timedelta(days=rng.randrange(365))
+    price = Decimal(min(max(rng.lognormvariate(2.7, 0.6), 1), 250)).quantize(Decimal("1")) - Decimal("0.01")
+    subtitle = "" if rng.random() < 0.7 else " " + rng.choice(NOUNS)
+    return Book(
+        title="The {} {}{}".format(rng.choice(ADJECTIVES), rng.choice(NOUNS), subtitle),
+        author=rng.choices(authors, cum_weights=author_weights)[0],
+        publish_date=publish_date,
+        isbn=isbn13(number),
+        price=max(price, Decimal("0.99")),
+    )
+
+
+def seed_books(count, seed=0, start=0, authors=None, batch_size=1000, on_progress=None):
+    # Creates count books with bulk inserts and returns how many were created
+    rng = random.Random("{}:{}".format(seed, start))
+    authors = make_authors(authors or max(count // 20, 10), random.Random(seed))
+    author_weights = list(itertools.accumulate(1 / rank ** 1.1 for rank in range(1, len(authors) + 1)))
+    created = 0
+    while created < count:
+        batch = [
+            make_book(start + created + i, rng, authors, author_weights)
+            for i in range(min(batch_size, count - created))
+        ]
+        Book.objects.bulk_create(batch)
+        created += len(batch)
+        if on_progress:
+            on_progress(created)
+
+    # bulk_create doesn't send the signals that keep the caches and the facet summary up to date
+    book_cache.invalidate_books()
+    if facets.summary_enabled():
+        facets.rebuild_summary()
+    return created
+
+
+def clear_books():
+    # Deletes every book with one DELETE for a benchmark reset and returns how many were deleted.
+    # Skips the per-book signals, so unlike Book.objects.all().delete() no book is loaded and no change feed
+    # tombstone is written: clients of the feed have to sync from scratch after a reset. Image and thumbnail files
+    # stay in storage, seeded books have none.
+    using = router.db_for_write(Book)
+    with transaction.atomic(using=using, savepoint=False):
+        deleted = Book.objects.all()._raw_delete(using)
+        if facets.summary_enabled():
+            facets.rebuild_summary()
+    book_cache.invalidate_books()
+    return deleted
@@ -1,15 +1,230 @@
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.utils.encoding import filepath_to_uri
+from django.utils import timezone
+
 from rest_framework import serializers
+from rest_framework.validators import UniqueValidator
 
+from book_challenge.metrics import timed_serialization
+from books import facets
 from books.models import Book
+from books.thumbnails import delete_thumbnails, schedule_thumbnails
+
+
+# Bookkeeping columns that are not part of the API
+INTERNAL_FIELDS = ("change_seq",)
+
+
+def get_book_fields():
+    return [field.name for field in Book._meta.concrete_fields if field.name not in INTERNAL_FIELDS]
+
+
+def parse_fields(value):
+    # ?fields=id,title,price -> ["id", "title", "price"] in model order, None means every field
+    if not value:
+        return None
+    requested = {name.strip() for name in value.split(",") if name.strip()}
+    book_fields = get_book_fields()
+    unknown = requested.difference(book_fields)
+    if unknown:
+        raise serializers.ValidationError({"fields": ["Unknown fields: {}".format(", ".join(sorted(unknown)))]})
+    return [name for name in book_fields if name in requested] or None
+
+
+def get_url_builder(request=None):
+    # FileSystemStorage urls are base_url + the quoted name, so the absolute prefix is built once
+    # instead of going through urljoin and build_absolute_uri for every image
+    if isinstance(default_storage, FileSystemStorage):
+        prefix = request.build_absolute_uri(default_storage.base_url) if request else default_storage.base_url
+        return lambda name: prefix + filepath_to_uri(name).lstrip("/")
+    if request:
+        return lambda name: request.build_absolute_uri(default_storage.url(name))
+    return default_storage.url
+
+
+def thumbnail_urls(thumbnails, url_for):
+    return {
+        size: {image_format: url_for(path) for image_format, path in paths.items()}
+        for size, paths in thumbnails.items()
+    }
+
+
+class BookRowSerializer:
+    # Read-only fast path for list responses. Builds the same output as BookSerializer straight
+    # from Book.objects.values() rows, with one converter per field instead of the per-field
+    # get_attribute / to_representation calls a ModelSerializer makes for every row.
+
+    def __init__(self, rows, fields=None, context=None):
+        self.rows = rows
+        self.fields = fields or get_book_fields()
+        self.request = (context or {}).get("request")
+
+    def get_converters(self):
+        url_for = get_url_builder(self.request)
+        price_exponent = Decimal(1).scaleb(-Book._meta.get_field("price").decimal_places)
+        current_timezone = timezone.get_current_timezone()
+
+        def datetime_string(value):
+            value = value.astimezone(current_timezone).isoformat()
+            return value[:-6] + "Z" if value.endswith("+00:00") else value
+
+        converters = {
+            "publish_date": lambda value: value.isoformat(),
+            "price": lambda value: format(value.quantize(price_exponent), "f"),
+            "book_image": lambda value: url_for(value) if value else None,
+            "thumbnails": lambda value: thumbnail_urls(value, url_for),
+            "updated_at": datetime_string,
+        }
+        return [(name, converters.get(name)) for name in self.fields]
+
+    @property
+    def data(self):
+        with timed_serialization():
+            return self.to_representation(self.rows)
+
+    def to_representation(self, rows):
+        converters = self.get_converters()
+        return [
+            {
+                name: convert(row[name]) if convert is not None and row[name] is not None else row[name]
+                for name, convert in converters
+            }
+            for row in rows
+        ]
+
+
+class BookListSerializer(serializers.ListSerializer):
+    # Validates every book on its own so one bad item doesn't reject the whole batch,
+    # the errors are kept in item_errors. Isbn uniqueness is checked with one query for the batch.
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.item_errors = []
+        isbn = self.child.fields.get("isbn")
+        if isbn is not None:
+            isbn.validators = [validator for validator in isbn.validators if not isinstance(validator, UniqueValidator)]
+
+    def to_internal_value(self, data):
+        if not isinstance(data, list):
+            raise serializers.ValidationError({"non_field_errors": ["Expected a list of books"]})
+        max_items = getattr(settings, "BOOK_BULK_MAX_ITEMS", 500)
+        if len(data) > max_items:
+            raise serializers.ValidationError({"non_field_errors": ["At most {} books per request".format(max_items)]})
+
+        instances = {book.pk: book for book in self.instance} if self.instance is not None else None
+        self.item_errors = []
+        items = []
+        for index, item in enumerate(data):
+            try:
+                attrs = self.child.run_validation(item)
+                if instances is not None:
+                    book = instances.get(self.get_item_id(item))
+                    if book is None:
+                        raise serializers.ValidationError({"id": ["Book not found"]})
+                    attrs["id"] = book.pk
+                items.append((index, attrs))
+            except serializers.ValidationError as exc:
+                self.item_errors.append({"index": index, "errors": exc.detail})
+
+        items = self.check_unique_isbn(items)
+        self.item_errors.sort(key=lambda error: error["index"])
+        return [attrs for index, attrs in items]
+
+    @property
+    def data(self):
+        with timed_serialization():
+            return super().data
+
+    def get_item_id(self, item):
+        try:
+            return int(item.get("id"))
+        except (TypeError, ValueError):
+            return None
+
+    def check_unique_isbn(self, items):
+        taken = dict(Book.objects.filter(isbn__in=[attrs["isbn"] for index, attrs in items]).values_list("isbn", "id"))
+        unique_items = []
+        for index, attrs in items:
+            owner = taken.get(attrs["isbn"])
+            if owner is not None and owner != attrs.get("id"):
+                self.item_errors.append({"index": index, "errors": {"isbn": ["book with this isbn already exists."]}})
+                continue
+            taken[attrs["isbn"]] = attrs.get("id", 0)
+            unique_items.append((index, attrs))
+        return unique_items
+
+    def create(self, validated_data):
+        books = [Book(**attrs) for attrs in validated_data]
+        books = Book.objects.bulk_create(books, batch_size=getattr(settings, "BOOK_BULK_BATCH_SIZE", 500))
+        facets.update_summary(added=[facets.book_row(book) for book in books])
+        return books
+
+    def update(self, instance, validated_data):
+        instances = {book.pk: book for book in instance}
+        books = []
+        removed = []
+        # bulk_update skips auto_now, so updated_at is set here
+        fields = {"updated_at"}
+        updated_at = timezone.now()
+        for attrs in validated_data:
+            book = instances[attrs.pop("id")]
+            removed.append(facets.book_row(book))
+            for field, value in attrs.items():
+                setattr(book, field, value)
+            book.updated_at = updated_at
+            fields.update(attrs)
+            books.append(book)
+        if books:
+            Book.objects.bulk_update(books, sorted(fields), batch_size=getattr(settings, "BOOK_BULK_BATCH_SIZE", 500))
+            facets.update_summary(removed=removed, added=[facets.book_row(book) for book in books])
+        return books
+
 
 class BookSerializer(serializers.ModelSerializer):
+    thumbnails = serializers.SerializerMethodField()
+
     class Meta:
         model = Book
-        fields = "__all__"
+        exclude = INTERNAL_FIELDS
+        list_serializer_class = BookListSerializer
+
+    def __init__(self, *args, fields=None, **kwargs):
+        # fields narrows the output to a sparse fieldset, see parse_fields
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields).difference(fields):
+                self.fields.pop(name)
+
+    @property
+    def data(self):
+        with timed_serialization():
+            return super().data
+
+    def get_thumbnails(self, book):
+        return thumbnail_urls(book.thumbnails, get_url_builder(self.context.get("request")))
+
+    def create(self, validated_data):
+        book = super().create(validated_data)
+        schedule_thumbnails(book)
+        return book
+
+    def update(self, instance, validated_data):
+        previous_thumbnails = instance.thumbnails
+        if "book_image" in validated_data:
+            # Drop the thumbnails of the old image until the new ones are ready
+            validated_data["thumbnails"] = {}
+        book = super().update(instance, validated_data)
+        if "book_image" in validated_data:
+            delete_thumbnails(previous_thumbnails)
+            schedule_thumbnails(book)
+        return book
 
     def validate(self, attrs):
         if len(attrs.get("isbn")) != 13:
             raise serializers.ValidationError({
                 "isbn": "Length of isbn number must be 13 characters"
-            }) 
-        return attrs
\ No newline at end of file
+            })
+        return attrs
@@ -0,0 +1,82 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import router, transaction
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from books import cache as book_cache
+from books import facets
+from books import thumbnails
+from books.models import Book, BookChangeSequence, BookDeletion
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_delete, sender=Book)
+def invalidate_book_cache(sender, instance, **kwargs):
+    # After the commit, a read between the write and the commit would cache the old row under the new generation
+    transaction.on_commit(book_cache.invalidate_books)
+
+
+_pending_deletions = ContextVar("pending_book_deletions", default=None)
+
+
+@contextmanager
+def batch_deletions():
+    # Tombstones of the books deleted inside are written with one INSERT instead of one per book.
+    # Like every other book write, the change sequence is taken before any book row is locked, so concurrent writes
+    # always lock the counter row first and can't deadlock on it.
+    using = router.db_for_write(BookDeletion)
+    with transaction.atomic(using=using, savepoint=False):
+        change_seq = BookChangeSequence.next_value(using)
+        pending = []
+        token = _pending_deletions.set((change_seq, pending))
+        try:
+            yield
+        finally:
+            _pending_deletions.reset(token)
+        BookDeletion.objects.bulk_create(pending)
+
+
+@receiver(pre_delete, sender=Book)
+def take_deletion_change_seq(sender, instance, **kwargs):
+    # Runs inside the transaction of the delete, before the DELETE locks the book row
+    batch = _pending_deletions.get()
+    if batch is not None:
+        instance._deletion_change_seq = batch[0]
+    else:
+        instance._deletion_change_seq = BookChangeSequence.next_value(router.db_for_write(BookDeletion))
+
+
+@receiver(post_delete, sender=Book)
+def record_book_deletion(sender, instance, **kwargs):
+    deletion = BookDeletion(book_id=instance.pk, isbn=instance.isbn, change_seq=instance._deletion_change_seq)
+    batch = _pending_deletions.get()
+    if batch is not None:
+        batch[1].append(deletion)
+    else:
+        deletion.save()
+
+
+@receiver(pre_save, sender=Book)
+def remember_facet_values(sender, instance, **kwargs):
+    # The summary needs the values being replaced, they're gone by post_save
+    if facets.summary_enabled() and instance.pk is not None:
+        instance._facet_row = Book.objects.filter(pk=instance.pk).values_list("author", "publish_date", "price").first()
+
+
+@receiver(post_save, sender=Book)
+def update_facet_summary(sender, instance, **kwargs):
+    removed = getattr(instance, "_facet_row", None)
+    facets.update_summary(removed=[removed] if removed else [], added=[facets.book_row(instance)])
+    instance._facet_row = None
+
+
+@receiver(post_delete, sender=Book)
+def remove_from_facet_summary(sender, instance, **kwargs):
+    facets.update_summary(removed=[facets.book_row(instance)])
+
+
+@receiver(post_delete, sender=Book)
+def delete_thumbnail_files(sender, instance, **kwargs):
+    thumbnails.delete_thumbnails(instance.thumbnails)
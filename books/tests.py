@@ -1,4 +1,23 @@
-from django.test import TestCase
+import datetime
+import json
+import os
+import threading
+import time
+
+from collections import Counter
+from io import BytesIO, StringIO
+from tempfile import NamedTemporaryFile, TemporaryDirectory
+
+from PIL import Image
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, connections, transaction
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 
 from unittest.mock import patch
 
@@ -6,8 +25,19 @@ from rest_framework.test import APIClient
 from rest_framework import status
 from rest_framework.authtoken.models import Token
 
-from books.models import Book
-from books.serializers import BookSerializer
+from book_challenge.testing import QueryBudgetMixin
+from books import cache as book_cache
+from books import facets
+from books import urls as books_urls
+from books.counting import count_books
+from books.filters import BookFilter
+from books.importer import import_books
+from books.models import Book, BookDeletion
+from books.pagination import KeysetPagination
+from books.seed import clear_books, seed_books
+from books.serializers import BookRowSerializer, BookSerializer
+from books.signals import batch_deletions
+from books.thumbnails import generate_thumbnails
 
 from accounts.models import User
 
@@ -28,6 +58,7 @@ class BookModelTest(TestCase):
 
 class BookListAPITestCase(TestCase):
     def setUp(self):
+        cache.clear()
         self.client = APIClient()
         self.url = "/api/books/"  
 
@@ -42,12 +73,666 @@ class BookListAPITestCase(TestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
         expected_data = {
+            "next": None,
+            "previous": None,
+            "count": 2,
+            "count_estimated": False,
             "books": BookSerializer([self.book1, self.book2], many=True).data
         }
         self.assertEqual(response.json(), expected_data)
 
+
+class BookSparseFieldsTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.book = Book.objects.create(title="Book 1", author="Author 1", publish_date="2002-12-01", isbn="9761586697301",
+                                        price=10, book_image="book_images/cover.png",
+                                        thumbnails={"small": {"jpeg": "book_images/thumbnails/1/cover_small.jpg"}})
+        Book.objects.create(title="Book 2", author="Author 2", publish_date="1990-01-31", isbn="7043534952345", price=19.99)
+
+    def test_row_serializer_matches_book_serializer(self):
+        request = RequestFactory().get("/api/books/")
+        books = list(Book.objects.order_by("id"))
+        rows = list(Book.objects.order_by("id").values())
+
+        expected = BookSerializer(books, many=True, context={"request": request}).data
+        self.assertEqual(BookRowSerializer(rows, context={"request": request}).data, json.loads(json.dumps(expected)))
+
+    def test_list_fields(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/api/books/", {"fields": "title,price"})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["books"], [{"title": "Book 1", "price": "10.00"}, {"title": "Book 2", "price": "19.99"}])
+        self.assertNotIn('"author"', queries[-1]["sql"])
+
+    def test_list_fields_keep_the_cursor_columns(self):
+        response = self.client.get("/api/books/", {"fields": "title", "ordering": "publish_date", "page_size": 1})
+        self.assertEqual(response.json()["books"], [{"title": "Book 2"}])
+
+        response = self.client.get(response.json()["next"])
+        self.assertEqual(response.json()["books"], [{"title": "Book 1"}])
+
+    def test_detail_fields(self):
+        response = self.client.get(f"/api/book/{self.book.id}/", {"fields": "id,isbn"})
+        self.assertEqual(response.json(), {"id": self.book.id, "isbn": "9761586697301"})
+
+        response = self.client.get(f"/api/book/{self.book.id}/")
+        self.assertEqual(response.json()["title"], "Book 1")
+
+    def test_unknown_fields(self):
+        response = self.client.get("/api/books/", {"fields": "title,secret"})
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.json(), {"fields": ["Unknown fields: secret"]})
+
+
+@override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, "DEFAULT_THROTTLE_RATES": {}})
+class BookListPaginationTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.url = "/api/books/"
+
+        for i in range(5):
+            Book.objects.create(title=f"Book {i}", author="Author A", publish_date=f"200{i % 2}-01-01",
+                                isbn=f"978000000000{i}", price=10)
+
+    def test_walk_pages_forward_and_back(self):
+        response = self.client.get(self.url, {"page_size": 2, "ordering": "publish_date"})
+        first_page = [book["title"] for book in response.json()["books"]]
+        self.assertEqual(first_page, ["Book 0", "Book 2"])
+        self.assertIsNone(response.json()["previous"])
+
+        response = self.client.get(response.json()["next"])
+        self.assertEqual([book["title"] for book in response.json()["books"]], ["Book 4", "Book 1"])
+
+        response = self.client.get(response.json()["next"])
+        self.assertEqual([book["title"] for book in response.json()["books"]], ["Book 3"])
+        self.assertIsNone(response.json()["next"])
+
+        response = self.client.get(response.json()["previous"])
+        self.assertEqual([book["title"] for book in response.json()["books"]], ["Book 4", "Book 1"])
+
+    def test_pagination_applies_filters(self):
+        response = self.client.get(self.url, {"page_size": 1, "year": 2001})
+        self.assertEqual([book["title"] for book in response.json()["books"]], ["Book 1"])
+
+        response = self.client.get(response.json()["next"])
+        self.assertEqual([book["title"] for book in response.json()["books"]], ["Book 3"])
+
+    @override_settings(BOOK_LIST_MAX_PAGE_SIZE=3)
+    def test_page_size_is_capped(self):
+        response = self.client.get(self.url, {"page_size": 1000})
+        self.assertEqual(len(response.json()["books"]), 3)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(self.url, {"cursor": "not-a-cursor"})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_tampered_cursor(self):
+        paginator = KeysetPagination()
+        cases = [
+            ({}, ["abc"]), ({}, [[1]]), ({}, [True]), ({}, [None]),
+            ({"ordering": "publish_date"}, ["notadate", 1]), ({"ordering": "publish_date"}, ["2020-13-01", 1]),
+            ({"ordering": "publish_date"}, ["2020-01-01", "1"]),
+        ]
+        for params, position in cases:
+            for url in (self.url, "/api/async/books/"):
+                with self.subTest(url=url, position=position):
+                    cursor = paginator.encode_cursor(position)
+                    response = self.client.get(url, {**params, "cursor": cursor})
+                    self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+class BookCacheTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        book_cache.reset_stats()
+        self.client = APIClient()
+        self.book = Book.objects.create(title="Book 1", author="Author 1", publish_date="2002-12-01",
+                                        isbn="9761586697301", price=10.99)
+
+    def test_list_is_served_from_cache(self):
+        self.client.get("/api/books/", {"year": 2002, "author": "Author 1"})
+
+        with self.assertNumQueries(0):
+            response = self.client.get("/api/books/", {"author": "Author 1", "year": 2002})
+
+        self.assertEqual(len(response.json()["books"]), 1)
+        self.assertEqual(book_cache.get_stats(), {"list_miss": 1, "list_hit": 1})
+
+    def test_list_is_invalidated_on_save(self):
+        self.client.get("/api/books/")
+        with self.captureOnCommitCallbacks(execute=True):
+            Book.objects.create(title="Book 2", author="Author 2", publish_date="1990-01-31", isbn="7043534952345", price=19.99)
+            # Not before the commit, a read in between would cache the old list under the new generation
+            self.assertEqual(len(self.client.get("/api/books/").json()["books"]), 1)
+
+        response = self.client.get("/api/books/")
+
+        self.assertEqual(len(response.json()["books"]), 2)
+
+    def test_detail_is_invalidated_on_update_and_delete(self):
+        url = f"/api/book/{self.book.id}/"
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            self.client.get(url)
+
+        self.book.title = "Renamed"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.book.save()
+        self.assertEqual(self.client.get(url).json()["title"], "Renamed")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.book.delete()
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_404_NOT_FOUND)
+
+
+class BookSingleFlightTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        book_cache.reset_stats()
+        self.client = APIClient()
+        Book.objects.create(title="Book 1", author="Author 1", publish_date="2002-12-01", isbn="9761586697301", price=10.99)
+        self.request = RequestFactory().get("/api/books/")
+
+    def test_stale_copy_while_another_request_computes(self):
+        self.client.get("/api/books/")
+        # The entry expires, the copy of the same generation is served while another request computes it again
+        key = book_cache.list_key(self.request)
+        cache.delete(key)
+        cache.add(book_cache.lock_key(key), "other", 10)
+
+        with self.assertNumQueries(0):
+            response = self.client.get("/api/books/")
+
+        self.assertEqual(len(response.json()["books"]), 1)
+        self.assertEqual(book_cache.get_stats()["list_stale"], 1)
+
+    @override_settings(BOOK_CACHE_LOCK_WAIT=0)
+    def test_no_stale_copy_after_a_write(self):
+        self.client.get("/api/books/")
+        with self.captureOnCommitCallbacks(execute=True):
+            Book.objects.create(title="Book 2", author="Author 2", publish_date="1990-01-31", isbn="7043534952345", price=19.99)
+        cache.add(book_cache.lock_key(book_cache.list_key(self.request)), "other", 10)
+
+        response = self.client.get("/api/books/")
+
+        self.assertEqual(len(response.json()["books"]), 2)
+        self.assertNotIn("list_stale", book_cache.get_stats())
+
+    @override_settings(BOOK_CACHE_LOCK_WAIT=0)
+    def test_no_stale_copy_for_pinned_clients(self):
+        self.client.get("/api/books/")
+        key = book_cache.list_key(self.request)
+        cache.delete(key)
+        cache.add(book_cache.lock_key(key), "other", 10)
+        self.client.cookies["primary_pin"] = str(int(time.time()) + 60)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get("/api/books/")
+
+        self.assertGreater(len(queries), 0)
+        self.assertNotIn("list_stale", book_cache.get_stats())
+
+    @override_settings(BOOK_CACHE_STALE_TIMEOUT=0)
+    def test_concurrent_misses_compute_once(self):
+        calls, results = [], []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.2)
+            return {"books": []}
+
+        threads = [
+            threading.Thread(target=lambda: results.append(book_cache.single_flight("books:list:1:abc", "list", compute)))
+            for _ in range(4)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [{"books": []}] * 4)
+        self.assertEqual(book_cache.get_stats()["list_waited"], 3)
+        self.assertIsNone(cache.get(book_cache.lock_key("books:list:1:abc")))
+
+    @override_settings(BOOK_CACHE_STALE_TIMEOUT=0, BOOK_CACHE_LOCK_WAIT=0)
+    def test_computes_when_the_lock_holder_is_too_slow(self):
+        cache.add(book_cache.lock_key(book_cache.list_key(self.request)), "other", 10)
+
+        response = self.client.get("/api/books/")
+
+        self.assertEqual(len(response.json()["books"]), 1)
+        self.assertEqual(cache.get(book_cache.lock_key(book_cache.list_key(self.request))), "other")
+
+    def test_lock_is_released_on_error(self):
+        def compute():
+            raise ValueError("failed")
+
+        with self.assertRaises(ValueError):
+            book_cache.single_flight("books:list:1:abc", "list", compute)
+
+        self.assertIsNone(cache.get(book_cache.lock_key("books:list:1:abc")))
+
+
+class BookConditionalGetTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.book = Book.objects.create(title="Book 1", author="Author 1", publish_date="2002-12-01",
+                                        isbn="9761586697301", price=10.99)
+        self.url = f"/api/book/{self.book.id}/"
+
+    def test_detail_not_modified(self):
+        response = self.client.get(self.url)
+        etag = response["ETag"]
+        self.assertIn("Last-Modified", response)
+
+        cache.clear()
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response["ETag"], etag)
+
+        self.book.title = "Renamed"
+        self.book.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_list_not_modified(self):
+        response = self.client.get("/api/books/", {"author": "Author 1"})
+        etag = response["ETag"]
+
+        cache.clear()
+        with self.assertNumQueries(1):
+            response = self.client.get("/api/books/", {"author": "Author 1"}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.assertNotEqual(self.client.get("/api/books/", {"author": "Author 2"})["ETag"], etag)
+
+        self.book.delete()
+        response = self.client.get("/api/books/", {"author": "Author 1"}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_list_changes_when_a_book_leaves_the_filter(self):
+        Book.objects.create(title="Book 2", author="Author 1", publish_date="2003-01-01", isbn="7043534952345", price=5)
+        for url in ["/api/books/", "/api/async/books/"]:
+            with self.subTest(url):
+                Book.objects.filter(pk=self.book.pk).update(author="Author 1")
+                etag = self.client.get(url, {"author": "Author 1"})["ETag"]
+
+                # The older book moves out, max(updated_at) of the filter stays the same
+                Book.objects.filter(pk=self.book.pk).update(author="Author 2", updated_at=self.book.updated_at)
+                cache.clear()
+                response = self.client.get(url, {"author": "Author 1"}, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                self.assertEqual([book["title"] for book in response.json()["books"]], ["Book 2"])
+
+    def test_bulk_update_changes_updated_at(self):
+        updated_at = self.book.updated_at
+        serializer = BookSerializer(Book.objects.all(), many=True, data=[{
+            "id": self.book.id, "title": "Renamed", "author": "Author 1", "publish_date": "2002-12-01",
+            "isbn": "9761586697301", "price": "10.99",
+        }])
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+
+        self.book.refresh_from_db()
+        self.assertGreater(self.book.updated_at, updated_at)
+
+
+class BookChangesAPITestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.url = "/api/books/changes/"
+        self.book1 = Book.objects.create(title="Book 1", author="Author 1", publish_date="2002-12-01", isbn="9761586697301", price=10.99)
+        self.book2 = Book.objects.create(title="Book 2", author="Author 2", publish_date="1990-01-31", isbn="7043534952345", price=19.99)
+
+    def test_changes_since_cursor(self):
+        response = self.client.get(self.url, {"page_size": 1})
+        self.assertEqual([book["title"] for book in response.json()["books"]], ["Book 1"])
+        self.assertTrue(response.json()["has_more"])
+
+        response = self.client.get(self.url, {"cursor": response.json()["cursor"]})
+        self.assertEqual([book["title"] for book in response.json()["books"]], ["Book 2"])
+        self.assertFalse(response.json()["has_more"])
+        cursor = response.json()["cursor"]
+
+        response = self.client.get(self.url, {"cursor": cursor})
+        self.assertEqual(response.json()["books"], [])
+        self.assertEqual(response.json()["cursor"], cursor)
+
+        self.book1.price = 12
+        self.book1.save()
+        deleted_id = self.book2.id
+        self.book2.delete()
+
+        response = self.client.get(self.url, {"cursor": cursor})
+        self.assertEqual([book["title"] for book in response.json()["books"]], ["Book 1"])
+        self.assertEqual([book["id"] for book in response.json()["deleted"]], [deleted_id])
+
+    def test_changes_are_numbered_in_commit_order_not_by_clock(self):
+        cursor = self.client.get(self.url).json()["cursor"]
+
+        # Written by a server whose clock is behind, after the cursor moved past the newer rows
+        Book.objects.filter(pk=self.book2.pk).update(updated_at=self.book1.updated_at - datetime.timedelta(hours=1))
+        Book.objects.bulk_create([Book(title="Book 3", author="Author 3", publish_date="1990-01-31", isbn="7043534952346", price=1)])
+
+        response = self.client.get(self.url, {"cursor": cursor})
+        self.assertEqual([book["title"] for book in response.json()["books"]], ["Book 2", "Book 3"])
+        self.assertEqual(self.client.get(self.url, {"cursor": response.json()["cursor"]}).json()["books"], [])
+
+    def test_every_write_takes_the_change_sequence_before_the_book_rows(self):
+        # Same lock order on every path, a save and a delete of the same book can't deadlock
+        def statements(write):
+            with CaptureQueriesContext(connection) as queries:
+                write()
+            return [query["sql"].split()[0] + (" counter" if "bookchangesequence" in query["sql"] else "")
+                    for query in queries if "books_book" in query["sql"] or "bookchangesequence" in query["sql"]]
+
+        def batch_delete():
+            with transaction.atomic(), batch_deletions():
+                Book.objects.filter(pk=self.book2.pk).delete()
+
+        for write in [self.book1.save, batch_delete, self.book1.delete]:
+            locks = [statement for statement in statements(write) if statement.split()[0] in ("UPDATE", "DELETE")]
+            self.assertEqual(locks[0], "UPDATE counter")
+
+    def test_invalid_cursor(self):
+        response = self.client.get(self.url, {"cursor": "bad"})
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class BookFilterDatePartTestCase(TestCase):
+    def setUp(self):
+        Book.objects.create(title="Book 1", author="Author 1", publish_date="2002-12-01", isbn="9761586697301", price=10.99)
+        Book.objects.create(title="Book 2", author="Author 2", publish_date="2002-01-31", isbn="7043534952345", price=19.99)
+        Book.objects.create(title="Book 3", author="Author 3", publish_date="1990-12-31", isbn="7043534952346", price=9.99)
+
+    def filter_titles(self, **params):
+        return sorted(BookFilter(params, queryset=Book.objects.all()).qs.values_list("title", flat=True))
+
+    def test_date_part_filters(self):
+        self.assertEqual(self.filter_titles(year=2002), ["Book 1", "Book 2"])
+        self.assertEqual(self.filter_titles(year=2002, month=12), ["Book 1"])
+        self.assertEqual(self.filter_titles(year=2002, month=1, day=31), ["Book 2"])
+        self.assertEqual(self.filter_titles(year=2002, day=31), ["Book 2"])
+        self.assertEqual(self.filter_titles(month=12), ["Book 1", "Book 3"])
+        self.assertEqual(self.filter_titles(day=31), ["Book 2", "Book 3"])
+        self.assertEqual(self.filter_titles(year=2002, month=2, day=30), [])
+
+    def test_year_and_month_filter_is_a_date_range(self):
+        sql = str(BookFilter({"year": 2002, "month": 12}, queryset=Book.objects.all()).qs.query)
+
+        self.assertIn("BETWEEN", sql)
+        self.assertNotIn("EXTRACT", sql.upper())
+
+    def test_month_and_day_filters_use_indexes(self):
+        if connection.vendor != "postgresql":
+            self.skipTest("The date part indexes are only matched on PostgreSQL")
+        for params, index in [({"month": 12}, "book_publish_month_idx"), ({"day": 31}, "book_publish_day_idx")]:
+            queryset = BookFilter(params, queryset=Book.objects.all()).qs
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute("SET LOCAL enable_seqscan = off")
+                plan = queryset.explain()
+            self.assertIn(index, plan)
+
+
+class BookSearchTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        Book.objects.create(title="Django for APIs", author="William Vincent", publish_date="2020-01-01", isbn="9761586697301", price=10.99)
+        Book.objects.create(title="Two Scoops of Django", author="Daniel Feldroy", publish_date="2019-01-01", isbn="7043534952345", price=19.99)
+        Book.objects.create(title="Fluent Python", author="Luciano Ramalho", publish_date="2015-01-01", isbn="7043534952346", price=9.99)
+
+    def search(self, **params):
+        response = self.client.get("/api/books/", params)
+        return sorted(book["title"] for book in response.json()["books"])
+
+    def test_search_title_and_author(self):
+        self.assertEqual(self.search(search="django"), ["Django for APIs", "Two Scoops of Django"])
+        self.assertEqual(self.search(search="ramalho"), ["Fluent Python"])
+
+    def test_search_requires_every_word(self):
+        self.assertEqual(self.search(search="django vincent"), ["Django for APIs"])
+
+    def test_search_combines_with_filters(self):
+        self.assertEqual(self.search(search="django", year=2019), ["Two Scoops of Django"])
+
+
+class BookBatchAPITestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.url = "/api/books/batch/"
+        self.books = [
+            Book.objects.create(title=f"Book {i}", author="Author A", publish_date="2000-01-01", isbn=f"978000000000{i}", price=10)
+            for i in range(3)
+        ]
+
+    def test_batch_by_ids(self):
+        ids = [self.books[2].id, 999, self.books[0].id, self.books[2].id]
+        with self.assertNumQueries(1):
+            response = self.client.post(self.url, {"ids": ids}, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([book["title"] for book in response.json()["books"]], ["Book 2", "Book 0"])
+        self.assertEqual(response.json()["missing"], [999])
+        self.assertEqual(response.json()["books"][0], self.client.get(f"/api/book/{self.books[2].id}/").json())
+
+    def test_batch_uses_the_detail_cache(self):
+        self.client.get(f"/api/book/{self.books[0].id}/")
+        self.client.post(self.url, {"ids": [self.books[1].id]}, format="json")
+
+        with self.assertNumQueries(0):
+            response = self.client.post(self.url, {"ids": [self.books[0].id, self.books[1].id]}, format="json")
+            self.client.get(f"/api/book/{self.books[1].id}/")
+        self.assertEqual([book["title"] for book in response.json()["books"]], ["Book 0", "Book 1"])
+
+        self.books[0].title = "Renamed"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.books[0].save()
+        response = self.client.post(self.url, {"ids": [self.books[0].id]}, format="json")
+        self.assertEqual(response.json()["books"][0]["title"], "Renamed")
+
+    def test_batch_read_racing_a_write_is_not_served(self):
+        # The batch read the generation and the old row, the write commits before it stores the row
+        key = book_cache.detail_key(self.books[0].id)
+        old = self.client.post(self.url, {"ids": [self.books[0].id]}, format="json").json()["books"][0]
+        self.books[0].title = "Renamed"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.books[0].save()
+        book_cache.store_many({key: {"data": old, "validators": None}}, variant="testserver")
+
+        response = self.client.post(self.url, {"ids": [self.books[0].id]}, format="json")
+        self.assertEqual(response.json()["books"][0]["title"], "Renamed")
+        self.assertEqual(self.client.get(f"/api/book/{self.books[0].id}/").json()["title"], "Renamed")
+
+    def test_batch_by_isbns(self):
+        response = self.client.post(self.url, {"isbns": ["9780000000001", "9789999999999"]}, format="json")
+
+        self.assertEqual([book["title"] for book in response.json()["books"]], ["Book 1"])
+        self.assertEqual(response.json()["missing"], ["9789999999999"])
+
+    @override_settings(BOOK_BATCH_MAX_ITEMS=2)
+    def test_batch_validation(self):
+        self.assertEqual(self.client.post(self.url, {"ids": ["1"]}, format="json").status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.post(self.url, {"isbns": [1]}, format="json").status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.post(self.url, {"ids": [1, 2, 3]}, format="json").status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class BookFacetsAPITestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.url = "/api/books/facets/"
+        Book.objects.create(title="Book 1", author="Author A", publish_date="2000-01-01", isbn="9780000000001", price=5)
+        Book.objects.create(title="Book 2", author="Author A", publish_date="2001-01-01", isbn="9780000000002", price=15.5)
+        Book.objects.create(title="Book 3", author="Author B", publish_date="2001-06-01", isbn="9780000000003", price=19.99)
+
+    def test_facets(self):
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json(), {
+            "total": 3,
+            "authors": [{"value": "Author A", "count": 2}, {"value": "Author B", "count": 1}],
+            "years": [{"value": 2000, "count": 1}, {"value": 2001, "count": 2}],
+            "prices": [{"min": "0.00", "max": "10.00", "count": 1}, {"min": "10.00", "max": "20.00", "count": 2}],
+        })
+
+    def test_facets_apply_filters(self):
+        response = self.client.get(self.url, {"year": 2001})
+
+        self.assertEqual(response.json()["total"], 2)
+        self.assertEqual(response.json()["years"], [{"value": 2001, "count": 2}])
+
+    def test_facets_are_cached_until_a_write(self):
+        self.client.get(self.url)
+        with self.assertNumQueries(0):
+            self.client.get(self.url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Book.objects.create(title="Book 4", author="Author C", publish_date="2002-01-01", isbn="9780000000004", price=1)
+        self.assertEqual(self.client.get(self.url).json()["total"], 4)
+
+    @override_settings(BOOK_FACET_SUMMARY=True)
+    def test_summary_follows_book_writes(self):
+        call_command("rebuild_book_facets", stdout=StringIO())
+        self.assertEqual(facets.facets_from_summary(), facets.facets_from_queryset(Book.objects.all()))
+
+        book = Book.objects.get(isbn="9780000000001")
+        book.author = "Author B"
+        book.price = 25
+        book.save()
+        Book.objects.get(isbn="9780000000002").delete()
+        serializer = BookSerializer(data=[
+            {"title": "Book 5", "author": "Author D", "publish_date": "1999-01-01", "isbn": "9780000000005", "price": "3.00"},
+        ], many=True)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        import_books([
+            "title,author,publish_date,isbn,price\n",
+            "Book 3,Author E,2005-01-01,9780000000003,40\n",
+        ], "csv")
+
+        self.assertEqual(facets.facets_from_summary(), facets.facets_from_queryset(Book.objects.all()))
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url)
+        self.assertEqual(response.json()["total"], 3)
+
+
+@override_settings(DATABASE_REPLICAS=["replica"])
+class BookReplicaRoutingTestCase(TransactionTestCase):
+    # The replica alias mirrors the default test database
+    databases = {"default", "replica"}
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.book = Book.objects.create(title="Book 1", author="Author A", publish_date="2000-01-01", isbn="9780000000001", price=10)
+        User.objects.create_user(email="test@example.com", password="securepassword123")
+        user = User.objects.get(email="test@example.com")
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {Token.objects.create(user=user).key}")
+
+    def get_databases(self, url):
+        with CaptureQueriesContext(connections["default"]) as primary, CaptureQueriesContext(connections["replica"]) as replica:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return {"default": len(primary), "replica": len(replica)}
+
+    def test_book_reads_go_to_the_replica(self):
+        for url in ["/api/books/", f"/api/book/{self.book.id}/", "/api/async/books/"]:
+            databases = self.get_databases(url)
+            self.assertEqual(databases["default"], 0)
+            self.assertGreater(databases["replica"], 0)
+        self.assertEqual(self.get_databases("/api/books/changes/")["replica"], 0)
+
+    def test_reads_stay_on_the_primary_after_a_write(self):
+        response = self.client.put(f"/api/book/update/{self.book.id}/", {
+            "title": "Renamed", "author": "Author A", "publish_date": "2000-01-01", "isbn": "9780000000001", "price": 10,
+        })
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn("primary_pin", response.cookies)
+
+        self.assertEqual(self.get_databases(f"/api/book/{self.book.id}/")["replica"], 0)
+
+        # The entry the pinned read filled from the primary isn't shared with replica reads
+        self.client.cookies["primary_pin"] = "0"
+        databases = self.get_databases(f"/api/book/{self.book.id}/")
+        self.assertEqual(databases["default"], 0)
+        self.assertGreater(databases["replica"], 0)
+
+    def test_pinned_reads_never_get_entries_filled_from_a_stale_replica(self):
+        response = self.client.put(f"/api/book/update/{self.book.id}/", {
+            "title": "Renamed", "author": "Author A", "publish_date": "2000-01-01", "isbn": "9780000000001", "price": 10,
+        })
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        other = APIClient()
+        reads = [
+            lambda client: client.get(f"/api/book/{self.book.id}/").json()["title"],
+            lambda client: client.get(f"/api/async/book/{self.book.id}/").json()["title"],
+            lambda client: client.get("/api/books/").json()["books"][0]["title"],
+            lambda client: client.get("/api/async/books/").json()["books"][0]["title"],
+            lambda client: client.post("/api/books/batch/", {"ids": [self.book.id]}, format="json").json()["books"][0]["title"],
+        ]
+
+        for read in reads:
+            # Another client reads from a replica that hasn't replayed the write yet
+            with transaction.atomic(using="replica"):
+                Book.objects.using("replica").filter(pk=self.book.pk).update(title="Book 1")
+                self.assertEqual(read(other), "Book 1")
+                transaction.set_rollback(True, using="replica")
+
+            self.assertEqual(read(self.client), "Renamed")
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_without_replicas(self):
+        response = self.client.delete(f"/api/book/delete/{self.book.id}/")
+
+        self.assertNotIn("primary_pin", response.cookies)
+        self.assertEqual(self.get_databases("/api/books/")["replica"], 0)
+
+
+class BookExportAPITestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        Book.objects.create(title="Book 1", author="Author 1", publish_date="2002-12-01", isbn="9761586697301", price=10.99)
+        Book.objects.create(title="Book, 2", author="Author 2", publish_date="1990-01-31", isbn="7043534952345", price=19.99)
+
+    def test_export_csv(self):
+        response = self.client.get("/api/books/export/csv/")
+
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Type"], "text/csv; charset=utf-8")
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], "id,title,author,publish_date,isbn,price,book_image")
+        self.assertEqual(lines[2], '2,"Book, 2",Author 2,1990-01-31,7043534952345,19.99,')
+
+    def test_export_ndjson_with_filters(self):
+        response = self.client.get("/api/books/export/ndjson/", {"author_contains": "author 2"})
+
+        rows = [json.loads(line) for line in b"".join(response.streaming_content).splitlines()]
+        self.assertEqual(rows, [{"id": 2, "title": "Book, 2", "author": "Author 2", "publish_date": "1990-01-31",
+                                 "isbn": "7043534952345", "price": "19.99", "book_image": None}])
+
+    def test_export_unknown_format(self):
+        response = self.client.get("/api/books/export/xml/")
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
 class BookCreateAPITestCase(TestCase):
     def setUp(self):
+        cache.clear()
         self.client = APIClient()
         self.url = "/api/book/create/"
         self.user_data = {
@@ -90,8 +775,385 @@ class BookCreateAPITestCase(TestCase):
 
         self.assertFalse(Book.objects.filter(title="New Book").exists())
 
+class BookBulkAPITestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        User.objects.create_user(email="test@example.com", password="securepassword123")
+        self.user = User.objects.get(email="test@example.com")
+        self.token, _ = Token.objects.get_or_create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+        self.book = Book.objects.create(title="Book 1", author="Author 1", publish_date="2002-12-01", isbn="9761586697301", price=10.99)
+
+    def book_data(self, title, isbn, **extra):
+        return {"title": title, "author": "Author", "publish_date": "2010-05-05", "isbn": isbn, "price": "9.99", **extra}
+
+    def test_bulk_create_reports_item_errors(self):
+        data = [
+            self.book_data("New 1", "1000000000001"),
+            self.book_data("Duplicate of existing", "9761586697301"),
+            self.book_data("Short isbn", "123"),
+            self.book_data("New 2", "1000000000002"),
+            self.book_data("Duplicate in batch", "1000000000002"),
+        ]
+
+        with self.assertNumQueries(6):
+            response = self.client.post("/api/book/bulk/create/", data, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual([book["title"] for book in response.json()["books"]], ["New 1", "New 2"])
+        self.assertEqual([error["index"] for error in response.json()["errors"]], [1, 2, 4])
+        self.assertEqual(Book.objects.count(), 3)
+
+    def test_bulk_create_limit(self):
+        with override_settings(BOOK_BULK_MAX_ITEMS=1):
+            data = [self.book_data("New 1", "1000000000001"), self.book_data("New 2", "1000000000002")]
+            response = self.client.post("/api/book/bulk/create/", data, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Book.objects.count(), 1)
+
+    def test_bulk_update(self):
+        data = [
+            self.book_data("Renamed", "9761586697301", id=self.book.id),
+            self.book_data("Missing", "1000000000001", id=self.book.id + 100),
+        ]
+
+        response = self.client.put("/api/book/bulk/update/", data, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(Book.objects.get(id=self.book.id).title, "Renamed")
+        self.assertEqual(response.json()["errors"], [{"index": 1, "errors": {"id": ["Book not found"]}}])
+
+    def test_bulk_delete(self):
+        response = self.client.post("/api/book/bulk/delete/", {"ids": [self.book.id, self.book.id + 100]}, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json(), {"deleted": [self.book.id], "missing": [self.book.id + 100]})
+        self.assertFalse(Book.objects.exists())
+
+    def test_bulk_api_unauthenticated(self):
+        self.client.credentials()
+
+        response = self.client.post("/api/book/bulk/delete/", {"ids": [self.book.id]}, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+@override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, "DEFAULT_THROTTLE_RATES": {}})
+class BookQueryBudgetTestCase(QueryBudgetMixin, TestCase):
+    # Most queries per request of every books route against a seeded catalogue. On PostgreSQL their plans may not
+    # scan more than seq_scan_rows rows sequentially, except the routes that read every matching book by design.
+    # Lower a budget when a change saves queries, raise it only on purpose.
+    books = 2000
+    seq_scan_rows = 1000
+    full_scan_routes = {"books-list", "books-list-async", "books-facets", "books-export"}
+    budgets = {
+        "books-list": 4,
+        "books-facets": 4,
+        "books-export": 2,
+        "books-changes": 3,
+        "books-batch": 2,
+        "books-list-async": 3,
+        "book-by-id-async": 2,
+        "book-by-id": 3,
+        "book-create": 4,
+        "book-update": 4,
+        "book-delete": 4,
+        "book-bulk-create": 6,
+        "book-bulk-update": 6,
+        "book-bulk-delete": 7,
+        "book-import": 5,
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_books(cls.books)
+        User.objects.create_user(email="test@example.com", password="securepassword123")
+        cls.token = Token.objects.create(user=User.objects.get(email="test@example.com"))
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+        self.book = Book.objects.order_by("id").first()
+
+    def assertRouteBudget(self, name):
+        return self.assertQueryBudget(self.budgets[name], None if name in self.full_scan_routes else self.seq_scan_rows)
+
+    def book_data(self, isbn, **extra):
+        return {"title": "New", "author": "Author", "publish_date": "2010-05-05", "isbn": isbn, "price": "9.99", **extra}
+
+    def test_every_route_has_a_budget(self):
+        self.assertEqual({pattern.name for pattern in books_urls.urlpatterns}, set(self.budgets))
+
+    def test_books_list(self):
+        params = {
+            "author": self.book.author, "author_contains": self.book.author.split()[-1],
+            "publish_date": self.book.publish_date, "month": 5, "year": 2020, "day": 12, "start_date": "2020-01-01", "end_date": "1960-01-01",
+            "search": self.book.title.split()[-1],
+        }
+        self.assertEqual(set(params), set(BookFilter.base_filters))
+        for name, value in [(None, None)] + list(params.items()):
+            with self.subTest(name), self.assertRouteBudget("books-list"):
+                response = self.client.get("/api/books/", {name: value} if name else {})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+        with self.assertRouteBudget("books-list"):
+            response = self.client.get(response.json()["next"] or "/api/books/?ordering=-publish_date")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_books_facets(self):
+        with self.assertRouteBudget("books-facets"):
+            response = self.client.get("/api/books/facets/", {"year": 2020})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_books_export(self):
+        with self.assertRouteBudget("books-export"):
+            response = self.client.get("/api/books/export/ndjson/")
+            lines = b"".join(response.streaming_content).splitlines()
+        self.assertEqual(len(lines), self.books)
+
+    def test_books_changes(self):
+        with self.assertRouteBudget("books-changes"):
+            response = self.client.get("/api/books/changes/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        with self.assertRouteBudget("books-changes"):
+            response = self.client.get("/api/books/changes/", {"cursor": response.json()["cursor"]})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_books_batch(self):
+        ids = list(Book.objects.order_by("-id").values_list("id", flat=True)[:100])
+        with self.assertRouteBudget("books-batch"):
+            response = self.client.post("/api/books/batch/", {"ids": ids}, format="json")
+        self.assertEqual(len(response.json()["books"]), 100)
+        with self.assertRouteBudget("books-batch"):
+            response = self.client.post("/api/books/batch/", {"isbns": [self.book.isbn]}, format="json")
+        self.assertEqual(len(response.json()["books"]), 1)
+
+    def test_async_books_list(self):
+        with self.assertRouteBudget("books-list-async"):
+            response = self.client.get("/api/async/books/", {"author": self.book.author})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_book_by_id(self):
+        urls = {"book-by-id": f"/api/book/{self.book.id}/", "book-by-id-async": f"/api/async/book/{self.book.id}/"}
+        for name, url in urls.items():
+            cache.clear()
+            with self.subTest(name), self.assertRouteBudget(name):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_book_create_update_delete(self):
+        with self.assertRouteBudget("book-create"):
+            response = self.client.post("/api/book/create/", self.book_data("1000000000001"))
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        with self.assertRouteBudget("book-update"):
+            response = self.client.put(f"/api/book/update/{self.book.id}/", self.book_data(self.book.isbn))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        with self.assertRouteBudget("book-delete"):
+            response = self.client.delete(f"/api/book/delete/{self.book.id}/")
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+    def test_bulk_routes(self):
+        data = [self.book_data("10000000{:05d}".format(i)) for i in range(100)]
+        with self.assertRouteBudget("book-bulk-create"):
+            response = self.client.post("/api/book/bulk/create/", data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        books = list(Book.objects.order_by("id")[:100])
+        data = [self.book_data(book.isbn, id=book.id, title="Renamed") for book in books]
+        with self.assertRouteBudget("book-bulk-update"):
+            response = self.client.put("/api/book/bulk/update/", data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        with self.assertRouteBudget("book-bulk-delete"):
+            response = self.client.post("/api/book/bulk/delete/", {"ids": [book.id for book in books]}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_book_import(self):
+        rows = "\n".join(json.dumps(self.book_data("20000000{:05d}".format(i))) for i in range(100))
+        with self.assertRouteBudget("book-import"):
+            response = self.client.post("/api/book/import/", {"file": SimpleUploadedFile("books.ndjson", rows.encode())})
+        self.assertEqual(response.json()["imported"], 100)
+
+
+class BookCountTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        Book.objects.create(title="Book 1", author="Author 1", publish_date="2002-12-01", isbn="9761586697301", price=10.99)
+        Book.objects.create(title="Book 2", author="Author 2", publish_date="1990-01-31", isbn="7043534952345", price=19.99)
+
+    def test_list_count(self):
+        response = self.client.get("/api/books/", {"page_size": 1})
+        self.assertEqual((response.json()["count"], response.json()["count_estimated"]), (2, False))
+
+        response = self.client.get(response.json()["next"])
+        self.assertEqual(response.json()["count"], 2)
+
+        response = self.client.get("/api/async/books/", {"author": "Author 1"})
+        self.assertEqual((response.json()["count"], response.json()["count_estimated"]), (1, False))
+
+    @override_settings(BOOK_COUNT_EXACT_THRESHOLD=1)
+    def test_large_list_counts_are_estimated_unless_exact_is_asked(self):
+        for url in ["/api/books/", "/api/async/books/"]:
+            with self.subTest(url):
+                cache.clear()
+                Book.objects.get_or_create(title="Book 2", author="Author 2", publish_date="1990-01-31",
+                                           isbn="7043534952345", price=19.99)
+                response = self.client.get(url)
+                self.assertEqual((response.json()["count"], response.json()["count_estimated"]), (2, False))
+                etag = response["ETag"]
+
+                with self.captureOnCommitCallbacks(execute=True):
+                    Book.objects.filter(author="Author 2").delete()
+                # The deletion tombstone changes the ETag, the count comes from the last exact count
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                self.assertEqual((response.json()["count"], response.json()["count_estimated"]), (2, True))
+
+                response = self.client.get(url, {"count": "exact"})
+                self.assertEqual((response.json()["count"], response.json()["count_estimated"]), (1, False))
+
+    @override_settings(BOOK_COUNT_EXACT_THRESHOLD=1)
+    def test_large_counts_are_estimated(self):
+        self.assertEqual(count_books(Book.objects.all()), (2, False))
+
+        Book.objects.filter(author="Author 2").delete()
+        with self.assertNumQueries(0):
+            self.assertEqual(count_books(Book.objects.order_by("-id")), (2, True))
+        self.assertEqual(count_books(Book.objects.all(), exact=True), (1, False))
+        self.assertEqual(count_books(Book.objects.filter(author="Author 1")), (1, False))
+        self.assertEqual(count_books(Book.objects.none()), (0, False))
+
+    @override_settings(BOOK_COUNT_EXACT_THRESHOLD=1)
+    def test_admin_changelist(self):
+        User.objects.create_superuser(email="admin@example.com", password="securepassword123")
+        self.client.force_login(User.objects.get(email="admin@example.com"))
+
+        response = self.client.get("/admin/books/book/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(response.context["cl"].paginator.estimated)
+
+        response = self.client.get("/admin/books/book/")
+        self.assertEqual(response.context["cl"].result_count, 2)
+        self.assertTrue(response.context["cl"].paginator.estimated)
+
+        response = self.client.get("/admin/books/book/", {"q": "Author 2"})
+        self.assertEqual(response.context["cl"].result_count, 1)
+
+
+class SeedBooksTestCase(TestCase):
+    def test_seed_books_command(self):
+        out = StringIO()
+
+        call_command("seed_books", "300", "--batch-size", "100", stdout=out)
+        call_command("seed_books", "50", "--seed", "1", stdout=out)
+
+        self.assertIn("Seeded 300 books", out.getvalue())
+        self.assertEqual(Book.objects.count(), 350)
+        isbns = list(Book.objects.values_list("isbn", flat=True))
+        self.assertEqual(len(set(isbns)), 350)
+        self.assertTrue(all(len(isbn) == 13 for isbn in isbns))
+        authors = Counter(Book.objects.values_list("author", flat=True))
+        self.assertGreater(authors.most_common(1)[0][1], 350 / len(authors) * 3)
+
+    def test_clear(self):
+        seed_books(500)
+        with self.assertNumQueries(1):
+            self.assertEqual(clear_books(), 500)
+
+        seed_books(30)
+        out = StringIO()
+        call_command("seed_books", "20", "--clear", stdout=out)
+
+        self.assertIn("Deleted 30 books", out.getvalue())
+        self.assertEqual(Book.objects.count(), 20)
+        self.assertFalse(BookDeletion.objects.exists())
+
+    def test_same_seed_same_books(self):
+        fields = ("title", "author", "publish_date", "isbn", "price")
+        seed_books(100, seed=3)
+        books = list(Book.objects.order_by("isbn").values_list(*fields))
+        clear_books()
+
+        seed_books(100, seed=3)
+
+        self.assertEqual(list(Book.objects.order_by("isbn").values_list(*fields)), books)
+
+
+class BookImportTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        User.objects.create_user(email="test@example.com", password="securepassword123")
+        self.user = User.objects.get(email="test@example.com")
+        self.token, _ = Token.objects.get_or_create(user=self.user)
+        Book.objects.create(title="Old title", author="Author 1", publish_date="2002-12-01", isbn="9761586697301", price=10.99)
+
+    def test_import_books_command(self):
+        csv_file = NamedTemporaryFile("w", suffix=".csv", delete=False)
+        csv_file.write("title,author,publish_date,isbn,price\n"
+                       "New title,Author 1,2002-12-01,9761586697301,12.50\n"
+                       "Book 2,Author 2,1990-01-31,7043534952345,19.99\n"
+                       "Bad isbn,Author 3,1990-01-31,123,19.99\n"
+                       "Book 4,Author 4,1991-01-31,7043534952346,5.00\n")
+        csv_file.close()
+        rejects_path = csv_file.name + ".rejects"
+        self.addCleanup(os.remove, csv_file.name)
+        self.addCleanup(os.remove, rejects_path)
+        out = StringIO()
+
+        call_command("import_books", csv_file.name, "--batch-size", "2", "--rejects", rejects_path, stdout=out)
+
+        self.assertIn("Imported 3 books, rejected 1 of 4 rows", out.getvalue())
+        self.assertEqual(Book.objects.count(), 3)
+        self.assertEqual(Book.objects.get(isbn="9761586697301").title, "New title")
+        with open(rejects_path) as rejects:
+            reject = json.loads(rejects.readline())
+        self.assertEqual(reject["line"], 4)
+        self.assertIn("isbn", reject["errors"])
+
+    def test_import_api_ndjson(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+        lines = [
+            json.dumps({"title": "Book 2", "author": "Author 2", "publish_date": "1990-01-31", "isbn": "7043534952345", "price": 19.99}),
+            "not json",
+            json.dumps({"title": "Book 2 again", "author": "Author 2", "publish_date": "1990-01-31", "isbn": "7043534952345", "price": 9.99}),
+        ]
+        upload = SimpleUploadedFile("books.ndjson", "\n".join(lines).encode())
+
+        response = self.client.post("/api/book/import/", {"file": upload})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["imported"], 1)
+        self.assertEqual(response.json()["rejects"][0]["line"], 2)
+        self.assertEqual(Book.objects.get(isbn="7043534952345").title, "Book 2 again")
+
+    @override_settings(BOOK_IMPORT_BATCH_SIZE=1)
+    def test_import_api_invalid_encoding_imports_nothing(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+        content = ("title,author,publish_date,isbn,price\n"
+                   "Book 2,Author 2,1990-01-31,7043534952345,19.99\n").encode() + b"Book 3,\xff\xfe,1990-01-31,7043534952346,9.99\n"
+        upload = SimpleUploadedFile("books.csv", content)
+
+        response = self.client.post("/api/book/import/", {"file": upload})
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.json(), {"file": "The file must be UTF-8 encoded"})
+        self.assertFalse(Book.objects.filter(isbn="7043534952345").exists())
+
+    def test_import_api_unauthenticated(self):
+        upload = SimpleUploadedFile("books.csv", b"title,author,publish_date,isbn,price\n")
+
+        response = self.client.post("/api/book/import/", {"file": upload})
+
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
 class GetBookByIdAPITestCase(TestCase):
     def setUp(self):
+        cache.clear()
         self.client = APIClient()
         Book.objects.create(title="Test Book", author="Test Author", publish_date="2002-12-01", isbn="9761586697301", price=19.99)
         self.book = Book.objects.get(title="Test Book")
@@ -109,6 +1171,9 @@ class GetBookByIdAPITestCase(TestCase):
             "publish_date": str(self.book.publish_date),
             "isbn": self.book.isbn,
             "price": str(self.book.price),
+            "book_image": None,
+            "thumbnails": {},
+            "updated_at": self.book.updated_at.isoformat().replace("+00:00", "Z"),
         }
         self.assertEqual(response.json(), expected_data)
 
@@ -117,8 +1182,157 @@ class GetBookByIdAPITestCase(TestCase):
 
         self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
 
+class AsyncBookAPITestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        for i in range(3):
+            Book.objects.create(title=f"Book {i}", author="Author A", publish_date=f"200{i}-01-01", isbn=f"976158669730{i}", price=10 + i)
+        self.book = Book.objects.order_by("id").first()
+
+    def test_list_matches_sync_api(self):
+        sync_response = self.client.get("/api/books/", {"page_size": 2})
+        response = self.client.get("/api/async/books/", {"page_size": 2})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["books"], sync_response.json()["books"])
+        self.assertIsNone(response.json()["previous"])
+
+        response = self.client.get(response.json()["next"])
+        self.assertEqual([book["title"] for book in response.json()["books"]], ["Book 2"])
+        self.assertIsNone(response.json()["next"])
+
+    def test_list_filters(self):
+        response = self.client.get("/api/async/books/", {"year": "2001"})
+
+        self.assertEqual([book["title"] for book in response.json()["books"]], ["Book 1"])
+
+    def test_list_invalid_filter_and_cursor(self):
+        self.assertEqual(self.client.get("/api/async/books/", {"start_date": "nope"}).status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get("/api/async/books/", {"cursor": "nope"})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(response.json(), self.client.get("/api/books/", {"cursor": "nope"}).json())
+
+    def test_list_not_modified_and_cached(self):
+        response = self.client.get("/api/async/books/")
+        etag = response["ETag"]
+
+        with self.assertNumQueries(0):
+            response = self.client.get("/api/async/books/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.book.title = "Renamed"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.book.save()
+        response = self.client.get("/api/async/books/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["books"][0]["title"], "Renamed")
+
+    def test_detail_matches_sync_api(self):
+        sync_response = self.client.get(f"/api/book/{self.book.id}/")
+        response = self.client.get(f"/api/async/book/{self.book.id}/")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json(), sync_response.json())
+
+        response = self.client.get(f"/api/async/book/{self.book.id}/", HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_detail_not_found(self):
+        response = self.client.get("/api/async/book/999/")
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+@override_settings(BOOK_THUMBNAIL_ASYNC=False)
+class BookThumbnailTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        media_root = TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media_root.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.client = APIClient()
+        User.objects.create_user(email="test@example.com", password="securepassword123")
+        self.user = User.objects.get(email="test@example.com")
+        self.token, _ = Token.objects.get_or_create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+
+    def image_upload(self, size=(1200, 1800)):
+        buffer = BytesIO()
+        Image.new("RGB", size, (200, 30, 30)).save(buffer, format="PNG")
+        return SimpleUploadedFile("cover.png", buffer.getvalue(), content_type="image/png")
+
+    def test_thumbnails_are_generated_after_upload(self):
+        new_book_data = {
+            "title": "New Book",
+            "author": "New Author",
+            "publish_date": "2002-12-01",
+            "isbn": "9761586697301",
+            "price": 15.99,
+            "book_image": self.image_upload(),
+        }
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post("/api/book/create/", data=new_book_data)
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.json()["thumbnails"], {})
+
+        book = Book.objects.get(isbn="9761586697301")
+        self.assertEqual(set(book.thumbnails), {"small", "medium"})
+        self.assertIn("jpeg", book.thumbnails["small"])
+        with default_storage.open(book.thumbnails["small"]["jpeg"]) as thumbnail:
+            self.assertEqual(Image.open(thumbnail).size, (160, 240))
+
+        response = self.client.get(f"/api/book/{book.id}/")
+        self.assertTrue(response.json()["thumbnails"]["medium"]["jpeg"].startswith("http://testserver/media/"))
+
+    def test_stale_thumbnails_are_discarded(self):
+        book = Book.objects.create(title="Book", author="Author", publish_date="2002-12-01", isbn="9761586697301",
+                                   price=10, book_image=self.image_upload())
+
+        Book.objects.filter(id=book.id).update(book_image="book_images/other.png")
+
+        thumbnails = generate_thumbnails(book.id, book.book_image.name)
+
+        book.refresh_from_db()
+        self.assertEqual(book.thumbnails, {})
+        self.assertFalse(default_storage.exists(thumbnails["small"]["jpeg"]))
+
+    def test_old_thumbnails_are_deleted(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            book = Book.objects.create(title="Book", author="Author", publish_date="2002-12-01", isbn="9761586697301",
+                                       price=10, book_image=self.image_upload())
+        first = generate_thumbnails(book.id, book.book_image.name)
+
+        # Regenerated, like generate_thumbnails --all
+        with self.captureOnCommitCallbacks(execute=True):
+            second = generate_thumbnails(book.id, book.book_image.name)
+        self.assertFalse(default_storage.exists(first["small"]["jpeg"]))
+        self.assertTrue(default_storage.exists(second["small"]["jpeg"]))
+
+        # Replaced image
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.put(f"/api/book/update/{book.id}/", data={
+                "title": "Book", "author": "Author", "publish_date": "2002-12-01", "isbn": "9761586697301", "price": 10,
+                "book_image": self.image_upload(),
+            }, format="multipart")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(default_storage.exists(second["small"]["jpeg"]))
+        book.refresh_from_db()
+        third = book.thumbnails
+
+        with self.captureOnCommitCallbacks(execute=True):
+            book.delete()
+        self.assertFalse(default_storage.exists(third["small"]["jpeg"]))
+
+
 class UpdateBookAPITestCase(TestCase):
     def setUp(self):
+        cache.clear()
         self.client = APIClient()
         Book.objects.create(title="Test Book", author="Test Author", publish_date="2002-12-01", isbn="9761586697301", price=19.99)
         self.book = Book.objects.get(title="Test Book")
@@ -171,6 +1385,7 @@ class UpdateBookAPITestCase(TestCase):
 
 class DeleteBookAPITestCase(TestCase):
     def setUp(self):
+        cache.clear()
         self.client = APIClient()
         Book.objects.create(title="Test Book", author="Test Author", publish_date="2002-12-01", isbn="9761586697301", price=19.99)
         self.book = Book.objects.get(title="Test Book")
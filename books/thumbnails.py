@@ -0,0 +1,122 @@
+import logging
+import os
+
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from django.utils import timezone
+
+from PIL import Image, ImageOps
+
+from books import cache as book_cache
+from books.models import Book
+
+# Builds resized copies of Book.book_image off the request path.
+# Jobs run in a small in-process thread pool after the upload transaction commits,
+# and the generated paths are stored in Book.thumbnails as {size: {format: path}}.
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, "BOOK_THUMBNAIL_WORKERS", 2), thread_name_prefix="book-thumbnails",
+        )
+    return _executor
+
+
+def schedule_thumbnails(book):
+    if not book.book_image:
+        return
+    pk, name = book.pk, book.book_image.name
+    transaction.on_commit(lambda: submit(pk, name))
+
+
+def submit(pk, name):
+    if getattr(settings, "BOOK_THUMBNAIL_ASYNC", True):
+        get_executor().submit(run_job, pk, name)
+    else:
+        generate_thumbnails(pk, name)
+
+
+def run_job(pk, name):
+    try:
+        generate_thumbnails(pk, name)
+    except Exception:
+        logger.exception("Could not generate thumbnails for book %s", pk)
+    finally:
+        # Worker threads hold their own database connections
+        connections.close_all()
+
+
+def open_image(name):
+    with default_storage.open(name) as image_file:
+        image = Image.open(image_file)
+        image.load()
+    image = ImageOps.exif_transpose(image)
+    if image.mode in ("RGBA", "LA", "P"):
+        image = image.convert("RGBA")
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        background.paste(image, mask=image.split()[-1])
+        return background
+    return image.convert("RGB")
+
+
+def get_formats():
+    # Pillow can be built without some encoders (webp needs libwebp), those formats are skipped
+    Image.init()
+    formats = getattr(settings, "BOOK_THUMBNAIL_FORMATS", ("webp", "jpeg"))
+    return [image_format for image_format in formats if image_format.upper() in Image.SAVE]
+
+
+def generate_thumbnails(pk, name):
+    image = open_image(name)
+    stem = os.path.splitext(os.path.basename(name))[0]
+    sizes = getattr(settings, "BOOK_THUMBNAIL_SIZES", {"small": (160, 240), "medium": (320, 480)})
+    formats = get_formats()
+    quality = getattr(settings, "BOOK_THUMBNAIL_QUALITY", 80)
+
+    thumbnails = {}
+    for size_name, size in sizes.items():
+        thumbnail = image.copy()
+        thumbnail.thumbnail(size, Image.LANCZOS)
+        for image_format in formats:
+            buffer = BytesIO()
+            thumbnail.save(buffer, format=image_format.upper(), quality=quality)
+            path = "book_images/thumbnails/{}/{}_{}.{}".format(pk, stem, size_name, "jpg" if image_format == "jpeg" else image_format)
+            thumbnails.setdefault(size_name, {})[image_format] = default_storage.save(path, ContentFile(buffer.getvalue()))
+
+    # The image may have been replaced, the book deleted or the thumbnails regenerated while we were working
+    previous = Book.objects.filter(pk=pk, book_image=name).values_list("thumbnails", flat=True).first()
+    if previous is not None and Book.objects.filter(pk=pk, book_image=name, thumbnails=previous).update(
+            thumbnails=thumbnails, updated_at=timezone.now()):
+        book_cache.invalidate_books()
+        delete_thumbnails(previous, keep=thumbnails)
+    else:
+        delete_files(thumbnail_paths(thumbnails))
+    return thumbnails
+
+
+def thumbnail_paths(thumbnails):
+    return {path for paths in thumbnails.values() for path in paths.values()}
+
+
+def delete_files(paths):
+    for path in paths:
+        default_storage.delete(path)
+
+
+def delete_thumbnails(thumbnails, keep=None):
+    # Deletes the files of a Book.thumbnails value the book no longer points to (except those also in keep, a storage
+    # that overwrites may have saved the new ones on the same paths), once the transaction that dropped it commits
+    paths = thumbnail_paths(thumbnails) - thumbnail_paths(keep or {})
+    if paths:
+        transaction.on_commit(lambda: delete_files(paths))
@@ -1,11 +1,23 @@
 from django.urls import path
 
-from books.api import BookListAPI, BookCreateAPI, GetBookByIdAPI, UpdateBook, DeleteBook
+from books import views
+from books.api import (BookListAPI, BookFacetsAPI, BookExportAPI, BookChangesAPI, BookBatchAPI, BookCreateAPI, GetBookByIdAPI, UpdateBook, DeleteBook,
+                       BookBulkCreateAPI, BookBulkUpdateAPI, BookBulkDeleteAPI, BookImportAPI)
 
 urlpatterns = [
     path("books/", BookListAPI.as_view(), name="books-list"),
+    path("books/facets/", BookFacetsAPI.as_view(), name="books-facets"),
+    path("books/export/<str:export_format>/", BookExportAPI.as_view(), name="books-export"),
+    path("books/changes/", BookChangesAPI.as_view(), name="books-changes"),
+    path("books/batch/", BookBatchAPI.as_view(), name="books-batch"),
+    path("async/books/", views.book_list, name="books-list-async"),
+    path("async/book/<int:pk>/", views.book_detail, name="book-by-id-async"),
     path("book/<int:pk>/", GetBookByIdAPI.as_view(), name="book-by-id"),
     path("book/create/", BookCreateAPI.as_view(), name="book-create"),
     path("book/update/<int:pk>/", UpdateBook.as_view(), name="book-update"),
     path("book/delete/<int:pk>/", DeleteBook.as_view(), name="book-delete"),
+    path("book/bulk/create/", BookBulkCreateAPI.as_view(), name="book-bulk-create"),
+    path("book/bulk/update/", BookBulkUpdateAPI.as_view(), name="book-bulk-update"),
+    path("book/bulk/delete/", BookBulkDeleteAPI.as_view(), name="book-bulk-delete"),
+    path("book/import/", BookImportAPI.as_view(), name="book-import"),
 ]
@@ -1,3 +1,122 @@
-from django.shortcuts import render
+from types import SimpleNamespace
 
-# Create your views here.
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+
+from rest_framework.exceptions import APIException, NotFound, Throttled, ValidationError
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from book_challenge.db_router import read_from_replicas
+from book_challenge.renderers import dumps
+from books import cache as book_cache
+from books.conditional import adetail_validators, alist_validators, is_conditional, not_modified_response, set_validators
+from books.counting import acount_books
+from books.filters import BookFilter
+from books.models import Book
+from books.pagination import KeysetPagination
+from books.serializers import BookRowSerializer, BookSerializer, get_book_fields, parse_fields
+
+# Native async versions of the book list and detail APIs for ASGI deployments.
+# They return the same payloads as BookListAPI and GetBookByIdAPI and share their cache,
+# but database and cache calls are awaited, so a slow client doesn't hold a thread.
+
+
+def json_response(data, status=200):
+    return HttpResponse(dumps(data), status=status, content_type="application/json")
+
+
+def error_response(exc):
+    # Same body as DRF's exception handler, {"detail": ...} unless the detail is a list or dict
+    data = exc.detail if isinstance(exc.detail, (list, dict)) else {"detail": exc.detail}
+    return json_response(data, status=exc.status_code)
+
+
+def check_throttles(request, scope):
+    # The throttles of the DRF views with this throttle_scope, on the same counters. Returns the 429 (or the 401 of a
+    # bad token) to send, None if the request may go on. Sync, the token lookup and a redis throttle block
+    drf_request = Request(request, authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES])
+    view = SimpleNamespace(throttle_scope=scope)
+    throttles = [throttle_class() for throttle_class in api_settings.DEFAULT_THROTTLE_CLASSES]
+    try:
+        durations = [throttle.wait() for throttle in throttles if not throttle.allow_request(drf_request, view)]
+    except APIException as exc:
+        return error_response(exc)
+    if not durations:
+        return None
+    exc = Throttled(max(durations))
+    response = error_response(exc)
+    response["Retry-After"] = "%d" % exc.wait
+    return response
+
+
+@read_from_replicas
+async def book_list(request):
+    # API get list of books
+    throttled = await sync_to_async(check_throttles)(request, "books_read")
+    if throttled is not None:
+        return throttled
+    drf_request = Request(request)
+    key = await book_cache.alist_key(request)
+    entry = await book_cache.alookup(key, "list")
+    if entry is None:
+        filterset = BookFilter(request.GET, queryset=Book.objects.all(), request=request)
+        if not filterset.is_valid():
+            return json_response({name: list(errors) for name, errors in filterset.errors.items()}, status=400)
+        queryset = filterset.qs
+        validators = None
+        if is_conditional(request):
+            validators = await alist_validators(queryset, book_cache.request_signature(request))
+            not_modified = not_modified_response(request, validators)
+            if not_modified is not None:
+                return not_modified
+
+        paginator = KeysetPagination()
+        try:
+            fields = parse_fields(request.GET.get("fields"))
+            columns = set(fields or get_book_fields()) | set(paginator.get_ordering_columns(drf_request))
+            page_queryset = paginator.get_page_queryset(queryset.values(*columns), drf_request)
+        except (NotFound, ValidationError) as exc:
+            return error_response(exc)
+
+        async def compute():
+            entry_validators = validators or await alist_validators(queryset, book_cache.request_signature(request))
+            rows = paginator.get_page([row async for row in page_queryset.aiterator()])
+            serializer = BookRowSerializer(rows, fields=fields, context={"request": request})
+            count, estimated = await acount_books(queryset, exact=request.GET.get("count") == "exact")
+            data = paginator.get_paginated_data(serializer.data, count, estimated)
+            return {"data": data, "validators": entry_validators}
+
+        entry = await book_cache.asingle_flight(key, "list", compute)
+    return (not_modified_response(request, entry["validators"])
+            or set_validators(json_response(entry["data"]), entry["validators"]))
+
+
+@read_from_replicas
+async def book_detail(request, pk):
+    # API get book by Id
+    throttled = await sync_to_async(check_throttles)(request, "books_read")
+    if throttled is not None:
+        return throttled
+    try:
+        fields = parse_fields(request.GET.get("fields"))
+    except ValidationError as exc:
+        return error_response(exc)
+    variant = book_cache.detail_variant(request, fields)
+    key = await book_cache.adetail_key(pk)
+    entry = await book_cache.alookup(key, "detail", variant=variant)
+    if entry is None:
+        validators = await adetail_validators(pk, variant)
+        if validators is None:
+            return json_response({"detail": "Not found."}, status=404)
+        not_modified = not_modified_response(request, validators)
+        if not_modified is not None:
+            return not_modified
+        try:
+            book = await (Book.objects.only(*fields) if fields else Book.objects.all()).aget(pk=pk)
+        except Book.DoesNotExist:
+            return json_response({"detail": "Not found."}, status=404)
+        entry = {"data": BookSerializer(book, fields=fields, context={"request": request}).data, "validators": validators}
+        await book_cache.astore(key, entry, variant=variant)
+    return (not_modified_response(request, entry["validators"])
+            or set_validators(json_response(entry["data"]), entry["validators"]))
@@ -0,0 +1,33 @@
+import glob
+import multiprocessing
+import os
+
+# Gunicorn settings, read automatically when gunicorn is started from the project root:
+#   gunicorn book_challenge.wsgi:application
+# With persistent database connections (see settings_prod.py) every worker thread keeps its own connection,
+# so the server holds up to workers * threads connections to each database.
+
+bind = "0.0.0.0:{}".format(os.environ.get("PORT", "8000"))
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get("GUNICORN_THREADS", 4))
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "gthread")
+
+
+def on_starting(server):
+    # Metrics files of the previous run, the workers of this one start from zero
+    directory = os.environ.get("METRICS_DIR")
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+        for path in glob.glob(os.path.join(directory, "*.json")):
+            os.remove(path)
+
+
+def when_ready(server):
+    connections = workers * threads
+    server.log.info("Up to %s connections per database (%s workers x %s threads)", connections, workers, threads)
+    budget = os.environ.get("DATABASE_MAX_CONNECTIONS")
+    if budget and connections > int(budget):
+        server.log.warning(
+            "%s connections per database is more than DATABASE_MAX_CONNECTIONS=%s, lower WEB_CONCURRENCY or GUNICORN_THREADS",
+            connections, budget,
+        )